@@ -0,0 +1,161 @@
+"""
+Admission control and load shedding.
+
+A background task measures event-loop lag (how late a periodic sleep wakes
+up). Every HTTP request is put in a route class; under lag or when a class is
+over its in-flight limit, lower-priority classes are shed with
+``503 Service Unavailable`` and ``Retry-After`` so ingest and heartbeats keep
+the loop to themselves.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from app.core.config import settings
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CRITICAL = "critical"
+NORMAL = "normal"
+LOW = "low"
+
+# First matching prefix wins; anything unmatched is NORMAL
+ROUTE_CLASSES = [
+    (CRITICAL, ("/api/v1/events", "/api/v1/ws", "/api/v1/health")),
+    (LOW, ("/api/v1/auth/register", "/api/v1/analysis", "/api/v1/export")),
+]
+
+loop_lag_gauge = metrics.gauge("event_loop_lag_ms", "Most recent event-loop lag sample")
+inflight_gauge = metrics.gauge("admission_inflight_requests", "In-flight HTTP requests per route class")
+decisions_counter = metrics.counter("admission_decisions_total", "Admission decisions per route class")
+
+
+def classify_route(path: str) -> str:
+    for route_class, prefixes in ROUTE_CLASSES:
+        if path.startswith(prefixes):
+            return route_class
+    return NORMAL
+
+
+class LoopLagMonitor:
+    """Samples event-loop lag by timing a fixed-interval sleep"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lag_ms = 0.0
+        self._due: Optional[float] = None  # Loop time the pending sample should wake at
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            self._due = start + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, (loop.time() - start - self.interval) * 1000)
+            # Fast attack, slow decay: react to spikes, recover gradually
+            self.lag_ms = lag if lag > self.lag_ms else self.lag_ms * 0.8 + lag * 0.2
+            loop_lag_gauge.set(round(self.lag_ms, 3))
+
+    def current_lag_ms(self) -> float:
+        """Latest lag, or more if the pending sample is already overdue (a stall in progress)"""
+        if self._due is None:
+            return self.lag_ms
+        overdue = (asyncio.get_running_loop().time() - self._due) * 1000
+        return max(self.lag_ms, overdue)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._due = None
+
+
+loop_lag_monitor = LoopLagMonitor(settings.LOOP_LAG_INTERVAL)
+
+
+class AdmissionController:
+    def __init__(self, monitor: LoopLagMonitor):
+        self.monitor = monitor
+        self.inflight = {CRITICAL: 0, NORMAL: 0, LOW: 0}
+        self.limits = {
+            CRITICAL: None,
+            NORMAL: settings.ADMISSION_MAX_INFLIGHT_NORMAL,
+            LOW: settings.ADMISSION_MAX_INFLIGHT_LOW,
+        }
+
+    def shed_reason(self, route_class: str) -> Optional[str]:
+        """Return why a request should be shed, or None to admit it"""
+        if route_class == CRITICAL:
+            return None
+
+        lag = self.monitor.lag_ms
+        if route_class == LOW and lag > settings.ADMISSION_LAG_THRESHOLD_MS:
+            return "loop_lag"
+        if lag > settings.ADMISSION_LAG_CRITICAL_MS:
+            return "loop_lag"
+
+        limit = self.limits[route_class]
+        if limit is not None and self.inflight[route_class] >= limit:
+            return "inflight_limit"
+        return None
+
+    def enter(self, route_class: str):
+        self.inflight[route_class] += 1
+        inflight_gauge.set(self.inflight[route_class], route_class=route_class)
+
+    def leave(self, route_class: str):
+        self.inflight[route_class] -= 1
+        inflight_gauge.set(self.inflight[route_class], route_class=route_class)
+
+
+admission_controller = AdmissionController(loop_lag_monitor)
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware applying AdmissionController to HTTP requests"""
+
+    def __init__(self, app, controller: AdmissionController = admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ADMISSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = classify_route(scope["path"])
+        reason = self.controller.shed_reason(route_class)
+        if reason is not None:
+            decisions_counter.inc(route_class=route_class, decision="shed", reason=reason)
+            await self._reject(send)
+            return
+
+        decisions_counter.inc(route_class=route_class, decision="admitted")
+        self.controller.enter(route_class)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.leave(route_class)
+
+    @staticmethod
+    async def _reject(send):
+        body = json.dumps({"detail": "Server is busy. Please retry later."}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(settings.ADMISSION_RETRY_AFTER).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,209 @@
+"""
+Content-addressed cache for analysis results.
+
+Results are keyed by hash(normalized code + language) together with the
+``AnalysisType`` and that analyzer's version, so the same snapshot analyzed
+again (re-runs, host re-checks, another session submitting identical code)
+reuses the stored ``AnalysisResults``. Bumping an entry in
+``ANALYZER_VERSIONS`` changes every key for that analyzer, which invalidates
+its old results without a flush.
+
+Lookups go through an in-process LRU first and Redis (the shared
+``redis_client``) second; while Redis is unavailable the LRU is the cache.
+
+Only analyzers whose output is a function of the code belong here. Keystroke
+scoring does not: its input is the session's key timings and the user's
+profile, so two sessions with the same code must not share a score.
+
+The contest similarity job's MinHash signatures are a second kind of entry
+(``get_signature``/``set_signature``): an opaque string under its own
+``signature:`` key that includes the signing parameters, so signatures never
+pass for analysis results and other parameters never match them.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Union
+
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.redis_client import redis_client
+from app.schemas import AnalysisResults, AnalysisType
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bump an analyzer's version whenever its output for the same input changes
+ANALYZER_VERSIONS: Dict[AnalysisType, str] = {
+    AnalysisType.TYPING_PATTERN: "1.0.0",
+    AnalysisType.ANOMALY_DETECTION: "1.0.0",
+    AnalysisType.SIMILARITY_ANALYSIS: "1.0.0",
+    AnalysisType.PLAGIARISM_DETECTION: "1.0.0",
+}
+
+cache_lookups = metrics.counter("analysis_cache_lookups_total", "Analysis cache lookups by result tier")
+cache_hit_rate = metrics.gauge("analysis_cache_hit_rate", "Share of analysis cache lookups served from cache")
+
+
+def normalize_code(code: str) -> str:
+    """Normalize line endings and trailing whitespace so formatting-only edits share a key"""
+    lines = code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+def content_hash(code: str, language: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(language.strip().lower().encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_code(code).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def cache_key(code: str, language: str, analysis_type: AnalysisType) -> str:
+    version = ANALYZER_VERSIONS[analysis_type]
+    return f"analysis:{analysis_type.value}:{version}:{content_hash(code, language)}"
+
+
+def signature_key(code: str, language: str, params: dict) -> str:
+    params_hash = hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return f"signature:{params_hash}:{content_hash(code, language)}"
+
+
+class AnalysisCache:
+    def __init__(self, max_items: int, ttl_seconds: int):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._local: "OrderedDict[str, Union[AnalysisResults, str]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lookups = 0
+        self._hits = 0
+
+    def _record(self, tier: str):
+        self._lookups += 1
+        if tier != "miss":
+            self._hits += 1
+        cache_lookups.inc(tier=tier)
+        cache_hit_rate.set(self._hits / self._lookups)
+
+    def _store_local(self, key: str, results: Union[AnalysisResults, str]):
+        self._local[key] = results
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_items:
+            self._local.popitem(last=False)
+
+    async def _redis_set(self, key: str, payload: str):
+        if settings.ANALYSIS_CACHE_REDIS_ENABLED:
+            try:
+                await redis_client.execute("SET", key, payload, "EX", self.ttl_seconds)
+            except RedisError as e:
+                redis_client.fallback("analysis_cache", e)
+
+    async def get(self, code: str, language: str, analysis_type: AnalysisType) -> Optional[AnalysisResults]:
+        key = cache_key(code, language, analysis_type)
+
+        results = self._local.get(key)
+        if results is not None:
+            self._local.move_to_end(key)
+            self._record("local")
+            return results
+
+        if settings.ANALYSIS_CACHE_REDIS_ENABLED:
+            try:
+                payload = await redis_client.execute("GET", key)
+                if payload is not None:
+                    results = AnalysisResults.model_validate_json(payload)
+                    self._store_local(key, results)
+                    self._record("redis")
+                    return results
+            except RedisError as e:
+                redis_client.fallback("analysis_cache", e)
+            except ValueError as e:
+                logger.warning(f"Analysis cache entry {key} is unreadable: {e}")
+
+        self._record("miss")
+        return None
+
+    async def set(self, code: str, language: str, analysis_type: AnalysisType, results: AnalysisResults):
+        key = cache_key(code, language, analysis_type)
+        self._store_local(key, results)
+        await self._redis_set(key, results.model_dump_json())
+
+    async def get_signature(self, code: str, language: str, params: dict) -> Optional[str]:
+        """A similarity signature stored for this code and these signing parameters"""
+        key = signature_key(code, language, params)
+        signature = self._local.get(key)
+        if signature is not None:
+            self._local.move_to_end(key)
+            self._record("local")
+            return signature
+
+        if settings.ANALYSIS_CACHE_REDIS_ENABLED:
+            try:
+                signature = await redis_client.execute("GET", key)
+                if signature is not None:
+                    self._store_local(key, signature)
+                    self._record("redis")
+                    return signature
+            except RedisError as e:
+                redis_client.fallback("analysis_cache", e)
+
+        self._record("miss")
+        return None
+
+    async def set_signature(self, code: str, language: str, params: dict, signature: str):
+        key = signature_key(code, language, params)
+        self._store_local(key, signature)
+        await self._redis_set(key, signature)
+
+    async def get_or_compute(
+        self,
+        code: str,
+        language: str,
+        analysis_type: AnalysisType,
+        compute: Callable[[], Awaitable[AnalysisResults]],
+    ) -> AnalysisResults:
+        """Return cached results, or run ``compute`` once even for concurrent callers"""
+        cached = await self.get(code, language, analysis_type)
+        if cached is not None:
+            return cached
+
+        key = cache_key(code, language, analysis_type)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            results = await compute()
+            await self.set(code, language, analysis_type, results)
+            future.set_result(results)
+            return results
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when no concurrent caller is waiting
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            del self._inflight[key]
+
+    def invalidate_local(self, analysis_type: Optional[AnalysisType] = None):
+        """Drop local entries (all, or one analyzer's); Redis entries expire via TTL"""
+        if analysis_type is None:
+            self._local.clear()
+            return
+        prefix = f"analysis:{analysis_type.value}:"
+        for key in [key for key in self._local if key.startswith(prefix)]:
+            del self._local[key]
+
+
+# Global analysis cache
+analysis_cache = AnalysisCache(
+    max_items=settings.ANALYSIS_CACHE_SIZE,
+    ttl_seconds=settings.ANALYSIS_CACHE_TTL,
+)
@@ -0,0 +1,291 @@
+"""
+Archive tier for raw events, compacted event chunks and analytics.
+
+Documents that are about to be removed by the TTL indexes are streamed into
+append-only, zstd-compressed NDJSON segment files. Every flush writes one
+independent zstd frame per session, and a small per-collection offset index
+(``index.ndjson``) maps each session to the frames that hold its documents.
+The replay reader memory-maps the segments so loading an archived session is a
+handful of slice + decompress operations. Event chunks are archived as stored
+(their ``data`` stays zstd-compressed BSON) and decoded on replay.
+
+Layout::
+
+    ARCHIVE_DIR/
+        events/
+            segment-000001.zst
+            index.ndjson
+            watermark.json
+        event_chunks/
+            ...
+        analytics/
+            ...
+
+``watermark.json`` records the time before which every document has been
+archived. It is checkpointed after each flushed batch, at a boundary between
+two timestamps, so a cycle that dies part-way resumes after the last durable
+batch instead of re-appending everything. A crash between a flush and its
+checkpoint can still append one batch twice, so readers skip ``_id``s they
+have already returned.
+"""
+
+import asyncio
+import json
+import logging
+import mmap
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import zstandard
+from bson import json_util
+
+from app.core.config import settings
+from app.db import get_database, ANALYTICS_TTL_SECONDS, EVENTS_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Collection name -> (TTL field, TTL seconds) as configured in create_indexes()
+ARCHIVED_COLLECTIONS = {
+    "events": ("created_at", EVENTS_TTL_SECONDS),
+    "event_chunks": ("created_at", EVENTS_TTL_SECONDS),
+    "analytics": ("processed_at", ANALYTICS_TTL_SECONDS),
+}
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".zst"
+INDEX_FILE = "index.ndjson"
+WATERMARK_FILE = "watermark.json"
+
+_JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+
+
+class SegmentStore:
+    """Append-only segment files plus the offset index for one collection"""
+
+    def __init__(self, root: str, collection: str):
+        self.directory = os.path.join(root, collection)
+        self.collection = collection
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, List[dict]]] = None
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._compressor = zstandard.ZstdCompressor(level=settings.ARCHIVE_COMPRESSION_LEVEL)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    # Index ---------------------------------------------------------------
+
+    def _load_index(self) -> Dict[str, List[dict]]:
+        if self._index is None:
+            index: Dict[str, List[dict]] = {}
+            path = os.path.join(self.directory, INDEX_FILE)
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        entry = json.loads(line)
+                        index.setdefault(entry["session_id"], []).append(entry)
+            self._index = index
+        return self._index
+
+    def sessions(self) -> List[str]:
+        """List session ids that have archived documents"""
+        with self._lock:
+            return list(self._load_index().keys())
+
+    # Writing -------------------------------------------------------------
+
+    def _current_segment(self) -> str:
+        segments = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        if segments:
+            latest = segments[-1]
+            if os.path.getsize(os.path.join(self.directory, latest)) < settings.ARCHIVE_SEGMENT_MAX_BYTES:
+                return latest
+            number = int(latest[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]) + 1
+        else:
+            number = 1
+        return f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}"
+
+    def append_sessions(self, batches: Dict[str, List[dict]]) -> int:
+        """Write one compressed frame per session and record it in the index"""
+        if not batches:
+            return 0
+
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            index = self._load_index()
+            segment = self._current_segment()
+            entries = []
+            written = 0
+
+            with open(os.path.join(self.directory, segment), "ab") as f:
+                for session_id, docs in batches.items():
+                    payload = "\n".join(
+                        json_util.dumps(doc, json_options=_JSON_OPTIONS) for doc in docs
+                    ).encode("utf-8")
+                    frame = self._compressor.compress(payload)
+                    offset = f.tell()
+                    f.write(frame)
+                    entries.append({
+                        "session_id": session_id,
+                        "segment": segment,
+                        "offset": offset,
+                        "length": len(frame),
+                        "count": len(docs),
+                    })
+                    written += len(docs)
+                f.flush()
+                os.fsync(f.fileno())
+
+            # The index is only appended once the frames are durable
+            with open(os.path.join(self.directory, INDEX_FILE), "a", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + "\n")
+                    index.setdefault(entry["session_id"], []).append(entry)
+
+            return written
+
+    def read_watermark(self) -> Optional[datetime]:
+        path = os.path.join(self.directory, WATERMARK_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return datetime.fromisoformat(json.load(f)["archived_until"])
+
+    def write_watermark(self, value: datetime):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, WATERMARK_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"archived_until": value.isoformat()}, f)
+        os.replace(tmp_path, path)
+
+    # Reading -------------------------------------------------------------
+
+    def _segment_map(self, segment: str, required_size: int) -> mmap.mmap:
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < required_size:
+            # The active segment grows; remap when an index entry points past the old view
+            if mapped is not None:
+                mapped.close()
+            with open(os.path.join(self.directory, segment), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+        return mapped
+
+    def read_session(self, session_id: str) -> List[dict]:
+        """Load every archived document of a session in archive order"""
+        with self._lock:
+            entries = list(self._load_index().get(session_id, []))
+            docs = []
+            seen = set()
+            for entry in entries:
+                end = entry["offset"] + entry["length"]
+                mapped = self._segment_map(entry["segment"], end)
+                payload = self._decompressor.decompress(mapped[entry["offset"]:end])
+                for line in payload.split(b"\n"):
+                    if line:
+                        doc = json_util.loads(line, json_options=_JSON_OPTIONS)
+                        # A batch re-appended after a crash before its checkpoint
+                        if doc.get("_id") in seen:
+                            continue
+                        seen.add(doc.get("_id"))
+                        docs.append(doc)
+            return docs
+
+    def close(self):
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+
+
+class ArchiveStore:
+    """Segment stores for every archived collection"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.stores = {name: SegmentStore(root, name) for name in ARCHIVED_COLLECTIONS}
+
+    def get(self, collection: str) -> SegmentStore:
+        if collection not in self.stores:
+            raise ValueError(f"Collection '{collection}' is not archived")
+        return self.stores[collection]
+
+    def close(self):
+        for store in self.stores.values():
+            store.close()
+
+
+archive_store = ArchiveStore(settings.ARCHIVE_DIR)
+
+
+async def archive_collection(collection: str, now: Optional[datetime] = None) -> int:
+    """Stream documents that will expire within the lead window into the archive"""
+    time_field, ttl_seconds = ARCHIVED_COLLECTIONS[collection]
+    store = archive_store.get(collection)
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(seconds=ttl_seconds) + timedelta(hours=settings.ARCHIVE_LEAD_HOURS)
+
+    watermark = await asyncio.to_thread(store.read_watermark)
+    query = {time_field: {"$lt": cutoff}}
+    if watermark is not None:
+        if watermark >= cutoff:
+            return 0
+        query[time_field]["$gte"] = watermark
+
+    database = await get_database()
+    cursor = database[collection].find(query).sort(time_field, 1).batch_size(1000)
+
+    pending: Dict[str, List[dict]] = {}
+    buffered = 0
+    archived = 0
+    last_stamp = None
+    async for doc in cursor:
+        stamp = doc.get(time_field)
+        if buffered >= settings.ARCHIVE_FLUSH_DOCS and stamp != last_stamp:
+            # Everything before ``stamp`` is buffered: flush it and checkpoint, so a crash resumes here
+            archived += await asyncio.to_thread(store.append_sessions, pending)
+            await asyncio.to_thread(store.write_watermark, stamp)
+            pending = {}
+            buffered = 0
+        session_id = str(doc.get("session_id") or "_unassigned")
+        pending.setdefault(session_id, []).append(doc)
+        buffered += 1
+        last_stamp = stamp
+
+    archived += await asyncio.to_thread(store.append_sessions, pending)
+    await asyncio.to_thread(store.write_watermark, cutoff)
+
+    if archived:
+        logger.info(f"Archived {archived} {collection} documents up to {cutoff.isoformat()}")
+    return archived
+
+
+async def run_archive_cycle() -> Dict[str, int]:
+    """Archive every collection that has a TTL index"""
+    results = {}
+    for collection in ARCHIVED_COLLECTIONS:
+        try:
+            results[collection] = await archive_collection(collection)
+        except Exception as e:
+            logger.error(f"Archiving {collection} failed: {e}")
+            results[collection] = 0
+    return results
+
+
+async def archive_scheduler():
+    """Run archive cycles forever at ARCHIVE_INTERVAL"""
+    while True:
+        await run_archive_cycle()
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL)
+
+
+async def load_archived_session(session_id: str, collection: str = "events") -> List[dict]:
+    """Replay archived documents for a session (off the event loop)"""
+    store = archive_store.get(collection)
+    return await asyncio.to_thread(store.read_session, session_id)
@@ -12,8 +12,8 @@ from app.db import get_users_collection
 
 logger = logging.getLogger(__name__)
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing (hashes below the minimum rounds, e.g. from an older policy, are upgraded on login)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__min_rounds=12)
 
 # JWT settings from config
 SECRET_KEY = settings.JWT_SECRET
@@ -28,7 +28,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
         return pwd_context.verify(plain_password, hashed_password)
     except Exception as e:
-        logger.error(f"Password verification error: {e}")
+        logger.error("Password verification error: %s", e)
         return False
 
 def get_password_hash(password: str) -> str:
@@ -36,7 +36,7 @@ def get_password_hash(password: str) -> str:
     try:
         return pwd_context.hash(password)
     except Exception as e:
-        logger.error(f"Password hashing error: {e}")
+        logger.error("Password hashing error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to hash password"
@@ -57,7 +57,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         
         return encoded_jwt
     except Exception as e:
-        logger.error(f"Token creation error: {e}")
+        logger.error("Token creation error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create access token"
@@ -88,10 +88,10 @@ def verify_token(token: str) -> TokenData:
         return token_data
         
     except JWTError as e:
-        logger.warning(f"JWT verification failed: {e}")
+        logger.warning("JWT verification failed: %s", e)
         raise credentials_exception
     except Exception as e:
-        logger.error(f"Token verification error: {e}")
+        logger.error("Token verification error: %s", e)
         raise credentials_exception
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
@@ -116,7 +116,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Get current user error: {e}")
+        logger.error("Get current user error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -158,20 +158,36 @@ async def authenticate_user(username: str, password: str, role: UserRole) -> Opt
         })
         
         if not user:
-            logger.warning(f"Authentication failed: User {username} with role {role.value} not found")
+            logger.warning("Authentication failed: User %s with role %s not found", username, role.value)
             return None
         
         if not verify_password(password, user["password_hashed"]):
-            logger.warning(f"Authentication failed: Invalid password for user {username}")
+            logger.warning("Authentication failed: Invalid password for user %s", username)
             return None
         
-        logger.info(f"User {username} authenticated successfully")
+        if pwd_context.needs_update(user["password_hashed"]):
+            await _upgrade_password_hash(user, password)
+        
+        logger.info("User %s authenticated successfully", username)
         return user
         
     except Exception as e:
-        logger.error(f"Authentication error: {e}")
+        logger.error("Authentication error: %s", e)
         return None
 
+async def _upgrade_password_hash(user: dict, password: str):
+    """Rehash a password stored with fewer rounds than the current policy"""
+    try:
+        password_hash = get_password_hash(password)
+        users_collection = await get_users_collection()
+        await users_collection.update_one(
+            {"_id": user["_id"]},
+            {"$set": {"password_hashed": password_hash, "updated_at": datetime.utcnow()}}
+        )
+        user["password_hashed"] = password_hash
+    except Exception as e:
+        logger.warning("Password hash upgrade failed for user %s: %s", user['username'], e)
+
 def create_user_token(user: dict) -> dict:
     """Create a complete token response for a user"""
     try:
@@ -198,7 +214,7 @@ def create_user_token(user: dict) -> dict:
             }
         }
     except Exception as e:
-        logger.error(f"Token creation error: {e}")
+        logger.error("Token creation error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create user token"
@@ -214,13 +230,13 @@ async def authenticate_websocket_token(token: str) -> Optional[dict]:
         user = await users_collection.find_one({"_id": token_data.user_id})
         
         if user is None:
-            logger.warning(f"WebSocket authentication failed: User {token_data.user_id} not found")
+            logger.warning("WebSocket authentication failed: User %s not found", token_data.user_id)
             return None
         
         return user
         
     except Exception as e:
-        logger.warning(f"WebSocket authentication error: {e}")
+        logger.warning("WebSocket authentication error: %s", e)
         return None
 
 # Security utilities
@@ -0,0 +1,196 @@
+"""
+Change-stream driven pushes to host dashboards.
+
+Instead of dashboards polling ``sessions`` and ``analytics``, every worker
+watches the database with one change stream, filtered server-side to the
+contests its dashboards are subscribed to, and fans each change out to those
+sockets:
+
+- ``sessions``: inserts and ``status`` changes (e.g. FLAGGED) as STATUS
+- ``analytics``: new or updated results as ANALYTICS for the session
+- ``leaderboards``: changed rows as ``leaderboard_delta``, so dashboards on
+  every worker see leaderboard updates no matter which worker wrote them
+
+The stream is only open while this worker has dashboard subscribers, and it is
+reopened from the last resume token whenever the set of subscribed contests
+changes, so no change is missed in between. The token is kept in memory only:
+each worker's stream has its own filter, and a restarted worker has no
+dashboards left to catch up (they reconnect and get a fresh snapshot), so a
+persisted token would only replay changes nobody is waiting for. When the last
+dashboard leaves the token is dropped, and the next stream starts from now.
+
+Change streams need a replica set (a single-node one is enough). On a
+standalone server the watcher stays off and writers push directly.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Iterable, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.core.config import settings
+from app.schemas import WSMessage, WSMessageType
+from app.db import db, get_database
+from app.leaderboard import ROW_PROJECTION
+from app.websocket_manager import manager
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+WATCHED_COLLECTIONS = ["sessions", "analytics", "leaderboards"]
+HISTORY_LOST_CODES = {260, 280, 286}  # InvalidResumeToken, ChangeStreamFatalError, ChangeStreamHistoryLost
+
+DOCUMENT_FIELDS = sorted(
+    {"contest_id", "session_id", "user_id", "status", "analysis_type", "results.confidence_score",
+     "results.risk_level", "results.flags", "processed_at"}
+    | {field for field, include in ROW_PROJECTION.items() if include}
+)
+
+change_stream_events = metrics.counter("change_stream_events_total", "Changes pushed to dashboards per collection")
+change_stream_restarts = metrics.counter("change_stream_restarts_total", "Change stream reopenings by reason")
+change_stream_lag_ms = metrics.summary("change_stream_lag_ms", "Time from the write to the push")
+
+
+def build_pipeline(contest_ids: Iterable[str]) -> list:
+    return [
+        {"$match": {
+            "ns.coll": {"$in": WATCHED_COLLECTIONS},
+            "operationType": {"$in": ["insert", "update", "replace"]},
+            "fullDocument.contest_id": {"$in": list(contest_ids)},
+            # Sessions only matter when they appear or change status
+            "$or": [
+                {"ns.coll": {"$ne": "sessions"}},
+                {"operationType": {"$ne": "update"}},
+                {"updateDescription.updatedFields.status": {"$exists": True}},
+            ],
+        }},
+        {"$project": {
+            "ns.coll": 1,
+            "wallTime": 1,
+            **{f"fullDocument.{field}": 1 for field in DOCUMENT_FIELDS},
+        }},
+    ]
+
+
+def build_message(collection: str, document: dict) -> Optional[WSMessage]:
+    contest_id = document.get("contest_id")
+    if collection == "sessions":
+        return WSMessage(
+            type=WSMessageType.STATUS,
+            session_id=document.get("session_id"),
+            data={"contest_id": contest_id, "user_id": document.get("user_id"), "status": document.get("status")},
+        )
+    if collection == "analytics":
+        return WSMessage(
+            type=WSMessageType.ANALYTICS,
+            session_id=document.get("session_id"),
+            data={
+                "contest_id": contest_id,
+                "analysis_type": document.get("analysis_type"),
+                "results": document.get("results", {}),
+            },
+        )
+    if collection == "leaderboards":
+        row = {field: document[field] for field, include in ROW_PROJECTION.items() if include and field in document}
+        return WSMessage(
+            type=WSMessageType.ANALYTICS,
+            data={"contest_id": contest_id, "leaderboard_delta": [row]},
+        )
+    return None
+
+
+class ChangeStreamWatcher:
+    def __init__(self):
+        self._resume_token = None
+        self._contests_changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start watching if the deployment supports change streams"""
+        if not settings.CHANGE_STREAMS_ENABLED:
+            return
+        try:
+            hello = await db.client.admin.command("hello")
+        except PyMongoError as e:
+            logger.warning(f"Change streams disabled, could not inspect the deployment: {e}")
+            return
+        if "setName" not in hello and hello.get("msg") != "isdbgrid":
+            logger.warning("Change streams disabled: MongoDB is not a replica set; dashboards get direct pushes")
+            return
+
+        manager.contest_listeners.append(self._contests_changed.set)
+        manager.change_stream_fanout = True
+        self._task = asyncio.create_task(self._run())
+        logger.info("Change-stream watcher started")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        manager.change_stream_fanout = False
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            self._contests_changed.clear()
+            contest_ids = list(manager.contest_subscribers)
+            if not contest_ids:
+                # Nobody to catch up: the next stream starts from now
+                self._resume_token = None
+                await self._contests_changed.wait()
+                continue
+
+            try:
+                await self._watch(contest_ids)
+                change_stream_restarts.inc(reason="contests_changed")
+            except OperationFailure as e:
+                if e.code in HISTORY_LOST_CODES:
+                    logger.warning(f"Change stream cannot resume ({e.code}), starting from now: {e}")
+                    self._resume_token = None
+                    change_stream_restarts.inc(reason="history_lost")
+                else:
+                    logger.error(f"Change stream failed: {e}")
+                    change_stream_restarts.inc(reason="error")
+                    await asyncio.sleep(1)
+            except PyMongoError as e:
+                # Resumable errors are retried by the driver; anything else reopens from the last token
+                logger.warning(f"Change stream interrupted: {e}")
+                change_stream_restarts.inc(reason="error")
+                await asyncio.sleep(1)
+
+    async def _watch(self, contest_ids: list):
+        database = await get_database()
+        async with database.watch(
+            build_pipeline(contest_ids),
+            full_document="updateLookup",
+            resume_after=self._resume_token,
+            max_await_time_ms=settings.CHANGE_STREAM_MAX_AWAIT_MS,
+        ) as stream:
+            while not self._contests_changed.is_set():
+                change = await stream.try_next()
+                if change is not None:
+                    await self._dispatch(change)
+                # Also advances on idle getMores (post-batch resume token)
+                self._resume_token = stream.resume_token
+
+    async def _dispatch(self, change: dict):
+        collection = change["ns"]["coll"]
+        document = change.get("fullDocument") or {}
+        contest_id = document.get("contest_id")
+        if not manager.has_contest_subscribers(contest_id):
+            return
+        message = build_message(collection, document)
+        if message is None:
+            return
+        await manager.broadcast_to_contest(contest_id, message)
+        change_stream_events.inc(collection=collection)
+        wall_time = change.get("wallTime")
+        if wall_time is not None:
+            change_stream_lag_ms.observe((datetime.utcnow() - wall_time).total_seconds() * 1000)
+
+
+# Global change-stream watcher (one stream per worker)
+change_stream_watcher = ChangeStreamWatcher()
@@ -0,0 +1,319 @@
+"""
+Compaction of completed sessions.
+
+While a session is active its events live as one document each in
+``events``, where every index pays for every keystroke. Once the session is
+COMPLETED those documents are only read for replay and review, so
+compaction folds them into:
+
+- ``event_chunks``: runs of ``COMPACTION_CHUNK_EVENTS`` events in timestamp
+  order, BSON-encoded and zstd-compressed (see ``app.reconstruction``)
+- ``sessions.final_code``: the reconstructed final document
+- ``sessions.analytics``: a frozen ``SessionAnalytics`` summary
+
+and then deletes the raw events in bulk. Chunks are written before anything
+is deleted and only the event ids that went into a chunk are removed, so a
+crash at any point is repaired by compacting again (``compaction.raw_deleted``
+stays false until the raw events are gone), and events that arrive after
+completion stay readable. A worker claims the session
+(``compacting_at``) before touching it, so two workers never compact the same
+session at once. The before/after storage and index sizes are
+recorded on the session as ``compaction``.
+
+Chunks keep the raw events' retention: each expires ``EVENTS_TTL_SECONDS``
+after its newest event was stored, and the archive job copies it to
+``ARCHIVE_DIR`` before then.
+
+Compaction is started when a session is completed, and a leader-elected
+sweep picks up completed sessions that were not compacted (e.g. after a
+restart).
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import bson
+from bson import Binary
+from pymongo import ReturnDocument
+
+from app.core.config import settings
+from app.schemas import EventType, SessionAnalytics, SessionStatus
+from app.db import (
+    get_database, get_sessions_collection, get_events_collection, get_event_chunks_collection,
+    get_leaderboards_collection,
+)
+from app.reconstruction import ChunkedRope, iter_changes, encode_event_chunk, decode_event_chunk, EVENT_CHUNK_CODEC
+from app.keystroke import PAUSE_MS
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_PAUSES = 100  # Longest pauses kept in the frozen summary
+CLAIM_TIMEOUT = timedelta(minutes=10)  # A claim older than this belongs to a worker that died
+
+sessions_compacted = metrics.counter("compaction_sessions_total", "Completed sessions compacted")
+compaction_events = metrics.counter("compaction_events_total", "Raw events folded into chunks")
+compaction_bytes = metrics.counter("compaction_bytes_total", "Event storage before and after compaction")
+compaction_ms = metrics.summary("compaction_ms", "Time to compact one session")
+
+
+class SummaryBuilder:
+    """Folds events (in timestamp order) into a SessionAnalytics summary"""
+
+    def __init__(self):
+        self.total = 0
+        self.keypresses = 0
+        self.pastes = 0
+        self.focus_changes = 0
+        self.first_t: Optional[int] = None
+        self.last_t: Optional[int] = None
+        self.last_key_t: Optional[int] = None
+        self.pauses: List[tuple] = []  # Min-heap of (gap ms, at ms)
+
+    def add(self, events: List[dict]):
+        for event in events:
+            t = event.get("timestamp") or 0
+            self.total += 1
+            if self.first_t is None:
+                self.first_t = t
+            self.last_t = t
+            event_type = event.get("event_type")
+            if event_type == EventType.KEYPRESS.value:
+                self.keypresses += 1
+                if self.last_key_t is not None and t - self.last_key_t >= PAUSE_MS:
+                    heapq.heappush(self.pauses, (t - self.last_key_t, t))
+                    if len(self.pauses) > MAX_PAUSES:
+                        heapq.heappop(self.pauses)
+                self.last_key_t = t
+            elif event_type == EventType.PASTE.value:
+                self.pastes += 1
+            elif event_type in (EventType.FOCUS.value, EventType.BLUR.value):
+                self.focus_changes += 1
+
+    def build(self, flags: List[str]) -> SessionAnalytics:
+        duration_ms = (self.last_t - self.first_t) if self.total else 0
+        minutes = duration_ms / 60000
+        return SessionAnalytics(
+            typing_speed=round(self.keypresses / minutes, 2) if minutes else 0.0,
+            pause_patterns=[round(gap / 1000, 3) for gap, _ in sorted(self.pauses, key=lambda pause: pause[1])],
+            copy_paste_frequency=self.pastes,
+            focus_changes=self.focus_changes,
+            anomaly_flags=flags,
+            total_events=self.total,
+            session_duration=duration_ms // 1000,
+        )
+
+
+async def _index_bytes_per_doc(collection: str) -> Optional[float]:
+    """Average index bytes per document, from ``$collStats``"""
+    try:
+        database = await get_database()
+        async for stat in database[collection].aggregate([{"$collStats": {"storageStats": {}}}]):
+            storage = stat.get("storageStats", {})
+            if storage.get("count"):
+                return storage.get("totalIndexSize", 0) / storage["count"]
+    except Exception as e:
+        logger.warning(f"Could not read {collection} index sizes: {e}")
+    return None
+
+
+async def _session_flags(session: dict) -> List[str]:
+    if not session.get("contest_id"):
+        return []
+    leaderboards_collection = await get_leaderboards_collection()
+    row = await leaderboards_collection.find_one(
+        {"contest_id": session["contest_id"], "session_id": session["session_id"]},
+        projection={"flags": 1},
+    )
+    return list((row or {}).get("flags") or [])
+
+
+async def _delete_raw(ids: List) -> int:
+    if not ids:
+        return 0
+    events_collection = await get_events_collection()
+    result = await events_collection.delete_many({"_id": {"$in": ids}})
+    return result.deleted_count
+
+
+def _build_chunk(session: dict, seq: int, events: List[dict]) -> tuple:
+    """Encode one chunk (CPU-bound, runs in a thread); returns (document, raw BSON bytes)"""
+    raw_bytes = sum(len(bson.encode(event)) for event in events)
+    document = {
+        "_id": f"{session['session_id']}:{seq}",
+        "session_id": session["session_id"],
+        "user_id": session.get("user_id"),
+        "contest_id": session.get("contest_id"),
+        "seq": seq,
+        "first_timestamp": events[0].get("timestamp"),
+        "last_timestamp": events[-1].get("timestamp"),
+        "count": len(events),
+        "codec": EVENT_CHUNK_CODEC,
+        "data": Binary(encode_event_chunk(events)),
+        # Expires (and is archived) when the newest raw event in it would have
+        "created_at": max(
+            (event["created_at"] for event in events if event.get("created_at")),
+            default=datetime.utcnow(),
+        ),
+    }
+    return document, raw_bytes
+
+
+async def _finish_interrupted(session: dict) -> int:
+    """Delete raw events left behind by a run that stopped after writing its chunks"""
+    chunks_collection = await get_event_chunks_collection()
+    deleted = 0
+    async for chunk in chunks_collection.find({"session_id": session["session_id"]}, projection={"data": 1}):
+        events = await asyncio.to_thread(decode_event_chunk, chunk["data"])
+        deleted += await _delete_raw([event["_id"] for event in events])
+    return deleted
+
+
+async def compact_session(session_id: str) -> Optional[Dict]:
+    """Fold a completed session's raw events into chunks and return the storage report"""
+    started = time.perf_counter()
+    sessions_collection = await get_sessions_collection()
+    session = await sessions_collection.find_one(
+        {"session_id": session_id},
+        projection={"session_id": 1, "user_id": 1, "contest_id": 1, "status": 1, "compaction": 1},
+    )
+    if session is None or session.get("status") != SessionStatus.COMPLETED.value:
+        return None
+    if session.get("compaction"):
+        if not session["compaction"].get("raw_deleted"):
+            deleted = await _finish_interrupted(session)
+            await sessions_collection.update_one(
+                {"session_id": session_id}, {"$set": {"compaction.raw_deleted": True}}
+            )
+            logger.info(f"Removed {deleted} leftover raw events of compacted session {session_id}")
+        return session["compaction"]
+
+    now = datetime.utcnow()
+    claimed = await sessions_collection.update_one(
+        {
+            "session_id": session_id,
+            "compaction": {"$exists": False},
+            "$or": [{"compacting_at": {"$exists": False}}, {"compacting_at": {"$lt": now - CLAIM_TIMEOUT}}],
+        },
+        {"$set": {"compacting_at": now}},
+    )
+    if not claimed.modified_count:
+        return None  # Another worker is compacting it
+
+    events_collection = await get_events_collection()
+    chunks_collection = await get_event_chunks_collection()
+    await chunks_collection.delete_many({"session_id": session_id})  # From an interrupted first attempt
+    index_before = await _index_bytes_per_doc("events")
+
+    rope = ChunkedRope()
+    summary = SummaryBuilder()
+    chunk_ids: List[List] = []
+    raw_bytes = compacted_bytes = 0
+    buffer: List[dict] = []
+
+    async def flush():
+        nonlocal raw_bytes, compacted_bytes
+        document, raw = await asyncio.to_thread(_build_chunk, session, len(chunk_ids), buffer)
+        await chunks_collection.insert_one(document)
+        raw_bytes += raw
+        compacted_bytes += len(bson.encode(document))
+        chunk_ids.append([event["_id"] for event in buffer])
+        summary.add(buffer)
+        for event in buffer:
+            for offset, length, text in iter_changes((event.get("data") or {}).get("changes")):
+                rope.replace(offset, length, text)
+
+    # _id breaks timestamp ties, so events of one millisecond always land in the same order
+    cursor = events_collection.find(
+        {"session_id": session_id, "user_id": session["user_id"]}
+    ).sort([("timestamp", 1), ("_id", 1)])
+    async for event in cursor.batch_size(settings.COMPACTION_CHUNK_EVENTS):
+        buffer.append(event)
+        if len(buffer) >= settings.COMPACTION_CHUNK_EVENTS:
+            await flush()
+            buffer = []
+    if buffer:
+        await flush()
+
+    events = summary.total
+    index_after = await _index_bytes_per_doc("event_chunks")
+    report = {
+        "events": events,
+        "chunks": len(chunk_ids),
+        "raw_bytes": raw_bytes,
+        "raw_index_bytes": round(index_before * events) if index_before is not None else None,
+        "compacted_bytes": compacted_bytes,
+        "compacted_index_bytes": round(index_after * len(chunk_ids)) if index_after is not None else None,
+        "compression_ratio": round(raw_bytes / compacted_bytes, 2) if compacted_bytes else None,
+        "compacted_at": datetime.utcnow(),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        "raw_deleted": False,
+    }
+
+    # Chunks are durable; the session now points at them, then the raw events go
+    await sessions_collection.update_one(
+        {"session_id": session_id},
+        {"$set": {
+            "final_code": rope.text(),
+            "analytics": summary.build(await _session_flags(session)).model_dump(),
+            "compaction": report,
+            "updated_at": datetime.utcnow(),
+        }, "$unset": {"compacting_at": ""}},
+    )
+    deleted = 0
+    for ids in chunk_ids:
+        deleted += await _delete_raw(ids)
+    await sessions_collection.update_one({"session_id": session_id}, {"$set": {"compaction.raw_deleted": True}})
+    report["raw_deleted"] = True
+
+    sessions_compacted.inc()
+    compaction_events.inc(events)
+    compaction_bytes.inc(raw_bytes, stage="before")
+    compaction_bytes.inc(compacted_bytes, stage="after")
+    compaction_ms.observe(report["duration_ms"])
+    logger.info(
+        f"Compacted session {session_id}: {events} events ({deleted} deleted) into {len(chunk_ids)} chunks, "
+        f"{raw_bytes} -> {compacted_bytes} bytes, index ~{report['raw_index_bytes']} -> "
+        f"~{report['compacted_index_bytes']} bytes"
+    )
+    return report
+
+
+async def complete_session(session_id: str, user_id: str) -> Optional[dict]:
+    """Mark the user's active session COMPLETED; None if there is no such active session"""
+    sessions_collection = await get_sessions_collection()
+    return await sessions_collection.find_one_and_update(
+        {"session_id": session_id, "user_id": user_id, "status": SessionStatus.ACTIVE.value},
+        {"$set": {"status": SessionStatus.COMPLETED.value, "completed_at": datetime.utcnow(),
+                  "updated_at": datetime.utcnow()}},
+        projection={"_id": 0, "session_id": 1, "contest_id": 1, "status": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def compact_pending_sessions() -> int:
+    """Compact completed sessions that have not been (fully) compacted yet"""
+    sessions_collection = await get_sessions_collection()
+    cursor = sessions_collection.find(
+        {"status": SessionStatus.COMPLETED.value, "compaction.raw_deleted": {"$ne": True}},
+        projection={"session_id": 1},
+    )
+    compacted = 0
+    async for session in cursor:
+        try:
+            if await compact_session(session["session_id"]) is not None:
+                compacted += 1
+        except Exception as e:
+            logger.error(f"Compacting session {session['session_id']} failed: {e}")
+    return compacted
+
+
+async def compaction_scheduler():
+    """Sweep for uncompacted completed sessions every COMPACTION_SWEEP_INTERVAL"""
+    while True:
+        await compact_pending_sessions()
+        await asyncio.sleep(settings.COMPACTION_SWEEP_INTERVAL)
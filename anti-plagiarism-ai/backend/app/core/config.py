@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 import os
 
 class Settings(BaseSettings):
@@ -17,16 +17,160 @@ class Settings(BaseSettings):
     
     # Application Configuration
     DEBUG: bool = True
+    HOST: str = "0.0.0.0"
+    PORT: int = 9000
+    WORKERS: int = 1  # Server processes for `python -m app.server`; 0 = one per CPU core
     LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # json or text
+    LOG_QUEUE_SIZE: int = 10000  # Records buffered for the writer thread; extra records are dropped
+    LOG_RATE_LIMIT_BURST: int = 10  # WARNING records per message template per window (0 = off)
+    LOG_RATE_LIMIT_WINDOW: float = 10.0
     
     # WebSocket Configuration
     WS_HEARTBEAT_INTERVAL: int = 30
     WS_MAX_CONNECTIONS: int = 1000
+    LEADERBOARD_SNAPSHOT_SIZE: int = 200  # Rows sent when a dashboard subscribes
+    WS_SEND_QUEUE_SIZE: int = 256  # Outbound messages buffered per connection
+    WS_SEND_TIMEOUT: float = 10.0  # A socket that cannot take a message for this long is disconnected
+    # Outbound policy per message type: coalesce (keep latest), reliable (never dropped) or drop (when full)
+    WS_QUEUE_POLICIES: Dict[str, str] = {
+        "status": "coalesce",
+        "analytics": "coalesce",
+        "acknowledgment": "reliable",
+        "error": "reliable",
+    }
     
     # Analytics Configuration
     ANALYTICS_BATCH_SIZE: int = 100
     ANALYTICS_PROCESSING_INTERVAL: int = 60
     
+    # Admission Control Configuration
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_LAG_THRESHOLD_MS: float = 100.0  # Shed low-priority routes above this lag
+    ADMISSION_LAG_CRITICAL_MS: float = 500.0  # Shed everything but ingest/heartbeat above this lag
+    ADMISSION_MAX_INFLIGHT_NORMAL: int = 256
+    ADMISSION_MAX_INFLIGHT_LOW: int = 32
+    ADMISSION_RETRY_AFTER: int = 5
+    LOOP_LAG_INTERVAL: float = 0.1
+    
+    # Diagnostics Configuration
+    PROFILING_ENABLED: bool = False
+    PROFILING_TOKEN: Optional[str] = None  # Value of the X-Profile header that triggers profiling
+    PROFILING_MAX_STORED: int = 20
+    SLOW_CALLBACK_WATCHDOG_ENABLED: bool = True
+    SLOW_CALLBACK_THRESHOLD_MS: float = 200.0
+    SLOW_ENDPOINT_WINDOW: int = 300  # Seconds of latency history for the slow-endpoint report
+    
+    # Redis Client Configuration (one pool per worker, auto-pipelined, behind a circuit breaker)
+    REDIS_MAX_CONNECTIONS: int = 20
+    REDIS_SOCKET_TIMEOUT: float = 1.0  # Also bounds one pipelined round-trip
+    REDIS_SLOW_MS: float = 100.0  # Round-trips slower than this (minus event-loop lag) count as failures
+    REDIS_BREAKER_THRESHOLD: int = 5  # Consecutive failures that open the circuit
+    REDIS_BREAKER_RESET: float = 10.0  # Seconds before a probe is let through
+    REDIS_PIPELINE_MAX: int = 256  # Most commands sent in one round-trip
+    
+    # Health Probe Configuration (dependency checks cached by one background prober per worker)
+    HEALTH_PROBE_INTERVAL: float = 5.0
+    HEALTH_PROBE_TIMEOUT: float = 2.0
+    HEALTH_MAX_POOL_QUEUE: int = 100  # Queued thread-pool jobs before readiness reports degraded
+    
+    # Ingestion Configuration
+    DEDUPE_WINDOW: int = 256  # Sequences remembered below the high-water mark
+    DEDUPE_MAX_SESSIONS: int = 50000
+    DEDUPE_REDIS_ENABLED: bool = True
+    DEDUPE_REDIS_TTL: int = 86400
+    WIRE_MAX_DECOMPRESSED_BYTES: int = 8 * 1024 * 1024
+    INGEST_SESSION_CACHE_SIZE: int = 50000  # Session owners cached per worker (ownership never changes)
+    
+    # Analysis Cache Configuration
+    ANALYSIS_CACHE_SIZE: int = 2048  # In-process LRU entries
+    ANALYSIS_CACHE_TTL: int = 7 * 24 * 3600
+    ANALYSIS_CACHE_REDIS_ENABLED: bool = True
+    
+    # Similarity Configuration
+    TOKENIZER_CACHE_SIZE: int = 4096  # Memoized token arrays per process
+    SIMILARITY_WORKERS: int = 0  # 0 = one process per CPU core
+    SIMILARITY_KGRAM: int = 5  # Tokens per fingerprinted k-gram
+    SIMILARITY_WINDOW: int = 4  # Winnowing window
+    SIMILARITY_NUM_PERM: int = 128  # MinHash signature length
+    SIMILARITY_BANDS: int = 32  # LSH bands (must divide SIMILARITY_NUM_PERM)
+    SIMILARITY_MAX_BUCKET: int = 500  # Cap on members paired from one LSH bucket (identical signatures are exempt)
+    SIMILARITY_LOAD_BATCH: int = 100  # Uncompacted sessions rebuilt per events query
+    SIMILARITY_REPORT_THRESHOLD: float = 0.5
+    SIMILARITY_CLUSTER_THRESHOLD: float = 0.8
+    
+    # Corpus Configuration (known solutions matched against pastes)
+    CORPUS_ENABLED: bool = False
+    CORPUS_DIR: str = "corpus"
+    CORPUS_INDEX_DIR: str = "corpus_index"
+    CORPUS_KGRAM: int = 8  # Longer than SIMILARITY_KGRAM: pastes are short, boilerplate is common
+    CORPUS_WINDOW: int = 4
+    CORPUS_MIN_FINGERPRINTS: int = 5  # Ignore pastes too short to fingerprint reliably
+    CORPUS_MATCH_THRESHOLD: float = 0.5  # Share of paste fingerprints found in one document
+    CORPUS_MAX_DOC_FREQUENCY: int = 50  # Fingerprints in more documents than this are boilerplate
+    CORPUS_MAX_FILE_BYTES: int = 1024 * 1024
+    CORPUS_DELTA_MAX_ENTRIES: int = 1_000_000  # Compact the delta into the base past this
+    CORPUS_SYNC_INTERVAL: float = 3600.0  # Seconds between CORPUS_DIR syncs by the corpus leader
+    CORPUS_RELOAD_INTERVAL: float = 5.0  # Seconds between checks for an index rewritten by another worker
+    
+    # Rollup Configuration (dashboard activity buckets)
+    ROLLUP_FLUSH_INTERVAL: float = 1.0  # Seconds between rollup bulk writes
+    ROLLUP_MAX_POINTS: int = 720  # Most buckets returned for one chart
+    
+    # Provisioning Configuration (bulk student registration)
+    PROVISIONING_MAX_ROWS: int = 5000  # Largest roster accepted in one request
+    PROVISIONING_HASH_WORKERS: int = 0  # bcrypt threads; 0 = one per CPU core
+    
+    # Export Configuration
+    EXPORT_BATCH_SIZE: int = 1000  # Documents per cursor batch, CSV/NDJSON chunk and Parquet row group
+    EXPORT_DIR: str = "exports"  # Where background export jobs write their files (shared by every worker)
+    
+    # Keystroke Dynamics Configuration
+    KEYSTROKE_ENABLED: bool = True
+    KEYSTROKE_MIN_KEYS: int = 300  # Keypresses before a session is scored or folded into a profile
+    KEYSTROKE_SCORE_EVERY: int = 200  # Rescore after this many new keypresses
+    KEYSTROKE_PROFILE_SESSIONS: int = 20  # Session vectors kept per user
+    KEYSTROKE_MIN_PROFILE_SESSIONS: int = 3
+    KEYSTROKE_MIN_SPREAD: float = 0.02  # Floor for users whose sessions are nearly identical
+    KEYSTROKE_FLAG_THRESHOLD: float = 0.7
+    KEYSTROKE_MAX_SESSIONS: int = 20000  # Session states cached per worker
+    KEYSTROKE_MAX_PROFILES: int = 20000  # Profiles cached per worker
+    KEYSTROKE_PROFILE_TTL: float = 300.0  # Seconds a cached profile is used before re-reading it
+    KEYSTROKE_IDLE_FOLD: float = 3600.0  # Fold sessions without keypresses for this long into profiles
+    
+    # Reconstruction Configuration
+    RECONSTRUCTION_CHECKPOINT_INTERVAL: int = 1000  # Edits between full-text checkpoints
+    
+    # Compaction Configuration (raw events of completed sessions folded into compressed chunks)
+    COMPACTION_ENABLED: bool = True
+    COMPACTION_CHUNK_EVENTS: int = 2000  # Events per chunk document
+    COMPACTION_COMPRESSION_LEVEL: int = 9
+    COMPACTION_SWEEP_INTERVAL: int = 300  # Seconds between sweeps for completed, uncompacted sessions
+    
+    # Change Stream Configuration (needs a replica set; falls back to direct pushes without one)
+    CHANGE_STREAMS_ENABLED: bool = True
+    CHANGE_STREAM_MAX_AWAIT_MS: int = 1000  # Longest wait per getMore; also bounds filter-change latency
+    
+    # Index Audit Configuration
+    INDEX_AUDIT_ENABLED: bool = False  # Record query shapes for GET /admin/indexes (small per-query cost)
+    INDEX_AUDIT_MAX_SHAPES: int = 1000  # Distinct shapes tracked; later new shapes are only counted as overflow
+    
+    # Leader Election Configuration (cluster-wide background jobs)
+    LEADER_LEASE_TTL: float = 15.0  # Seconds a lease survives without renewal
+    LEADER_RENEW_INTERVAL: float = 5.0
+    
+    # Background Job Configuration (similarity and export job status in the jobs collection)
+    JOB_STALE_AFTER: float = 6 * 3600  # A job still "running" after this is treated as dead and may be restarted
+    
+    # Archive Configuration (raw events/analytics kept past their TTL)
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_DIR: str = "archive"
+    ARCHIVE_LEAD_HOURS: int = 24  # Archive this long before the TTL deletes
+    ARCHIVE_INTERVAL: int = 3600
+    ARCHIVE_SEGMENT_MAX_BYTES: int = 64 * 1024 * 1024
+    ARCHIVE_FLUSH_DOCS: int = 5000
+    ARCHIVE_COMPRESSION_LEVEL: int = 3
+    
     # CORS Configuration
     ALLOWED_ORIGINS: list = [
         "http://localhost:5000",
@@ -0,0 +1,161 @@
+"""
+Non-blocking log pipeline.
+
+Log calls on the event loop only build a ``LogRecord`` and put it on a
+bounded in-memory queue (``QueueHandler``); a ``QueueListener`` thread does
+the formatting and the blocking write to stderr. Messages are formatted
+lazily: ``logger.warning("Failed login: %s", username)`` is only rendered by
+the listener, and only if the record survived filtering.
+
+Repetitive warnings are rate limited before they are queued: each WARNING
+template (the unformatted ``msg``) may log ``LOG_RATE_LIMIT_BURST`` times per
+``LOG_RATE_LIMIT_WINDOW`` seconds, and the next record that gets through
+carries the number of suppressed ones. Only warnings are limited: INFO records
+include audit lines (logins) that must all be kept, and errors are always
+written. ``uvicorn.access`` has its own unfiltered handler, so every request
+is logged. Rate limiting only works for lazily formatted calls; f-string
+messages are all distinct.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.metrics import metrics
+
+log_records_dropped = metrics.counter("log_records_dropped_total", "Log records not written, by reason")
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+_TRACKED_TEMPLATES = 10000  # Bound on templates counted per window
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", None)
+        return f"{text} ({suppressed} similar messages suppressed)" if suppressed else text
+
+
+class RateLimitFilter(logging.Filter):
+    """Let each message template at ``level`` through at most ``burst`` times per window"""
+
+    def __init__(self, burst: int, window: float, level: int = logging.WARNING):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.level = level
+        self._window_start = time.monotonic()
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self._suppressed: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != self.level:
+            return True
+        key = (record.name, str(record.msg))
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.window:
+                # Carry suppressed counts over so the next record can report them
+                for template, count in self._counts.items():
+                    if count > self.burst:
+                        self._suppressed[template] = self._suppressed.get(template, 0) + count - self.burst
+                self._counts = {}
+                self._window_start = now
+
+            count = self._counts.get(key, 0)
+            if count == 0 and len(self._counts) >= _TRACKED_TEMPLATES:
+                return True
+            self._counts[key] = count + 1
+            if count >= self.burst:
+                log_records_dropped.inc(reason="rate_limited")
+                return False
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that neither formats on the caller's thread nor blocks when full"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener is in-process, so the record does not need to be pickled;
+        # leaving msg/args alone keeps formatting on the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc(reason="queue_full")
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging():
+    """Route the root and uvicorn loggers through the queue (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    sink = logging.StreamHandler(sys.stderr)
+    if settings.LOG_FORMAT == "json":
+        sink.setFormatter(JSONFormatter())
+    else:
+        sink.setFormatter(TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    records = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(records)
+    if settings.LOG_RATE_LIMIT_BURST > 0:
+        handler.addFilter(RateLimitFilter(settings.LOG_RATE_LIMIT_BURST, settings.LOG_RATE_LIMIT_WINDOW))
+    access_handler = NonBlockingQueueHandler(records)  # Access lines are never rate limited
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(getattr(logging, settings.LOG_LEVEL))
+    # uvicorn installs its own synchronous handlers before importing the app
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = [access_handler if name == "uvicorn.access" else handler]
+        uvicorn_logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, sink, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Write out queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,546 @@
+"""
+Pasted-content matching against a local corpus of known solutions.
+
+Reference solutions are read from ``CORPUS_DIR``. Each file is tokenized
+for the language its extension names, hashed into token k-grams and winnowed (the same fingerprinting the contest
+similarity job uses), and every ``(fingerprint, document)`` pair goes into an
+index under ``CORPUS_INDEX_DIR``:
+
+- ``base.hashes`` / ``base.docs``: sorted uint64 fingerprints and the parallel
+  uint32 document ids, opened with ``np.memmap`` so the index is paged in by
+  the OS instead of being loaded into every worker's heap.
+- ``delta.bin``: appended ``(fingerprint, document)`` records for documents
+  added since the last compaction, kept sorted in memory.
+- ``base.common``: sorted fingerprints shared by more than
+  ``CORPUS_MAX_DOC_FREQUENCY`` documents. They are boilerplate (loop headers,
+  ``main`` signatures), so compaction drops them from the base and lookups
+  leave them out of a paste's coverage.
+- ``manifest.json``: document names, content hashes and retired flags.
+
+A paste is fingerprinted the same way and looked up with ``searchsorted`` in
+both parts; the best document is the one sharing the largest share of the
+paste's fingerprints. Adding or changing corpus files only appends to the
+delta; ``compact`` folds the delta into a new base once it grows too large.
+
+Every worker process maps the same index directory. Writers (sync, add,
+retire, compact) hold an exclusive ``flock`` on ``index.lock`` and re-read the
+files first, so document ids always follow what is on disk, never one
+worker's in-memory view; readers take the lock shared. Only the holder of the
+``corpus`` lease syncs ``CORPUS_DIR`` (``corpus_sync_job``). Every worker
+opens the index read-only and ``corpus_reloader`` reloads it whenever
+``manifest.json`` is replaced, so a sync by the leader or through
+``POST /admin/corpus/sync`` on any worker reaches all of them within
+``CORPUS_RELOAD_INTERVAL``.
+
+Lookups never see a half-updated index: loads and writes rebuild the
+in-memory state under the lock and then publish it as one ``CorpusSnapshot``
+(a single reference assignment). ``match`` reads that reference once, so a
+paste is always matched against a single generation of the manifest, base
+maps, delta and retired flags.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads in this process are serialized
+    fcntl = None
+
+import numpy as np
+
+from app.core.config import settings
+from app.similarity import kgram_hashes, winnow
+from app.tokenizer import tokenize, language_for_path
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+RECORD_DTYPE = np.dtype([("hash", "<u8"), ("doc", "<u4")])
+
+paste_checks = metrics.counter("corpus_paste_checks_total", "Pastes checked against the corpus")
+paste_matches = metrics.counter("corpus_paste_matches_total", "Pastes matching a corpus document")
+paste_match_ms = metrics.summary("corpus_paste_match_ms", "Corpus lookup time per paste")
+
+
+def _empty_hashes() -> np.ndarray:
+    return np.empty(0, dtype=np.uint64)
+
+
+def _empty_docs() -> np.ndarray:
+    return np.empty(0, dtype=np.uint32)
+
+
+def _contains(sorted_hashes: np.ndarray, query: np.ndarray) -> np.ndarray:
+    if len(sorted_hashes) == 0:
+        return np.zeros(len(query), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_hashes, query), len(sorted_hashes) - 1)
+    return sorted_hashes[positions] == query
+
+
+def _lookup(hashes: np.ndarray, docs: np.ndarray, query: np.ndarray, max_docs: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Document ids of index entries matching ``query``, and which query entries are too common"""
+    if len(hashes) == 0 or len(query) == 0:
+        return _empty_docs(), np.zeros(len(query), dtype=bool)
+    left = np.searchsorted(hashes, query, side="left")
+    right = np.searchsorted(hashes, query, side="right")
+    counts = right - left
+    common = counts > max_docs
+    counts[common] = 0
+    total = int(counts.sum())
+    if total == 0:
+        return _empty_docs(), common
+    starts = np.repeat(left, counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.asarray(docs[starts + offsets]), common
+
+
+def _atomic_write(path: str, data: bytes):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class CorpusSnapshot:
+    """One published generation of the index; never modified after it is built"""
+
+    __slots__ = ("names", "base_hashes", "base_docs", "delta_hashes", "delta_docs", "common", "retired")
+
+    def __init__(self, names: Tuple[str, ...], base_hashes: np.ndarray, base_docs: np.ndarray,
+                 delta_hashes: np.ndarray, delta_docs: np.ndarray, common: np.ndarray, retired: np.ndarray):
+        self.names = names
+        self.base_hashes = base_hashes
+        self.base_docs = base_docs
+        self.delta_hashes = delta_hashes
+        self.delta_docs = delta_docs
+        self.common = common
+        self.retired = retired
+
+
+EMPTY_SNAPSHOT = CorpusSnapshot((), _empty_hashes(), _empty_docs(), _empty_hashes(), _empty_docs(),
+                                _empty_hashes(), np.zeros(0, dtype=bool))
+
+
+class CorpusIndex:
+    def __init__(self, index_dir: str, k: int, window: int):
+        self.index_dir = index_dir
+        self.k = k
+        self.window = window
+        self.documents: List[dict] = []
+        self._base_hashes = _empty_hashes()
+        self._base_docs = _empty_docs()
+        self._delta_hashes = _empty_hashes()
+        self._delta_docs = _empty_docs()
+        self._common = _empty_hashes()
+        self._retired = np.zeros(0, dtype=bool)
+        self._snapshot = EMPTY_SNAPSHOT  # What lookups read; the fields above are the writers' working copy
+        self._lock = threading.Lock()  # Threads in this process; index.lock covers other processes
+        self._manifest_stamp: Optional[tuple] = None
+        self.loaded = False
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, name)
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        """Hold the index lock across threads and worker processes"""
+        with self._lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            with open(self._path("index.lock"), "a+b") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _current_stamp(self) -> Optional[tuple]:
+        try:
+            stat = os.stat(self._path("manifest.json"))
+        except FileNotFoundError:
+            return None
+        # The manifest is always replaced, so the inode changes on every write
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def fingerprint(self, code: str, language: Optional[str] = None) -> np.ndarray:
+        return winnow(kgram_hashes(tokenize(code, language), self.k), self.window)
+
+    # ---- persistence -------------------------------------------------------
+
+    def _save_manifest(self):
+        manifest = {
+            "version": INDEX_VERSION,
+            "kgram": self.k,
+            "window": self.window,
+            "documents": self.documents,
+        }
+        _atomic_write(self._path("manifest.json"), json.dumps(manifest).encode("utf-8"))
+        self._manifest_stamp = self._current_stamp()
+
+    def _map_base(self):
+        hashes_path = self._path("base.hashes")
+        docs_path = self._path("base.docs")
+        if os.path.exists(hashes_path) and os.path.getsize(hashes_path) > 0:
+            self._base_hashes = np.memmap(hashes_path, dtype=np.uint64, mode="r")
+            self._base_docs = np.memmap(docs_path, dtype=np.uint32, mode="r")
+        else:
+            self._base_hashes = _empty_hashes()
+            self._base_docs = _empty_docs()
+        common_path = self._path("base.common")
+        if os.path.exists(common_path) and os.path.getsize(common_path) > 0:
+            self._common = np.memmap(common_path, dtype=np.uint64, mode="r")
+        else:
+            self._common = _empty_hashes()
+
+    def _set_delta(self, records: np.ndarray):
+        order = np.argsort(records["hash"], kind="stable")
+        self._delta_hashes = np.ascontiguousarray(records["hash"][order])
+        self._delta_docs = np.ascontiguousarray(records["doc"][order])
+
+    def _delta_records(self) -> np.ndarray:
+        records = np.empty(len(self._delta_hashes), dtype=RECORD_DTYPE)
+        records["hash"] = self._delta_hashes
+        records["doc"] = self._delta_docs
+        return records
+
+    def _refresh_retired(self):
+        self._retired = np.array([doc.get("retired", False) for doc in self.documents], dtype=bool)
+
+    def _publish(self):
+        """Make the working state visible to lookups as one new snapshot (caller holds the lock)"""
+        self._snapshot = CorpusSnapshot(
+            names=tuple(doc["name"] for doc in self.documents),
+            base_hashes=self._base_hashes,
+            base_docs=self._base_docs,
+            delta_hashes=self._delta_hashes,
+            delta_docs=self._delta_docs,
+            common=self._common,
+            retired=self._retired.copy(),
+        )
+
+    def _load(self, writable: bool):
+        """Read the index files (caller holds the lock); only a writer rebuilds a stale index"""
+        manifest_path = self._path("manifest.json")
+        stamp = self._current_stamp()
+        documents = []
+        if stamp is not None:
+            with open(manifest_path, "rb") as f:
+                manifest = json.load(f)
+            if (manifest.get("version") == INDEX_VERSION
+                    and manifest.get("kgram") == self.k
+                    and manifest.get("window") == self.window):
+                documents = manifest["documents"]
+            elif writable:
+                logger.warning("Corpus index was built with different parameters, rebuilding")
+                self._reset()
+                stamp = self._manifest_stamp
+            else:
+                logger.warning("Corpus index was built with different parameters, waiting for a rebuild")
+        elif writable:
+            self._reset()
+            stamp = self._manifest_stamp
+
+        self.documents = documents
+        self._map_base()
+        delta_path = self._path("delta.bin")
+        records = np.fromfile(delta_path, dtype=RECORD_DTYPE) if os.path.exists(delta_path) else None
+        if records is not None and len(records):
+            # Drop records of documents the manifest never recorded (crash mid-add)
+            known = records[records["doc"] < len(documents)]
+            if writable and len(known) < len(records):
+                _atomic_write(delta_path, known.tobytes())  # Their ids are about to be reused
+            self._set_delta(known)
+        else:
+            self._delta_hashes = _empty_hashes()
+            self._delta_docs = _empty_docs()
+        self._refresh_retired()
+        self._publish()
+        self._manifest_stamp = stamp
+        self.loaded = True
+
+    def open(self):
+        """Load the manifest, map the base index and read the delta log (read-only)"""
+        with self._locked(exclusive=False):
+            self._load(writable=False)
+        logger.info(f"Corpus index opened: {self.active_documents()} documents, "
+                    f"{len(self._base_hashes)} base + {len(self._delta_hashes)} delta fingerprints")
+
+    def reload_if_changed(self) -> bool:
+        """Re-open the index if another process rewrote the manifest"""
+        if self._current_stamp() == self._manifest_stamp:
+            return False
+        self.open()
+        return True
+
+    def _reset(self):
+        self.documents = []
+        for name in ("base.hashes", "base.docs", "base.common", "delta.bin"):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        self._delta_hashes = _empty_hashes()
+        self._delta_docs = _empty_docs()
+        self._save_manifest()
+
+    # ---- updates -----------------------------------------------------------
+
+    def add_documents(self, items: List[Tuple[str, str, Optional[str]]]) -> List[int]:
+        """Index ``(name, code, sha256)`` reference solutions by appending them to the delta"""
+        if not items:
+            return []
+        prints = [self.fingerprint(code, language_for_path(name)) for name, code, _ in items]
+        with self._locked(exclusive=True):
+            self._load(writable=True)
+            return self._append(items, prints)
+
+    def _append(self, items: List[Tuple[str, str, Optional[str]]], prints: List[np.ndarray]) -> List[int]:
+        """Append fingerprinted documents (caller holds the exclusive lock on a fresh load)"""
+        if not items:
+            return []
+        first_id = len(self.documents)
+        records = np.empty(sum(len(p) for p in prints), dtype=RECORD_DTYPE)
+        records["hash"] = np.concatenate(prints)
+        records["doc"] = np.repeat(
+            np.arange(first_id, first_id + len(items), dtype=np.uint32),
+            [len(p) for p in prints],
+        )
+
+        with open(self._path("delta.bin"), "ab") as f:
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        for (name, code, digest), fingerprints in zip(items, prints):
+            self.documents.append({
+                "name": name,
+                "sha256": digest or hashlib.sha256(code.encode("utf-8")).hexdigest(),
+                "fingerprints": int(len(fingerprints)),
+                "retired": False,
+            })
+        self._save_manifest()
+
+        self._set_delta(np.concatenate([self._delta_records(), records]))
+        self._refresh_retired()
+        self._publish()
+        return list(range(first_id, first_id + len(items)))
+
+    def add_document(self, name: str, code: str, digest: Optional[str] = None) -> int:
+        return self.add_documents([(name, code, digest)])[0]
+
+    def retire(self, doc_ids: List[int]):
+        """Stop matching documents; their entries are dropped at the next compaction"""
+        if not doc_ids:
+            return
+        with self._locked(exclusive=True):
+            self._load(writable=True)
+            self._retire(doc_ids)
+
+    def _retire(self, doc_ids: List[int]):
+        if not doc_ids:
+            return
+        for doc_id in doc_ids:
+            self.documents[doc_id]["retired"] = True
+        self._save_manifest()
+        self._refresh_retired()
+        self._publish()
+
+    def compact(self):
+        """Merge the delta into a new sorted base and truncate the delta log"""
+        with self._locked(exclusive=True):
+            self._load(writable=True)
+            self._compact()
+
+    def _compact(self):
+        base = np.empty(len(self._base_hashes), dtype=RECORD_DTYPE)
+        base["hash"] = self._base_hashes
+        base["doc"] = self._base_docs
+        records = np.concatenate([base, self._delta_records()])
+        records = records[~self._retired[records["doc"]]] if len(records) else records
+        records = records[np.argsort(records["hash"], kind="stable")]
+        common = np.array(self._common)
+        if len(records):
+            # Fingerprints shared by many solutions are boilerplate and never count
+            unique, counts = np.unique(records["hash"], return_counts=True)
+            common = np.union1d(common, unique[counts > settings.CORPUS_MAX_DOC_FREQUENCY])
+            records = records[~_contains(common, records["hash"])]
+
+        # Release the working maps before replacing; lookups still holding the previous
+        # snapshot keep reading the replaced files until they finish
+        self._base_hashes = _empty_hashes()
+        self._base_docs = _empty_docs()
+        self._common = _empty_hashes()
+        _atomic_write(self._path("base.hashes"), np.ascontiguousarray(records["hash"]).tobytes())
+        _atomic_write(self._path("base.docs"), np.ascontiguousarray(records["doc"]).tobytes())
+        _atomic_write(self._path("base.common"), common.astype(np.uint64).tobytes())
+        _atomic_write(self._path("delta.bin"), b"")
+        self._map_base()
+        self._delta_hashes = _empty_hashes()
+        self._delta_docs = _empty_docs()
+        self._publish()
+        self._save_manifest()  # Tells the other workers to re-map the new base
+
+        logger.info(f"Corpus index compacted: {len(records)} fingerprints in base, "
+                    f"{len(common)} boilerplate fingerprints")
+
+    def sync_directory(self, corpus_dir: str) -> dict:
+        """Index new or changed files under ``corpus_dir`` and retire removed ones"""
+        with self._locked(exclusive=True):
+            self._load(writable=True)
+            return self._sync_directory(corpus_dir)
+
+    def _sync_directory(self, corpus_dir: str) -> dict:
+        current = {}
+        for root, _, files in os.walk(corpus_dir):
+            for filename in files:
+                path = os.path.join(root, filename)
+                current[os.path.relpath(path, corpus_dir)] = path
+
+        active = {doc["name"]: doc_id for doc_id, doc in enumerate(self.documents) if not doc.get("retired")}
+        pending = []
+        stale = []
+        added = updated = 0
+
+        for name, path in sorted(current.items()):
+            try:
+                with open(path, "rb") as f:
+                    raw = f.read()
+                if len(raw) > settings.CORPUS_MAX_FILE_BYTES:
+                    continue
+                code = raw.decode("utf-8")
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning(f"Skipping corpus file {path}: {e}")
+                continue
+
+            digest = hashlib.sha256(raw).hexdigest()
+            doc_id = active.get(name)
+            if doc_id is not None:
+                if self.documents[doc_id]["sha256"] == digest:
+                    continue
+                stale.append(doc_id)
+                updated += 1
+            else:
+                added += 1
+            pending.append((name, code, digest))
+
+        removed = [doc_id for name, doc_id in active.items() if name not in current]
+        self._append(pending, [self.fingerprint(code, language_for_path(name)) for name, code, _ in pending])
+        self._retire(stale + removed)
+
+        if len(self._delta_hashes) > settings.CORPUS_DELTA_MAX_ENTRIES:
+            self._compact()
+
+        return {"added": added, "updated": updated, "removed": len(removed), "documents": self.active_documents()}
+
+    # ---- lookups -----------------------------------------------------------
+
+    def active_documents(self) -> int:
+        retired = self._snapshot.retired
+        return int(len(retired) - retired.sum())
+
+    def match(self, code: str, language: Optional[str] = None) -> Optional[dict]:
+        """Best corpus match for a paste, or None below ``CORPUS_MATCH_THRESHOLD``"""
+        snapshot = self._snapshot
+        query = self.fingerprint(code, language)
+        query = query[~_contains(snapshot.common, query)]
+        if len(query) < settings.CORPUS_MIN_FINGERPRINTS:
+            return None
+
+        retired = snapshot.retired
+        max_docs = settings.CORPUS_MAX_DOC_FREQUENCY
+        base_docs, base_common = _lookup(snapshot.base_hashes, snapshot.base_docs, query, max_docs)
+        delta_docs, delta_common = _lookup(snapshot.delta_hashes, snapshot.delta_docs, query, max_docs)
+        docs = np.concatenate([base_docs, delta_docs])
+        distinctive = len(query) - int((base_common | delta_common).sum())
+        if len(docs) == 0 or distinctive < settings.CORPUS_MIN_FINGERPRINTS:
+            return None
+
+        # Fingerprints are unique per document, so entry counts are shared fingerprints
+        counts = np.bincount(docs, minlength=len(retired))[:len(retired)]
+        counts[retired] = 0
+        best = int(counts.argmax())
+        coverage = counts[best] / distinctive
+        if coverage < settings.CORPUS_MATCH_THRESHOLD:
+            return None
+
+        return {
+            "document": snapshot.names[best],
+            "doc_id": best,
+            "coverage": round(float(coverage), 4),
+            "matched_fingerprints": int(counts[best]),
+        }
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "loaded": self.loaded,
+            "documents": int(len(snapshot.retired) - snapshot.retired.sum()),
+            "retired_documents": int(snapshot.retired.sum()),
+            "base_fingerprints": int(len(snapshot.base_hashes)),
+            "delta_fingerprints": int(len(snapshot.delta_hashes)),
+            "boilerplate_fingerprints": int(len(snapshot.common)),
+        }
+
+
+def check_paste(content: str, language: Optional[str] = None) -> Optional[dict]:
+    """Match paste content during ingestion; never raises into the write path"""
+    if not settings.CORPUS_ENABLED or not corpus_index.loaded:
+        return None
+    start = time.perf_counter()
+    try:
+        match = corpus_index.match(content, language)
+    except Exception as e:
+        logger.error(f"Corpus paste match failed: {e}")
+        return None
+    paste_match_ms.observe((time.perf_counter() - start) * 1000)
+    paste_checks.inc()
+    if match is not None:
+        paste_matches.inc()
+    return match
+
+
+def sync_corpus() -> dict:
+    """Bring the shared index up to date with ``CORPUS_DIR``"""
+    if not os.path.isdir(settings.CORPUS_DIR):
+        logger.warning(f"Corpus directory {settings.CORPUS_DIR} does not exist")
+        return corpus_index.stats()
+    summary = corpus_index.sync_directory(settings.CORPUS_DIR)
+    logger.info(f"Corpus synced from {settings.CORPUS_DIR}: {summary}")
+    return summary
+
+
+async def corpus_sync_job():
+    """Sync ``CORPUS_DIR`` now and every ``CORPUS_SYNC_INTERVAL`` (run under the corpus lease)"""
+    while True:
+        try:
+            await asyncio.to_thread(sync_corpus)
+        except Exception as e:
+            logger.error(f"Corpus sync failed: {e}")
+        await asyncio.sleep(settings.CORPUS_SYNC_INTERVAL)
+
+
+async def corpus_reloader():
+    """Reload this worker's view when another process rewrites the index"""
+    while True:
+        await asyncio.sleep(settings.CORPUS_RELOAD_INTERVAL)
+        try:
+            await asyncio.to_thread(corpus_index.reload_if_changed)
+        except Exception as e:
+            logger.error(f"Corpus index reload failed: {e}")
+
+
+# Global corpus index
+corpus_index = CorpusIndex(
+    index_dir=settings.CORPUS_INDEX_DIR,
+    k=settings.CORPUS_KGRAM,
+    window=settings.CORPUS_WINDOW,
+)
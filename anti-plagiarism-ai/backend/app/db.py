@@ -11,6 +11,10 @@ class Database:
 
 db = Database()
 
+# Data retention windows enforced by TTL indexes
+ANALYTICS_TTL_SECONDS = 2592000  # 30 days
+EVENTS_TTL_SECONDS = 604800  # 7 days
+
 async def connect_to_mongo():
     """Create database connection with connection pooling"""
     try:
@@ -52,75 +56,96 @@ async def get_database() -> AsyncIOMotorDatabase:
     """Get database instance"""
     return db.database
 
+# Index definitions per collection (audited by app.index_audit)
+INDEXES = {
+    "users": [
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("role", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    "contests": [
+        IndexModel([("created_by", ASCENDING)]),
+        IndexModel([("start_time", ASCENDING), ("end_time", ASCENDING)]),
+        IndexModel([("participants", ASCENDING)]),  # Multikey index
+        IndexModel([("status", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+        IndexModel([("title", TEXT), ("description", TEXT)]),  # Text search
+    ],
+    # Sessions Collection Indexes (Critical for performance)
+    "sessions": [
+        IndexModel([("session_id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("contest_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("contest_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("status", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+        IndexModel([("language", ASCENDING)]),
+        # Compound index for common queries
+        IndexModel([("user_id", ASCENDING), ("contest_id", ASCENDING), ("status", ASCENDING)]),
+    ],
+    "analytics": [
+        IndexModel([("session_id", ASCENDING), ("analysis_type", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("processed_at", DESCENDING)]),
+        IndexModel([("contest_id", ASCENDING), ("processed_at", DESCENDING)]),
+        IndexModel([("processed_at", DESCENDING)]),
+        # TTL index for data retention (30 days)
+        IndexModel([("processed_at", ASCENDING)], expireAfterSeconds=ANALYTICS_TTL_SECONDS),
+    ],
+    # Events Collection Indexes (for real-time processing)
+    "events": [
+        # _id keeps replay order deterministic for events with the same timestamp
+        IndexModel([("session_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)]),
+        IndexModel([("event_type", ASCENDING)]),
+        IndexModel([("processed", ASCENDING)]),  # For batch processing
+        # TTL index for raw events (7 days)
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=EVENTS_TTL_SECONDS),
+    ],
+    # Compressed events of completed sessions (see app.compaction)
+    "event_chunks": [
+        IndexModel([("session_id", ASCENDING), ("seq", ASCENDING)], unique=True),
+        # Same retention as the raw events they replace; archived before they expire
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=EVENTS_TTL_SECONDS),
+    ],
+    # WebSocket Connections Collection (for active session tracking)
+    "ws_connections": [
+        IndexModel([("session_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING)]),
+        IndexModel([("connected_at", DESCENDING)]),
+        # TTL index for connection cleanup (1 hour)
+        IndexModel([("last_ping", ASCENDING)], expireAfterSeconds=3600),
+    ],
+    "rollups": [
+        IndexModel([("session_id", ASCENDING), ("resolution", ASCENDING), ("bucket", ASCENDING)], unique=True),
+        IndexModel([("contest_id", ASCENDING), ("resolution", ASCENDING), ("bucket", ASCENDING)]),
+        # Per-resolution retention: each bucket carries its own expiry time
+        IndexModel([("expire_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    # Live keystroke-dynamics state per (user, session), shared by all workers
+    "keystroke_sessions": [
+        IndexModel([("session_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("folded", ASCENDING)]),
+        IndexModel([("folded", ASCENDING), ("updated_at", ASCENDING)]),
+        IndexModel([("updated_at", ASCENDING)], expireAfterSeconds=EVENTS_TTL_SECONDS),
+    ],
+    # Similarity/export/provisioning job status shared by all workers (see app.jobs)
+    "jobs": [
+        IndexModel([("started_at", ASCENDING)], expireAfterSeconds=ANALYTICS_TTL_SECONDS),
+    ],
+    "leaderboards": [
+        IndexModel([("contest_id", ASCENDING), ("session_id", ASCENDING)], unique=True),
+        # Serves the risk-sorted leaderboard without an in-memory sort
+        IndexModel([("contest_id", ASCENDING), ("risk_rank", DESCENDING), ("confidence_score", DESCENDING)]),
+    ],
+}
+
 async def create_indexes():
     """Create comprehensive database indexes for performance optimization"""
     try:
         database = await get_database()
         
-        # Users Collection Indexes
-        users_indexes = [
-            IndexModel([("username", ASCENDING)], unique=True),
-            IndexModel([("role", ASCENDING)]),
-            IndexModel([("created_at", DESCENDING)]),
-        ]
-        await database.users.create_indexes(users_indexes)
-        
-        # Contests Collection Indexes
-        contests_indexes = [
-            IndexModel([("created_by", ASCENDING)]),
-            IndexModel([("start_time", ASCENDING), ("end_time", ASCENDING)]),
-            IndexModel([("participants", ASCENDING)]),  # Multikey index
-            IndexModel([("status", ASCENDING)]),
-            IndexModel([("created_at", DESCENDING)]),
-            IndexModel([("title", TEXT), ("description", TEXT)]),  # Text search
-        ]
-        await database.contests.create_indexes(contests_indexes)
-        
-        # Sessions Collection Indexes (Critical for performance)
-        sessions_indexes = [
-            IndexModel([("session_id", ASCENDING)], unique=True),
-            IndexModel([("user_id", ASCENDING), ("contest_id", ASCENDING)]),
-            IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)]),
-            IndexModel([("contest_id", ASCENDING), ("created_at", DESCENDING)]),
-            IndexModel([("status", ASCENDING)]),
-            IndexModel([("created_at", DESCENDING)]),
-            IndexModel([("language", ASCENDING)]),
-            # Compound index for common queries
-            IndexModel([("user_id", ASCENDING), ("contest_id", ASCENDING), ("status", ASCENDING)]),
-        ]
-        await database.sessions.create_indexes(sessions_indexes)
-        
-        # Analytics Collection Indexes
-        analytics_indexes = [
-            IndexModel([("session_id", ASCENDING), ("analysis_type", ASCENDING)]),
-            IndexModel([("user_id", ASCENDING), ("processed_at", DESCENDING)]),
-            IndexModel([("contest_id", ASCENDING), ("processed_at", DESCENDING)]),
-            IndexModel([("processed_at", DESCENDING)]),
-            # TTL index for data retention (30 days)
-            IndexModel([("processed_at", ASCENDING)], expireAfterSeconds=2592000),
-        ]
-        await database.analytics.create_indexes(analytics_indexes)
-        
-        # Events Collection Indexes (for real-time processing)
-        events_indexes = [
-            IndexModel([("session_id", ASCENDING), ("timestamp", ASCENDING)]),
-            IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)]),
-            IndexModel([("event_type", ASCENDING)]),
-            IndexModel([("processed", ASCENDING)]),  # For batch processing
-            # TTL index for raw events (7 days)
-            IndexModel([("created_at", ASCENDING)], expireAfterSeconds=604800),
-        ]
-        await database.events.create_indexes(events_indexes)
-        
-        # WebSocket Connections Collection (for active session tracking)
-        connections_indexes = [
-            IndexModel([("session_id", ASCENDING)]),
-            IndexModel([("user_id", ASCENDING)]),
-            IndexModel([("connected_at", DESCENDING)]),
-            # TTL index for connection cleanup (1 hour)
-            IndexModel([("last_ping", ASCENDING)], expireAfterSeconds=3600),
-        ]
-        await database.ws_connections.create_indexes(connections_indexes)
+        for collection_name, indexes in INDEXES.items():
+            await database[collection_name].create_indexes(indexes)
         
         logger.info("Successfully created all database indexes")
         
@@ -149,10 +174,38 @@ async def get_events_collection():
     database = await get_database()
     return database.events
 
+async def get_event_chunks_collection():
+    database = await get_database()
+    return database.event_chunks
+
 async def get_ws_connections_collection():
     database = await get_database()
     return database.ws_connections
 
+async def get_rollups_collection():
+    database = await get_database()
+    return database.rollups
+
+async def get_leaderboards_collection():
+    database = await get_database()
+    return database.leaderboards
+
+async def get_keystroke_profiles_collection():
+    database = await get_database()
+    return database.keystroke_profiles
+
+async def get_keystroke_sessions_collection():
+    database = await get_database()
+    return database.keystroke_sessions
+
+async def get_jobs_collection():
+    database = await get_database()
+    return database.jobs
+
+async def get_leases_collection():
+    database = await get_database()
+    return database.leases
+
 # Health check for database
 async def check_database_health():
     """Check database connection health"""
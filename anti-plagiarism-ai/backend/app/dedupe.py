@@ -0,0 +1,148 @@
+"""
+Duplicate detection for retried event batches.
+
+Clients tag every ``SessionEventBatch`` with a ``batch_id`` and a per-session
+``sequence``. Each worker keeps a bounded LRU of sessions, and for each session
+a high-water mark plus a bitmask of the last ``DEDUPE_WINDOW`` sequences. A
+Redis set per session (through the shared ``redis_client``) catches retries
+for sessions this worker has not seen (evicted, or handled by another
+worker); while Redis is unavailable the local window decides alone.
+
+Session ids are chosen by the client, so all state is keyed by
+``(user_id, session_id)``: a batch claiming another user's session id (with a
+high ``sequence``, say) only touches its sender's own window and can never
+make the owner's real batches look like duplicates.
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.redis_client import redis_client
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+batches_checked = metrics.counter("ingest_batches_checked_total", "Event batches checked for duplicates")
+duplicates_rejected = metrics.counter("ingest_duplicate_batches_total", "Duplicate event batches rejected")
+dedupe_hit_rate = metrics.gauge("ingest_dedupe_hit_rate", "Share of checked batches rejected as duplicates")
+
+
+class SequenceWindow:
+    """High-water mark plus a bitmask of recently seen sequences"""
+
+    __slots__ = ("high_water", "seen")
+
+    def __init__(self):
+        self.high_water = -1
+        self.seen = 0  # bit i set => sequence (high_water - i) was accepted
+
+    def check_and_add(self, sequence: int, window: int) -> bool:
+        """Return True if the sequence is new (and record it)"""
+        if sequence > self.high_water:
+            shift = sequence - self.high_water
+            self.seen = ((self.seen << shift) | 1) & ((1 << window) - 1) if shift < window else 1
+            self.high_water = sequence
+            return True
+
+        offset = self.high_water - sequence
+        if offset >= window:
+            # Too old to tell apart; a batch this far behind is a stale retry
+            return False
+
+        bit = 1 << offset
+        if self.seen & bit:
+            return False
+        self.seen |= bit
+        return True
+
+    def discard(self, sequence: int, window: int):
+        offset = self.high_water - sequence
+        if 0 <= offset < window:
+            self.seen &= ~(1 << offset)
+
+
+class BatchDeduplicator:
+    def __init__(self, window: int, max_sessions: int):
+        self.window = window
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, SequenceWindow]" = OrderedDict()
+
+    @staticmethod
+    def _session_key(user_id: str, session_id: str) -> str:
+        return f"{user_id}:{session_id}"
+
+    @staticmethod
+    def _redis_key(session_key: str) -> str:
+        return f"dedupe:{session_key}"
+
+    @staticmethod
+    def _member(batch_id: Optional[str], sequence: Optional[int]) -> str:
+        return batch_id if sequence is None else f"{sequence}:{batch_id or ''}"
+
+    def _check_local(self, session_key: str, sequence: int) -> bool:
+        session_window = self._sessions.get(session_key)
+        if session_window is None:
+            session_window = SequenceWindow()
+            self._sessions[session_key] = session_window
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_key)
+        return session_window.check_and_add(sequence, self.window)
+
+    async def _check_redis(self, session_key: str, member: str) -> Optional[bool]:
+        if not settings.DEDUPE_REDIS_ENABLED:
+            return None
+        try:
+            key = self._redis_key(session_key)
+            # Both commands ride the same auto-pipelined round-trip
+            added, _ = await asyncio.gather(
+                redis_client.execute("SADD", key, member),
+                redis_client.execute("EXPIRE", key, settings.DEDUPE_REDIS_TTL),
+            )
+            return bool(added)
+        except RedisError as e:
+            redis_client.fallback("dedupe", e)
+            return None
+
+    async def is_duplicate(self, user_id: str, session_id: str,
+                           batch_id: Optional[str], sequence: Optional[int]) -> bool:
+        """Check a batch and remember it; batches without ids are never duplicates"""
+        if batch_id is None and sequence is None:
+            return False
+
+        batches_checked.inc()
+        session_key = self._session_key(user_id, session_id)
+        duplicate = sequence is not None and not self._check_local(session_key, sequence)
+        if not duplicate:
+            is_new = await self._check_redis(session_key, self._member(batch_id, sequence))
+            duplicate = is_new is False
+
+        if duplicate:
+            duplicates_rejected.inc()
+        dedupe_hit_rate.set(duplicates_rejected.get() / batches_checked.get())
+        return duplicate
+
+    async def forget(self, user_id: str, session_id: str, batch_id: Optional[str], sequence: Optional[int]):
+        """Un-record a batch whose write failed so the client retry is accepted"""
+        session_key = self._session_key(user_id, session_id)
+        if sequence is not None and session_key in self._sessions:
+            self._sessions[session_key].discard(sequence, self.window)
+        if not settings.DEDUPE_REDIS_ENABLED or (batch_id is None and sequence is None):
+            return
+        try:
+            await redis_client.execute("SREM", self._redis_key(session_key), self._member(batch_id, sequence))
+        except RedisError as e:
+            redis_client.fallback("dedupe", e)
+
+
+# Global deduplicator instance
+batch_deduplicator = BatchDeduplicator(
+    window=settings.DEDUPE_WINDOW,
+    max_sessions=settings.DEDUPE_MAX_SESSIONS,
+)
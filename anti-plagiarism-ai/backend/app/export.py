@@ -0,0 +1,333 @@
+"""
+Streaming contest exports (CSV, NDJSON, Parquet).
+
+Documents come from a Motor cursor with a projection and ``batch_size``, are
+flattened into fixed columns and encoded one batch at a time, so memory use
+is bounded by ``EXPORT_BATCH_SIZE`` no matter how large the contest is. The
+export is an async generator: ``StreamingResponse`` only pulls the next batch
+(and so the next cursor ``getMore``) after the previous chunk was sent, which
+gives slow clients natural backpressure.
+
+Parquet needs ``pyarrow`` (optional); each batch becomes one row group.
+Large exports can run as background jobs that write to ``EXPORT_DIR``; job
+status lives in the shared ``jobs`` collection (``app.jobs``), so any worker
+can answer status and download requests as long as ``EXPORT_DIR`` is the same
+directory (a shared volume when workers run on several hosts).
+"""
+
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.schemas import ExportDataset, ExportFormat
+from app.db import get_sessions_collection, get_analytics_collection
+from app.leaderboard import _resolve_usernames
+from app.metrics import metrics
+from app.jobs import start_job, finish_job, get_job
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; Parquet exports are disabled without it
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+
+export_bytes = metrics.counter("export_bytes_total", "Bytes produced by exports per format")
+export_rows = metrics.counter("export_rows_total", "Rows exported per dataset")
+
+# (column name, path into the document, type): type is str, int, float, datetime or list
+Column = Tuple[str, Tuple[str, ...], str]
+
+COLUMNS: Dict[ExportDataset, List[Column]] = {
+    ExportDataset.SESSIONS: [
+        ("session_id", ("session_id",), "str"),
+        ("user_id", ("user_id",), "str"),
+        ("username", ("username",), "str"),
+        ("contest_id", ("contest_id",), "str"),
+        ("language", ("language",), "str"),
+        ("status", ("status",), "str"),
+        ("created_at", ("created_at",), "datetime"),
+        ("updated_at", ("updated_at",), "datetime"),
+        ("typing_speed", ("analytics", "typing_speed"), "float"),
+        ("copy_paste_frequency", ("analytics", "copy_paste_frequency"), "int"),
+        ("focus_changes", ("analytics", "focus_changes"), "int"),
+        ("total_events", ("analytics", "total_events"), "int"),
+        ("session_duration", ("analytics", "session_duration"), "int"),
+        ("anomaly_flags", ("analytics", "anomaly_flags"), "list"),
+    ],
+    ExportDataset.ANALYTICS: [
+        ("analytics_id", ("_id",), "str"),
+        ("session_id", ("session_id",), "str"),
+        ("user_id", ("user_id",), "str"),
+        ("contest_id", ("contest_id",), "str"),
+        ("analysis_type", ("analysis_type",), "str"),
+        ("source", ("results", "patterns", "source"), "str"),
+        ("confidence_score", ("results", "confidence_score"), "float"),
+        ("risk_level", ("results", "risk_level"), "str"),
+        ("flags", ("results", "flags"), "list"),
+        ("processed_at", ("processed_at",), "datetime"),
+        ("version", ("version",), "str"),
+    ],
+}
+
+
+def _projection(columns: List[Column]) -> dict:
+    projection = {".".join(path): 1 for _, path, _ in columns if path != ("username",)}
+    projection.setdefault("_id", 0)
+    return projection
+
+
+def _extract(doc: dict, columns: List[Column]) -> List[Any]:
+    row = []
+    for _, path, kind in columns:
+        value: Any = doc
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if value is not None:
+            if kind == "str":
+                value = str(value)
+            elif kind == "list":
+                value = [str(item) for item in value]
+        row.append(value)
+    return row
+
+
+async def _add_usernames(docs: List[dict]):
+    """One cached $in lookup per batch instead of a join"""
+    names = await _resolve_usernames(doc["user_id"] for doc in docs if doc.get("user_id"))
+    for doc in docs:
+        doc["username"] = names.get(doc.get("user_id"))
+
+
+ENRICHERS: Dict[ExportDataset, Callable[[List[dict]], Awaitable[None]]] = {
+    ExportDataset.SESSIONS: _add_usernames,
+}
+
+
+# Encoders ------------------------------------------------------------------
+
+class CSVEncoder:
+    def __init__(self, columns: List[Column]):
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.writer.writerow([name for name, _, _ in columns])
+
+    def _drain(self) -> bytes:
+        data = self.buffer.getvalue().encode("utf-8")
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    def encode(self, rows: List[List[Any]]) -> bytes:
+        self.writer.writerows(
+            [";".join(value) if isinstance(value, list)
+             else value.isoformat() if isinstance(value, datetime) else value
+             for value in row]
+            for row in rows
+        )
+        return self._drain()
+
+    def finish(self) -> bytes:
+        return self._drain()
+
+
+class NDJSONEncoder:
+    def __init__(self, columns: List[Column]):
+        self.names = [name for name, _, _ in columns]
+
+    def encode(self, rows: List[List[Any]]) -> bytes:
+        lines = [json.dumps(dict(zip(self.names, row)), default=_json_default) for row in rows]
+        return ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
+
+    def finish(self) -> bytes:
+        return b""
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class _ChunkSink:
+    """Write-only file object that hands out what ParquetWriter wrote so far"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.closed = False
+        self.position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ParquetEncoder:
+    def __init__(self, columns: List[Column]):
+        types = {
+            "str": pa.string(), "int": pa.int64(), "float": pa.float64(),
+            "datetime": pa.timestamp("ms"), "list": pa.list_(pa.string()),
+        }
+        self.schema = pa.schema([pa.field(name, types[kind]) for name, _, kind in columns])
+        self.sink = _ChunkSink()
+        self.writer = pq.ParquetWriter(self.sink, self.schema, compression="zstd")
+
+    def encode(self, rows: List[List[Any]]) -> bytes:
+        if rows:
+            columns = list(zip(*rows))
+            batch = pa.record_batch(
+                [pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+                schema=self.schema,
+            )
+            self.writer.write_batch(batch)
+        return self.sink.drain()
+
+    def finish(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+ENCODERS = {
+    ExportFormat.CSV: CSVEncoder,
+    ExportFormat.NDJSON: NDJSONEncoder,
+    ExportFormat.PARQUET: ParquetEncoder,
+}
+
+
+def parquet_available() -> bool:
+    return pa is not None
+
+
+# Streaming -----------------------------------------------------------------
+
+async def open_cursor(contest_id: str, dataset: ExportDataset):
+    columns = COLUMNS[dataset]
+    if dataset == ExportDataset.SESSIONS:
+        collection = await get_sessions_collection()
+    else:
+        collection = await get_analytics_collection()
+    return collection.find({"contest_id": contest_id}, projection=_projection(columns)) \
+        .batch_size(settings.EXPORT_BATCH_SIZE)
+
+
+async def stream_export(docs: AsyncIterator[dict], dataset: ExportDataset,
+                        export_format: ExportFormat) -> AsyncIterator[bytes]:
+    """Encode documents batch by batch; memory stays bounded by EXPORT_BATCH_SIZE"""
+    columns = COLUMNS[dataset]
+    encoder = ENCODERS[export_format](columns)
+    enrich = ENRICHERS.get(dataset)
+    batch: List[dict] = []
+    total_rows = 0
+    total_bytes = 0
+
+    async def flush_batch() -> bytes:
+        if enrich is not None:
+            await enrich(batch)
+        return encoder.encode([_extract(doc, columns) for doc in batch])
+
+    async for doc in docs:
+        batch.append(doc)
+        if len(batch) >= settings.EXPORT_BATCH_SIZE:
+            chunk = await flush_batch()
+            total_rows += len(batch)
+            batch = []
+            if chunk:
+                total_bytes += len(chunk)
+                yield chunk
+
+    chunk = (await flush_batch() if batch else b"") + encoder.finish()
+    total_rows += len(batch)
+    if chunk:
+        total_bytes += len(chunk)
+        yield chunk
+
+    export_rows.inc(total_rows, dataset=dataset.value)
+    export_bytes.inc(total_bytes, format=export_format.value)
+
+
+async def export_contest(contest_id: str, dataset: ExportDataset,
+                         export_format: ExportFormat) -> AsyncIterator[bytes]:
+    cursor = await open_cursor(contest_id, dataset)
+    try:
+        async for chunk in stream_export(cursor, dataset, export_format):
+            yield chunk
+    finally:
+        await cursor.close()
+
+
+def export_filename(contest_id: str, dataset: ExportDataset, export_format: ExportFormat) -> str:
+    return f"{contest_id}-{dataset.value}.{export_format.value}"
+
+
+# Background jobs -----------------------------------------------------------
+
+async def run_export_job(job: dict):
+    """Write an export to EXPORT_DIR without holding it in memory"""
+    os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+    path = os.path.join(settings.EXPORT_DIR, f"{job['job_id']}.{job['format']}")
+    partial = f"{path}.part"
+    try:
+        with open(partial, "wb") as f:
+            async for chunk in export_contest(job["contest_id"], ExportDataset(job["dataset"]),
+                                              ExportFormat(job["format"])):
+                await asyncio.to_thread(f.write, chunk)
+        os.replace(partial, path)
+        size = os.path.getsize(path)
+        await finish_job(job["job_id"], {"bytes": size, "path": path})
+        logger.info(f"Export job {job['job_id']} finished: {size} bytes")
+    except asyncio.CancelledError:
+        await finish_job(job["job_id"], {"error": "Interrupted by worker shutdown"}, failed=True)
+        raise
+    except Exception as e:
+        logger.error(f"Export job {job['job_id']} failed: {e}")
+        await finish_job(job["job_id"], {"error": str(e)}, failed=True)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+async def create_export_job(contest_id: str, dataset: ExportDataset, export_format: ExportFormat,
+                            created_by: str) -> dict:
+    job_id = str(uuid.uuid4())
+    return await start_job(job_id, "export", {
+        "job_id": job_id,
+        "contest_id": contest_id,
+        "dataset": dataset.value,
+        "format": export_format.value,
+        "created_by": created_by,
+    })
+
+
+async def get_export_job(job_id: str) -> Optional[dict]:
+    return await get_job(job_id)
@@ -0,0 +1,167 @@
+"""
+Liveness and readiness probes.
+
+Orchestrators and the Docker ``HEALTHCHECK`` call the probes every few
+seconds per worker, so a probe must not touch the network. One background
+prober per worker pings MongoDB and Redis every ``HEALTH_PROBE_INTERVAL``
+seconds and caches the result; the probe endpoints only read that cache plus
+two in-process numbers (event-loop lag from the admission monitor and
+thread-pool queue depth), so each call costs microseconds.
+
+- liveness (``/api/v1/health/live``): the worker is running and its event loop
+  answers; never depends on MongoDB or Redis, so an outage does not get every
+  container restarted
+- readiness (``/api/v1/health/ready``): 200 while the worker should get
+  traffic, 503 otherwise. MongoDB down, event-loop lag above
+  ``ADMISSION_LAG_CRITICAL_MS``, a stale probe result or shutdown make it
+  unready. Redis down or a deep thread-pool queue only mark it degraded: those
+  callers have in-process fallbacks or just run slower.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.schemas import HealthCheck
+from app.db import check_database_health
+from app.redis_client import redis_client, CircuitBreaker
+from app.admission import loop_lag_monitor
+from app.provisioning import hash_queue_depth
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+DEGRADED = "degraded"
+DOWN = "down"
+
+health_probe_ms = metrics.summary("health_probe_ms", "Time to check one dependency in the background prober")
+health_status = metrics.gauge("health_service_up", "1 while a dependency's last check passed")
+
+
+def _thread_pool_depth() -> int:
+    """Jobs waiting for the default executor (asyncio.to_thread) and the bcrypt pool"""
+    executor = getattr(asyncio.get_running_loop(), "_default_executor", None)
+    queue = getattr(executor, "_work_queue", None)
+    return (queue.qsize() if queue is not None else 0) + hash_queue_depth()
+
+
+class HealthProber:
+    def __init__(self):
+        self.services: Dict[str, str] = {}
+        self.errors: Dict[str, str] = {}
+        self.checked_at: Optional[datetime] = None
+        self._checked_monotonic = 0.0
+        self.shutting_down = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def _timed(self, name: str, check) -> Tuple[str, Optional[str]]:
+        started = time.perf_counter()
+        try:
+            status, error = await asyncio.wait_for(check(), settings.HEALTH_PROBE_TIMEOUT)
+        except asyncio.TimeoutError:
+            status, error = DOWN, f"no answer within {settings.HEALTH_PROBE_TIMEOUT:g}s"
+        except Exception as e:
+            status, error = DOWN, str(e)
+        health_probe_ms.observe((time.perf_counter() - started) * 1000, service=name)
+        health_status.set(1 if status == OK else 0, service=name)
+        return status, error
+
+    @staticmethod
+    async def _check_mongo() -> Tuple[str, Optional[str]]:
+        result = await check_database_health()
+        if result["status"] == "healthy":
+            return OK, None
+        return DOWN, result["message"]
+
+    @staticmethod
+    async def _check_redis() -> Tuple[str, Optional[str]]:
+        # Through the shared client, so the check also drives the circuit breaker's probe
+        await redis_client.execute("PING")
+        if redis_client.breaker.state != CircuitBreaker.CLOSED:
+            return DEGRADED, redis_client.last_error
+        return OK, None
+
+    async def probe(self):
+        """Check every dependency once and replace the cached result"""
+        (mongo, mongo_error), (redis, redis_error) = await asyncio.gather(
+            self._timed("mongodb", self._check_mongo),
+            self._timed("redis", self._check_redis),
+        )
+        if redis == DOWN:
+            redis = DEGRADED  # Callers fall back to in-process state
+        for name, status, error in (("mongodb", mongo, mongo_error), ("redis", redis, redis_error)):
+            if status != self.services.get(name):
+                log = logger.info if status == OK else logger.warning
+                log(f"Health: {name} is {status}{f' ({error})' if error else ''}")
+            if error:
+                self.errors[name] = error
+            else:
+                self.errors.pop(name, None)
+        self.services = {"mongodb": mongo, "redis": redis}
+        self.checked_at = datetime.utcnow()
+        self._checked_monotonic = time.monotonic()
+
+    async def _run(self):
+        while True:
+            await self.probe()
+            await asyncio.sleep(settings.HEALTH_PROBE_INTERVAL)
+
+    async def start(self):
+        """Probe once so the worker is ready as soon as startup finishes, then keep probing"""
+        await self.probe()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.shutting_down = True  # Unready first, so traffic drains during shutdown
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    @property
+    def stale_after(self) -> float:
+        """A result this old means the prober itself is stuck"""
+        return 3 * settings.HEALTH_PROBE_INTERVAL + settings.HEALTH_PROBE_TIMEOUT
+
+    def liveness(self) -> HealthCheck:
+        return HealthCheck(status=OK, message="alive")
+
+    def readiness(self) -> Tuple[bool, HealthCheck]:
+        services = dict(self.services)
+
+        lag = loop_lag_monitor.lag_ms
+        if lag > settings.ADMISSION_LAG_CRITICAL_MS:
+            services["event_loop"] = DOWN
+        elif lag > settings.ADMISSION_LAG_THRESHOLD_MS:
+            services["event_loop"] = DEGRADED
+        else:
+            services["event_loop"] = OK
+        depth = _thread_pool_depth()
+        services["worker_pool"] = DEGRADED if depth > settings.HEALTH_MAX_POOL_QUEUE else OK
+
+        problems = []
+        if self.shutting_down:
+            problems.append("shutting down")
+        if self.checked_at is None:
+            problems.append("starting")
+        elif time.monotonic() - self._checked_monotonic > self.stale_after:
+            problems.append("dependency checks are stale")
+        problems.extend(f"{name} {status}" for name, status in services.items() if status == DOWN)
+        ready = not problems
+
+        status = OK if ready and all(value == OK for value in services.values()) else (DEGRADED if ready else DOWN)
+        details = f"loop lag {lag:.1f} ms, {depth} queued thread jobs"
+        errors = "; ".join(f"{name}: {error}" for name, error in self.errors.items())
+        message = f"{'ready' if ready else 'not ready: ' + ', '.join(problems)} ({details})"
+        if errors:
+            message += f"; {errors}"
+        return ready, HealthCheck(status=status, message=message, timestamp=self.checked_at or datetime.utcnow(),
+                                  services=services)
+
+
+# Global health prober (one per worker)
+health_prober = HealthProber()
@@ -0,0 +1,383 @@
+"""
+Index usage audit and write-amplification report.
+
+Every secondary index adds a key write (and its share of cache and disk) to
+each insert, which the ingest path pays for on every event batch. The audit
+combines three sources to decide which indexes earn their keep:
+
+- ``$indexStats``: how often each index was used since the server started
+- query shapes: a pymongo command listener (``INDEX_AUDIT_ENABLED``) records
+  the filter/sort shape of every query the app sends, with literal values
+  stripped, so an index can be matched to the queries that need it
+- ``$collStats``: index sizes, from which the bytes each index adds to an
+  average insert are estimated
+
+An index is flagged ``prefix_redundant`` when its key is a leading prefix of
+another index on the collection (any query it serves, the longer index serves
+too), or the same key in the same or reversed directions (then the protected
+one, or else the first one defined, is kept), and ``unused`` when it has no
+accesses and no recorded shape would pick it. Unique, TTL, partial, sparse and text indexes are never flagged: they
+enforce something besides lookup speed.
+
+Note that a single-field index is only covered by a compound index that
+*starts* with that field; ``created_at`` alone is not covered by
+``(user_id, created_at)``.
+
+Offline, ``python -m app.index_audit --static`` checks ``app.db.INDEXES`` for
+prefix redundancy without a database.
+"""
+
+import argparse
+import asyncio
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import monitoring
+
+from app.core.config import settings
+from app.db import INDEXES, get_database, connect_to_mongo, close_mongo_connection
+
+logger = logging.getLogger(__name__)
+
+RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte", "$ne", "$nin", "$exists", "$regex", "$type", "$not"}
+EQUALITY_OPERATORS = {"$eq", "$in", "$all", "$elemMatch"}
+PROTECTED_OPTIONS = ("unique", "expireAfterSeconds", "partialFilterExpression", "sparse")
+
+
+class QueryShape:
+    __slots__ = ("collection", "equality", "range", "sort")
+
+    def __init__(self, collection: str, equality=(), range=(), sort=()):
+        self.collection = collection
+        self.equality = tuple(sorted(equality))
+        self.range = tuple(sorted(set(range) - set(equality)))
+        self.sort = tuple(sort)
+
+    def key(self) -> tuple:
+        return (self.collection, self.equality, self.range, self.sort)
+
+    def to_dict(self) -> Dict:
+        return {
+            "collection": self.collection,
+            "equality": list(self.equality),
+            "range": list(self.range),
+            "sort": [f"{field}:{direction}" for field, direction in self.sort],
+        }
+
+
+def _filter_fields(query: Optional[dict], equality: set, ranged: set):
+    """Split a filter's fields into equality and range predicates"""
+    for field, value in (query or {}).items():
+        if field == "$and":
+            for clause in value:
+                _filter_fields(clause, equality, ranged)
+        elif field.startswith("$"):
+            continue  # $or/$expr/$text: not matched against index prefixes
+        elif isinstance(value, dict) and any(op.startswith("$") for op in value):
+            if any(op in RANGE_OPERATORS for op in value):
+                ranged.add(field)
+            elif any(op in EQUALITY_OPERATORS for op in value):
+                equality.add(field)
+        else:
+            equality.add(field)
+
+
+def _shape(collection: str, query: Optional[dict], sort: Optional[dict] = None) -> Optional[QueryShape]:
+    equality, ranged = set(), set()
+    _filter_fields(query, equality, ranged)
+    sort_fields = [(field, 1 if direction == 1 else -1) for field, direction in (sort or {}).items()
+                   if isinstance(direction, int)]
+    if not equality and not ranged and not sort_fields:
+        return None  # Collection scans by design (exports, listings)
+    return QueryShape(collection, equality, ranged, sort_fields)
+
+
+def shapes_from_command(command_name: str, command: dict) -> List[QueryShape]:
+    """Query shapes of one command (reads, updates and deletes)"""
+    collection = command.get(command_name)
+    if not isinstance(collection, str):
+        return []
+    if command_name == "find":
+        shapes = [_shape(collection, command.get("filter"), command.get("sort"))]
+    elif command_name == "aggregate":
+        pipeline = command.get("pipeline") or []
+        query = pipeline[0].get("$match") if pipeline else None
+        sort = next((stage["$sort"] for stage in pipeline[:2] if "$sort" in stage), None)
+        shapes = [_shape(collection, query, sort)]
+    elif command_name == "findAndModify":
+        shapes = [_shape(collection, command.get("query"), command.get("sort"))]
+    elif command_name in ("count", "distinct"):
+        shapes = [_shape(collection, command.get("query"))]
+    elif command_name == "update":
+        shapes = [_shape(collection, update.get("q")) for update in command.get("updates", [])]
+    elif command_name == "delete":
+        shapes = [_shape(collection, delete.get("q")) for delete in command.get("deletes", [])]
+    else:
+        return []
+    return [shape for shape in shapes if shape is not None]
+
+
+class QueryShapeListener(monitoring.CommandListener):
+    """Counts query shapes per collection; inserts and getMores are ignored"""
+
+    COMMANDS = {"find", "aggregate", "findAndModify", "count", "distinct", "update", "delete"}
+
+    def __init__(self, max_shapes: int = 1000):
+        self.max_shapes = max_shapes
+        self.counts: Counter = Counter()
+        self.shapes: Dict[tuple, QueryShape] = {}
+        self.overflow = 0
+        self._lock = threading.Lock()  # Driver callbacks run on its own threads too
+
+    def started(self, event):
+        if event.command_name not in self.COMMANDS or event.database_name != settings.MONGO_DB:
+            return
+        try:
+            shapes = shapes_from_command(event.command_name, event.command)
+        except Exception:
+            return  # Never let the audit break a query
+        with self._lock:
+            for shape in shapes:
+                key = shape.key()
+                if key not in self.shapes:
+                    if len(self.shapes) >= self.max_shapes:
+                        self.overflow += 1
+                        continue
+                    self.shapes[key] = shape
+                self.counts[key] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def snapshot(self, collection: Optional[str] = None) -> List[Tuple[QueryShape, int]]:
+        with self._lock:
+            return [(self.shapes[key], count) for key, count in self.counts.most_common()
+                    if collection is None or key[0] == collection]
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+            self.shapes.clear()
+            self.overflow = 0
+
+
+# Global query-shape recorder (registered by enable_query_shape_capture)
+query_shapes = QueryShapeListener(settings.INDEX_AUDIT_MAX_SHAPES)
+
+
+def enable_query_shape_capture():
+    """Register the listener; must run before the MongoDB client is created"""
+    monitoring.register(query_shapes)
+    logger.info("Index audit: recording query shapes")
+
+
+def _key_fields(key) -> List[Tuple[str, object]]:
+    return [(field, direction) for field, direction in (key.items() if isinstance(key, dict) else key)]
+
+
+def _is_protected(name: str, key, spec: dict) -> bool:
+    return name == "_id_" or any(option in spec for option in PROTECTED_OPTIONS) or \
+        any(direction in ("text", "2dsphere", "hashed") for _, direction in key)
+
+
+def _is_prefix(short, long) -> bool:
+    """``short`` is a leading prefix of (or equal to) ``long`` in the same (or fully reversed) directions"""
+    if len(short) > len(long) or [f for f, _ in short] != [f for f, _ in long[:len(short)]]:
+        return False
+    same = all(a == b for (_, a), (_, b) in zip(short, long))
+    reversed_ = all(isinstance(a, int) and isinstance(b, int) and a == -b for (_, a), (_, b) in zip(short, long))
+    return same or reversed_
+
+
+def usable_prefix(key, shape: QueryShape) -> int:
+    """Index fields a query can use: equality prefix, then sort, then one range field"""
+    used = 0
+    fields = list(key)
+    while used < len(fields) and fields[used][0] in shape.equality:
+        used += 1
+    if shape.sort:
+        window = fields[used:used + len(shape.sort)]
+        if len(window) == len(shape.sort) and [f for f, _ in window] == [f for f, _ in shape.sort]:
+            signs = {direction == sort_direction for (_, direction), (_, sort_direction) in zip(window, shape.sort)}
+            if len(signs) == 1:
+                used += len(window)
+    if used < len(fields) and fields[used][0] in shape.range:
+        used += 1
+    return used
+
+
+def best_index(indexes: List[Dict], shape: QueryShape) -> Optional[str]:
+    """The index the planner most likely picks: longest usable prefix, then the smallest key"""
+    best, best_score = None, (0, 0)
+    for index in indexes:
+        if any(direction == "text" for _, direction in index["key"]):
+            continue
+        used = usable_prefix(index["key"], shape)
+        score = (used, -len(index["key"]))
+        if used and score > best_score:
+            best, best_score = index["name"], score
+    return best
+
+
+def analyze(collection: str, indexes: List[Dict], shapes: List[Tuple[QueryShape, int]],
+            storage: Optional[Dict] = None, live: bool = True) -> Dict:
+    """Flag redundant and unused indexes and estimate each one's share of insert cost
+
+    ``indexes`` items carry ``name``, ``key`` (list of field/direction pairs),
+    ``spec`` (creation options) and, when live, ``ops`` from ``$indexStats``
+    """
+    storage = storage or {}
+    documents = storage.get("count") or 0
+    sizes = storage.get("indexSizes") or {}
+    per_doc = {name: size / documents for name, size in sizes.items()} if documents else {}
+    avg_doc = storage.get("avgObjSize") or 0
+    total_per_insert = avg_doc + sum(per_doc.values())
+
+    protected = {index["name"] for index in indexes if _is_protected(index["name"], index["key"], index.get("spec", {}))}
+    covered = {}
+    for position, index in enumerate(indexes):
+        if index["name"] in protected:
+            continue
+        covered[index["name"]] = [
+            other["name"] for other_position, other in enumerate(indexes)
+            if other is not index and _is_prefix(index["key"], other["key"])
+            # Of two indexes on the same key only one goes: the protected one stays, else the first
+            and (len(index["key"]) < len(other["key"]) or other["name"] in protected or other_position < position)
+        ]
+    # Shapes are credited to the indexes that stay, so a covering index is not reported unused
+    kept = [index for index in indexes if not covered.get(index["name"])]
+    picked = Counter()
+    for shape, count in shapes:
+        name = best_index(kept, shape)
+        if name:
+            picked[name] += count
+
+    report = []
+    for index in indexes:
+        name, key = index["name"], index["key"]
+        is_protected = name in protected
+        covered_by = covered.get(name, [])
+        unused = live and not is_protected and not index.get("ops") and not picked.get(name)
+        bytes_per_doc = per_doc.get(name)
+        report.append({
+            "name": name,
+            "key": [f"{field}:{direction}" for field, direction in key],
+            "protected": is_protected,
+            "ops": index.get("ops"),
+            "since": index.get("since"),
+            "queries_served": picked.get(name, 0),
+            "prefix_redundant": bool(covered_by),
+            "covered_by": covered_by,
+            "unused": unused,
+            "drop_candidate": bool(covered_by) or unused,
+            "size_bytes": sizes.get(name),
+            "bytes_per_insert": round(bytes_per_doc, 1) if bytes_per_doc is not None else None,
+            "insert_cost_share": round(bytes_per_doc / total_per_insert, 4)
+            if bytes_per_doc is not None and total_per_insert else None,
+        })
+
+    drop = [entry for entry in report if entry["drop_candidate"]]
+    saved = sum(entry["bytes_per_insert"] or 0 for entry in drop)
+    return {
+        "collection": collection,
+        "documents": documents,
+        "avg_document_bytes": avg_doc,
+        "index_writes_per_insert": len(indexes),
+        "recommended_writes_per_insert": len(indexes) - len(drop),
+        "insert_bytes_saved": round(saved / total_per_insert, 4) if total_per_insert else None,
+        "indexes": report,
+        "query_shapes": [dict(shape.to_dict(), count=count, index=best_index(kept, shape))
+                         for shape, count in shapes],
+    }
+
+
+def defined_indexes(collection: str) -> List[Dict]:
+    """Index definitions from ``app.db.INDEXES`` in the audit's shape (plus the implicit ``_id``)"""
+    result = [{"name": "_id_", "key": [("_id", 1)], "spec": {}}]
+    for model in INDEXES.get(collection, []):
+        document = dict(model.document)
+        name, key = document.pop("name"), _key_fields(document.pop("key"))
+        result.append({"name": name, "key": key, "spec": document})
+    return result
+
+
+def recommended_indexes(collection: str, report: Optional[Dict] = None) -> List:
+    """``INDEXES[collection]`` without the indexes the report marks for dropping"""
+    report = report or analyze(collection, defined_indexes(collection), [], live=False)
+    drop = {entry["name"] for entry in report["indexes"] if entry["drop_candidate"]}
+    return [model for model in INDEXES.get(collection, []) if model.document["name"] not in drop]
+
+
+async def collect_index_stats(collection: str) -> Tuple[List[Dict], Dict]:
+    database = await get_database()
+    indexes = []
+    async for stat in database[collection].aggregate([{"$indexStats": {}}]):
+        spec = {k: v for k, v in stat.get("spec", {}).items() if k not in ("v", "key", "name")}
+        indexes.append({
+            "name": stat["name"],
+            "key": _key_fields(stat["key"]),
+            "spec": spec,
+            "ops": stat["accesses"]["ops"],
+            "since": stat["accesses"]["since"],
+        })
+    storage = {}
+    async for stat in database[collection].aggregate([{"$collStats": {"storageStats": {}}}]):
+        storage = stat.get("storageStats", {})
+    return indexes, storage
+
+
+async def audit_indexes(collection: Optional[str] = None) -> List[Dict]:
+    """Live audit of one collection, or of every collection in ``INDEXES``"""
+    reports = []
+    for name in [collection] if collection else list(INDEXES):
+        indexes, storage = await collect_index_stats(name)
+        if indexes:
+            reports.append(analyze(name, indexes, query_shapes.snapshot(name), storage))
+    return reports
+
+
+def format_report(report: Dict) -> str:
+    lines = [f"{report['collection']}: {report['index_writes_per_insert']} index writes per insert, "
+             f"{report['recommended_writes_per_insert']} recommended"]
+    for entry in report["indexes"]:
+        flags = []
+        if entry["prefix_redundant"]:
+            flags.append(f"covered by {', '.join(entry['covered_by'])}")
+        if entry["unused"]:
+            flags.append("unused")
+        if entry["protected"]:
+            flags.append("kept (unique/TTL/text)")
+        cost = f"{entry['insert_cost_share']:.1%} of insert bytes" if entry["insert_cost_share"] is not None else ""
+        lines.append(f"  {'DROP' if entry['drop_candidate'] else 'keep'}  {entry['name']:<40} {cost:<22} "
+                     f"{'; '.join(flags)}")
+    return "\n".join(lines)
+
+
+async def _live_main(collection: Optional[str]):
+    await connect_to_mongo()
+    try:
+        for report in await audit_indexes(collection):
+            print(format_report(report))
+    finally:
+        await close_mongo_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit MongoDB index usage and write cost")
+    parser.add_argument("collection", nargs="?", help="Only audit this collection")
+    parser.add_argument("--static", action="store_true", help="Check app.db.INDEXES without a database")
+    args = parser.parse_args()
+    if args.static:
+        for name in [args.collection] if args.collection else list(INDEXES):
+            print(format_report(analyze(name, defined_indexes(name), [], live=False)))
+    else:
+        asyncio.run(_live_main(args.collection))
+
+
+if __name__ == "__main__":
+    main()
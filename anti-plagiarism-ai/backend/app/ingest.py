@@ -0,0 +1,172 @@
+"""
+Event batch ingestion shared by the REST and WebSocket paths.
+
+Every batch and socket is tied to a session the caller owns. The first batch
+(or socket) for an unknown ``session_id`` claims it: a ``sessions`` document
+is inserted for the caller, and the unique ``session_id`` index makes a
+concurrent claim by someone else fail. Later batches must come from the same
+user, and their ``contest_id`` is taken from the session document, never
+from the client. Ownership never changes, so each worker caches it.
+"""
+
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo.errors import DuplicateKeyError
+
+from app.schemas import SessionEventBatch, SessionEventBatchResult, EventType, SessionStatus
+from app.db import get_events_collection, get_sessions_collection, get_contests_collection
+from app.dedupe import batch_deduplicator
+from app.corpus import check_paste
+from app.keystroke import keystroke_tracker
+from app.rollups import rollup_buffer
+from app.core.config import settings
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+events_ingested = metrics.counter("ingest_events_total", "Session events written to the events collection")
+batches_ingested = metrics.counter("ingest_batches_total", "Event batches written to the events collection")
+sessions_rejected = metrics.counter("ingest_sessions_rejected_total", "Batches or sockets refused for a session")
+
+# session_id -> {"user_id", "contest_id"} of sessions seen by this worker
+_session_owners: "OrderedDict[str, dict]" = OrderedDict()
+
+
+def _forbidden(detail: str, reason: str) -> HTTPException:
+    sessions_rejected.inc(reason=reason)
+    return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+
+
+async def _insert_session(session_id: str, user_id: str, contest_id: Optional[str], language: str) -> dict:
+    if contest_id is not None:
+        contests_collection = await get_contests_collection()
+        contest = await contests_collection.find_one({"_id": contest_id}, projection={"participants": 1})
+        if contest is None:
+            raise _forbidden("Contest not found", "unknown_contest")
+        if contest.get("participants") and user_id not in contest["participants"]:
+            raise _forbidden("Not a participant of this contest", "not_participant")
+
+    sessions_collection = await get_sessions_collection()
+    now = datetime.utcnow()
+    document = {
+        "_id": str(ObjectId()),
+        "session_id": session_id,
+        "user_id": user_id,
+        "language": language,
+        "status": SessionStatus.ACTIVE.value,
+        "created_at": now,
+        "updated_at": now,
+    }
+    if contest_id is not None:
+        document["contest_id"] = contest_id  # The validator wants a string when present
+    await sessions_collection.insert_one(document)
+    logger.info(f"Session {session_id} started by user {user_id}")
+    return document
+
+
+async def claim_session(session_id: str, user_id: str, contest_id: Optional[str] = None,
+                        language: str = "javascript") -> dict:
+    """The caller's session (claimed on first use); 403 if it belongs to someone else"""
+    owner = _session_owners.get(session_id)
+    if owner is None:
+        sessions_collection = await get_sessions_collection()
+        projection = {"_id": 0, "user_id": 1, "contest_id": 1}
+        session = await sessions_collection.find_one({"session_id": session_id}, projection=projection)
+        if session is None:
+            try:
+                session = await _insert_session(session_id, user_id, contest_id, language)
+            except DuplicateKeyError:
+                # Claimed concurrently (by this user on another worker, or by someone else)
+                session = await sessions_collection.find_one({"session_id": session_id}, projection=projection)
+        owner = {"user_id": session["user_id"], "contest_id": session.get("contest_id")}
+        _session_owners[session_id] = owner
+        if len(_session_owners) > settings.INGEST_SESSION_CACHE_SIZE:
+            _session_owners.popitem(last=False)
+    else:
+        _session_owners.move_to_end(session_id)
+
+    if owner["user_id"] != user_id:
+        raise _forbidden("Session belongs to another user", "not_owner")
+    if contest_id is not None and contest_id != owner["contest_id"]:
+        raise _forbidden("Event batch contest does not match the session", "contest_mismatch")
+    return owner
+
+
+def build_event_documents(batch: SessionEventBatch, user_id: str) -> List[dict]:
+    """Convert a batch into one events document per event"""
+    now = datetime.utcnow()
+    documents = []
+    for event in batch.events:
+        document = {
+            "session_id": batch.session_id,
+            "user_id": user_id,
+            "contest_id": batch.contest_id,
+            "language": batch.language,
+            "event_type": event.type.value,
+            "timestamp": event.t,
+            "data": event.data.model_dump(exclude_none=True) if event.data else None,
+            "analysis": event.analysis,
+            "batch_id": batch.batch_id,
+            "sequence": batch.sequence,
+            "processed": False,
+            "created_at": now,
+        }
+        if event.type == EventType.PASTE and event.data and event.data.content:
+            paste_match = check_paste(event.data.content, batch.language)
+            if paste_match is not None:
+                document["paste_match"] = paste_match
+        documents.append(document)
+    return documents
+
+
+async def ingest_batch(batch: SessionEventBatch, current_user: dict) -> SessionEventBatchResult:
+    """Deduplicate and store an event batch for the authenticated user"""
+    user_id = str(current_user["_id"])
+    if batch.user_id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Event batch does not belong to the authenticated user"
+        )
+    session = await claim_session(batch.session_id, user_id, batch.contest_id, batch.language)
+    # Downstream consumers read contest_id from the batch; it must be the session's
+    batch = batch.model_copy(update={"contest_id": session["contest_id"]})
+
+    result = SessionEventBatchResult(
+        session_id=batch.session_id,
+        batch_id=batch.batch_id,
+        sequence=batch.sequence,
+    )
+
+    # Reject client retries before they reach Mongo
+    if await batch_deduplicator.is_duplicate(user_id, batch.session_id, batch.batch_id, batch.sequence):
+        result.duplicate = True
+        return result
+
+    if not batch.events:
+        return result
+
+    documents = build_event_documents(batch, user_id)
+    try:
+        events_collection = await get_events_collection()
+        await events_collection.insert_many(documents, ordered=False)
+    except Exception:
+        # Let the client's retry through once the write has failed
+        await batch_deduplicator.forget(user_id, batch.session_id, batch.batch_id, batch.sequence)
+        raise
+
+    batches_ingested.inc()
+    events_ingested.inc(len(documents))
+    result.accepted = len(documents)
+    rollup_buffer.add_batch(batch, user_id)
+
+    if settings.KEYSTROKE_ENABLED:
+        try:
+            await keystroke_tracker.observe(batch, user_id)
+        except Exception as e:
+            logger.error(f"Keystroke tracking failed for session {batch.session_id}: {e}")
+    return result
@@ -0,0 +1,83 @@
+"""
+Background job status shared by all workers.
+
+Similarity, export and provisioning jobs run as tasks in whichever worker took the request,
+but their status lives in the ``jobs`` collection, so a status or download
+request answered by any other worker (or container) sees the same job.
+
+Starting a job is one conditional upsert on the job's ``_id``: it succeeds if
+there is no document, or the previous run is no longer ``running``, or it has
+been running for longer than ``JOB_STALE_AFTER`` (its worker died without
+finishing it). A current running job makes the upsert collide on ``_id``, so
+"already running" holds across the cluster, not just within one worker.
+Timestamps used for staleness come from the server's clock (``$$NOW``).
+"""
+
+import logging
+from datetime import datetime
+from typing import Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.db import get_jobs_collection
+from app.leader import WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+def _public(document: dict) -> dict:
+    return {key: value for key, value in document.items() if key != "_id"}
+
+
+async def start_job(job_id: str, kind: str, fields: dict) -> Optional[dict]:
+    """Record a new running job; None while a live run with this id exists"""
+    jobs_collection = await get_jobs_collection()
+    stale_ms = int(settings.JOB_STALE_AFTER * 1000)
+    try:
+        job = await jobs_collection.find_one_and_update(
+            {
+                "_id": job_id,
+                "$or": [
+                    {"status": {"$ne": RUNNING}},
+                    {"$expr": {"$lt": ["$started_at", {"$subtract": ["$$NOW", stale_ms]}]}},
+                ],
+            },
+            [
+                # A new run replaces every field of the previous one
+                {"$replaceWith": {"_id": "$_id"}},
+                {"$set": {
+                    **{key: {"$literal": value} for key, value in fields.items()},
+                    "kind": kind,
+                    "status": RUNNING,
+                    "worker": WORKER_ID,
+                    "started_at": "$$NOW",
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # The job exists and is still running in some worker
+        return None
+    return _public(job)
+
+
+async def finish_job(job_id: str, fields: dict, failed: bool = False):
+    """Mark a job completed (or failed) with its result fields"""
+    jobs_collection = await get_jobs_collection()
+    await jobs_collection.update_one(
+        {"_id": job_id, "worker": WORKER_ID},
+        {"$set": {**fields, "status": FAILED if failed else COMPLETED, "finished_at": datetime.utcnow()}},
+    )
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    jobs_collection = await get_jobs_collection()
+    job = await jobs_collection.find_one({"_id": job_id})
+    return _public(job) if job is not None else None
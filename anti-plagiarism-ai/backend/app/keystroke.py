@@ -0,0 +1,490 @@
+"""
+Keystroke-dynamics profiles and the impersonation check.
+
+Each session's ``KEYPRESS`` timestamps are folded into a fixed-size float32
+feature vector as they are ingested:
+
+- ``INTERVAL_BINS`` normalized histogram of inter-key intervals (typing rhythm)
+- ``PAUSE_BINS`` normalized histogram of pauses longer than ``PAUSE_MS``
+- ``DIGRAPH_CELLS`` mean log-latency per key-class digraph (letter -> letter,
+  letter -> space, ...), NaN where the session has too few samples
+
+A user's profile is the vectors of their last ``KEYSTROKE_PROFILE_SESSIONS``
+sessions in ``keystroke_profiles``. The live session is compared to every
+stored session at once; the impersonation score grows with how far the
+nearest one is relative to the user's own session-to-session spread.
+
+Batches of one session may land on any worker, so the running statistics
+live in ``keystroke_sessions`` (one document per user and session), not in
+worker memory. Each batch is applied with a compare-and-set on the key count:
+a worker reads the state (or uses the copy it last wrote), folds the batch in
+and writes it back only if no other worker has written in between, otherwise
+it re-reads and retries. Workers only cache state and profiles.
+
+A finished session is folded into the profile exactly once: the worker
+that flips ``folded`` appends its vector with ``$push``/``$slice`` and then
+recomputes the spread from the stored vectors, so folds from different
+workers never overwrite each other. Sessions are folded when the user starts
+another session, when the session is completed, and by a leader-elected sweep
+once they have been idle for ``KEYSTROKE_IDLE_FOLD`` seconds.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+import numpy as np
+from bson import Binary
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.schemas import AnalysisResults, AnalysisType, EventType, SessionEventBatch
+from app.db import (
+    get_keystroke_profiles_collection, get_keystroke_sessions_collection, get_analytics_collection,
+    get_sessions_collection,
+)
+from app.leaderboard import record_session_result
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+FEATURE_VERSION = 2  # 2: profiles store one Binary vector per session
+JOB_SOURCE = "keystroke_dynamics"
+
+PAUSE_MS = 2000
+INTERVAL_EDGES = np.geomspace(20, PAUSE_MS, 16)[1:]  # 16 bins below PAUSE_MS
+PAUSE_EDGES = np.geomspace(PAUSE_MS, 300_000, 8)[1:]  # 8 bins from 2 s to 5 min
+INTERVAL_BINS = len(INTERVAL_EDGES) + 1
+PAUSE_BINS = len(PAUSE_EDGES) + 1
+KEY_CLASSES = 6  # lower, upper, digit, space, newline, symbol
+DIGRAPH_CELLS = KEY_CLASSES * KEY_CLASSES
+FEATURE_DIM = INTERVAL_BINS + PAUSE_BINS + DIGRAPH_CELLS
+MIN_DIGRAPH_SAMPLES = 5
+LOG_PAUSE = math.log(PAUSE_MS)
+
+impersonation_checks = metrics.counter("keystroke_impersonation_checks_total", "Live sessions scored against a profile")
+impersonation_flags = metrics.counter("keystroke_impersonation_flags_total", "Sessions flagged as possible impersonation")
+tracked_sessions = metrics.gauge("keystroke_tracked_sessions", "Sessions with keystroke state cached in this worker")
+state_conflicts = metrics.counter("keystroke_state_conflicts_total", "Session state writes retried after another worker wrote first")
+
+CAS_RETRIES = 5
+
+
+def key_class(key: Optional[str]) -> int:
+    if not key:
+        return 5
+    if key in ("\n", "\r", "Enter"):
+        return 4
+    if key in (" ", "\t", "Tab"):
+        return 3
+    if key.isdigit():
+        return 2
+    if key.isupper():
+        return 1
+    if key.isalpha():
+        return 0
+    return 5
+
+
+class SessionKeystrokes:
+    """Running keystroke statistics for one session"""
+
+    __slots__ = ("user_id", "session_id", "contest_id", "last_t", "last_class", "keys",
+                 "intervals", "pauses", "digraph_sum", "digraph_count", "last_scored", "score")
+
+    def __init__(self, user_id: str, session_id: str, contest_id: Optional[str]):
+        self.user_id = user_id
+        self.session_id = session_id
+        self.contest_id = contest_id
+        self.last_t: Optional[int] = None
+        self.last_class = 0
+        self.keys = 0
+        self.intervals = np.zeros(INTERVAL_BINS, dtype=np.float32)
+        self.pauses = np.zeros(PAUSE_BINS, dtype=np.float32)
+        self.digraph_sum = np.zeros(DIGRAPH_CELLS, dtype=np.float32)
+        self.digraph_count = np.zeros(DIGRAPH_CELLS, dtype=np.float32)
+        self.last_scored = 0
+        self.score: Optional[dict] = None
+
+    @classmethod
+    def from_document(cls, doc: dict) -> "SessionKeystrokes":
+        state = cls(doc["user_id"], doc["session_id"], doc.get("contest_id"))
+        state.last_t = doc.get("last_t")
+        state.last_class = doc.get("last_class", 0)
+        state.keys = doc.get("keys", 0)
+        stats = np.frombuffer(doc["stats"], dtype=np.float32)
+        state.intervals, state.pauses, state.digraph_sum, state.digraph_count = (
+            part.copy() for part in np.split(stats, np.cumsum([INTERVAL_BINS, PAUSE_BINS, DIGRAPH_CELLS]))
+        )
+        state.last_scored = doc.get("last_scored", 0)
+        state.score = doc.get("score")
+        return state
+
+    def to_fields(self) -> dict:
+        stats = np.concatenate([self.intervals, self.pauses, self.digraph_sum, self.digraph_count])
+        return {
+            "user_id": self.user_id,
+            "session_id": self.session_id,
+            "contest_id": self.contest_id,
+            "keys": self.keys,
+            "last_t": self.last_t,
+            "last_class": self.last_class,
+            "stats": Binary(stats.astype(np.float32).tobytes()),
+            "last_scored": self.last_scored,
+            "score": self.score,
+            "updated_at": datetime.utcnow(),
+        }
+
+    def update(self, times: np.ndarray, classes: np.ndarray):
+        """Fold a batch of keypress timestamps (ms, ascending) and key classes"""
+        if self.last_t is not None:
+            times = np.concatenate([[self.last_t], times])
+            classes = np.concatenate([[self.last_class], classes])
+        if len(times) > 1:
+            gaps = np.diff(times).astype(np.float64)
+            typing = (gaps > 0) & (gaps < PAUSE_MS)
+            paused = gaps >= PAUSE_MS
+
+            self.intervals += np.bincount(
+                np.searchsorted(INTERVAL_EDGES, gaps[typing]), minlength=INTERVAL_BINS
+            ).astype(np.float32)
+            self.pauses += np.bincount(
+                np.searchsorted(PAUSE_EDGES, gaps[paused]), minlength=PAUSE_BINS
+            ).astype(np.float32)
+
+            cells = (classes[:-1] * KEY_CLASSES + classes[1:])[typing]
+            np.add.at(self.digraph_sum, cells, np.log(gaps[typing]).astype(np.float32))
+            np.add.at(self.digraph_count, cells, 1)
+
+        self.keys += len(times) - (1 if self.last_t is not None else 0)
+        self.last_t = int(times[-1])
+        self.last_class = int(classes[-1])
+
+    def vector(self) -> np.ndarray:
+        intervals = self.intervals / max(self.intervals.sum(), 1.0)
+        pauses = self.pauses / max(self.pauses.sum(), 1.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            digraphs = (self.digraph_sum / self.digraph_count) / LOG_PAUSE
+        digraphs[self.digraph_count < MIN_DIGRAPH_SAMPLES] = np.nan
+        return np.concatenate([intervals, pauses, digraphs]).astype(np.float32)
+
+
+def nn_distances(live: np.ndarray, sessions: np.ndarray) -> np.ndarray:
+    """Mean absolute difference from ``live`` to each row, over dims both have"""
+    diff = np.abs(sessions - live[np.newaxis, :])
+    valid = ~np.isnan(diff)
+    return np.where(valid, diff, 0).sum(axis=1) / np.maximum(valid.sum(axis=1), 1)
+
+
+def profile_spread(sessions: np.ndarray) -> float:
+    """Median nearest-neighbour distance between a user's own sessions"""
+    if len(sessions) < 2:
+        return 0.0
+    nearest = []
+    for i in range(len(sessions)):
+        distances = nn_distances(sessions[i], np.delete(sessions, i, axis=0))
+        nearest.append(distances.min())
+    return float(np.median(nearest))
+
+
+def impersonation_score(live: np.ndarray, sessions: np.ndarray, spread: float) -> dict:
+    distances = nn_distances(live, sessions)
+    nearest = float(distances.min())
+    ratio = nearest / max(spread, settings.KEYSTROKE_MIN_SPREAD)
+    # At the user's usual spread the score is 0; at three times it, 1
+    score = min(max((ratio - 1.0) / 2.0, 0.0), 1.0)
+    return {
+        "score": round(score, 4),
+        "nearest_distance": round(nearest, 5),
+        "profile_spread": round(spread, 5),
+        "profile_sessions": int(len(sessions)),
+    }
+
+
+def _profile_matrix(profile: dict) -> np.ndarray:
+    """The stored session vectors of a profile as one (sessions x FEATURE_DIM) matrix"""
+    vectors = [np.frombuffer(vector, dtype=np.float32) for vector in profile.get("vectors") or []]
+    if not vectors:
+        return np.empty((0, FEATURE_DIM), dtype=np.float32)
+    return np.vstack(vectors)
+
+
+async def _session_contest(session_id: str, user_id: str) -> Optional[str]:
+    """The contest of the user's session, from the session document rather than the client"""
+    sessions_collection = await get_sessions_collection()
+    session = await sessions_collection.find_one(
+        {"session_id": session_id, "user_id": user_id}, projection={"_id": 0, "contest_id": 1}
+    )
+    return session.get("contest_id") if session is not None else None
+
+
+class KeystrokeTracker:
+    def __init__(self, max_sessions: int, max_profiles: int):
+        self.max_sessions = max_sessions
+        self.max_profiles = max_profiles
+        # Caches only: the state in Mongo is authoritative
+        self._sessions: "OrderedDict[str, SessionKeystrokes]" = OrderedDict()
+        self._profiles: "OrderedDict[str, Tuple[float, Optional[dict]]]" = OrderedDict()
+
+    @staticmethod
+    def _state_id(user_id: str, session_id: str) -> str:
+        return f"{user_id}:{session_id}"
+
+    def _cache_state(self, state_id: str, state: SessionKeystrokes):
+        self._sessions[state_id] = state
+        self._sessions.move_to_end(state_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        tracked_sessions.set(len(self._sessions))
+
+    async def _load_profile(self, user_id: str) -> Optional[dict]:
+        cached = self._profiles.get(user_id)
+        if cached is not None and time.monotonic() - cached[0] < settings.KEYSTROKE_PROFILE_TTL:
+            self._profiles.move_to_end(user_id)
+            return cached[1]
+
+        collection = await get_keystroke_profiles_collection()
+        doc = await collection.find_one({"_id": user_id})
+        profile = None
+        if doc is not None and doc.get("feature_version") == FEATURE_VERSION and doc.get("vectors"):
+            profile = {"sessions": _profile_matrix(doc), "spread": doc.get("spread", 0.0)}
+
+        self._profiles[user_id] = (time.monotonic(), profile)
+        self._profiles.move_to_end(user_id)
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+        return profile
+
+    async def _push_vector(self, state: SessionKeystrokes) -> dict:
+        """Append the session's vector to its user's profile; returns the updated profile"""
+        collection = await get_keystroke_profiles_collection()
+        now = datetime.utcnow()
+        vector = Binary(state.vector().astype(np.float32).tobytes())
+        keep = -settings.KEYSTROKE_PROFILE_SESSIONS
+        push = {
+            "$push": {
+                "vectors": {"$each": [vector], "$slice": keep},
+                "session_ids": {"$each": [state.session_id], "$slice": keep},
+            },
+            "$inc": {"sessions_folded": 1},
+            "$set": {"updated_at": now},
+        }
+        for _ in range(2):
+            profile = await collection.find_one_and_update(
+                {"_id": state.user_id, "feature_version": FEATURE_VERSION},
+                push,
+                return_document=ReturnDocument.AFTER,
+            )
+            if profile is not None:
+                return profile
+            try:
+                # First fold for this user, or a profile from an older feature version
+                return await collection.find_one_and_update(
+                    {"_id": state.user_id, "feature_version": {"$ne": FEATURE_VERSION}},
+                    {"$set": {
+                        "feature_version": FEATURE_VERSION,
+                        "dim": FEATURE_DIM,
+                        "vectors": [vector],
+                        "session_ids": [state.session_id],
+                        "sessions_folded": 1,
+                        "spread": 0.0,
+                        "updated_at": now,
+                    }, "$unset": {"sessions": ""}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+            except DuplicateKeyError:
+                continue  # Another worker created the profile first: push onto it
+        raise RuntimeError(f"Could not update the keystroke profile of user {state.user_id}")
+
+    async def _fold(self, state: SessionKeystrokes):
+        """Append a finished session's vector to its user's profile (caller claimed the fold)"""
+        if state.keys < settings.KEYSTROKE_MIN_KEYS:
+            return
+        try:
+            profile = await self._push_vector(state)
+            spread = profile_spread(_profile_matrix(profile))
+            collection = await get_keystroke_profiles_collection()
+            # Only if no later fold has changed the vectors since
+            await collection.update_one(
+                {"_id": state.user_id, "sessions_folded": profile["sessions_folded"]},
+                {"$set": {"spread": spread}},
+            )
+            self._profiles.pop(state.user_id, None)
+        except Exception as e:
+            logger.error(f"Failed to update keystroke profile for user {state.user_id}: {e}")
+
+    async def _claim_and_fold(self, query: dict) -> int:
+        """Fold every unfolded session matching ``query`` that no other worker claims first"""
+        collection = await get_keystroke_sessions_collection()
+        folded = 0
+        async for doc in collection.find({**query, "folded": False}, projection={"_id": 1}):
+            claimed = await collection.find_one_and_update(
+                {"_id": doc["_id"], "folded": False},
+                {"$set": {"folded": True, "folded_at": datetime.utcnow()}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if claimed is None:
+                continue
+            self._sessions.pop(doc["_id"], None)
+            await self._fold(SessionKeystrokes.from_document(claimed))
+            folded += 1
+        return folded
+
+    async def fold_session(self, user_id: str, session_id: str) -> int:
+        """Fold a session that has ended (e.g. completed)"""
+        return await self._claim_and_fold({"_id": self._state_id(user_id, session_id)})
+
+    async def fold_idle_sessions(self) -> int:
+        """Fold sessions without keypresses for ``KEYSTROKE_IDLE_FOLD`` seconds"""
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.KEYSTROKE_IDLE_FOLD)
+        return await self._claim_and_fold({"updated_at": {"$lt": cutoff}})
+
+    async def _store_score(self, state: SessionKeystrokes):
+        score = state.score
+        flagged = score["score"] >= settings.KEYSTROKE_FLAG_THRESHOLD
+        results = AnalysisResults(
+            confidence_score=score["score"],
+            flags=["possible_impersonation"] if flagged else [],
+            patterns={"source": JOB_SOURCE, "keys": state.keys, **score},
+            risk_level="high" if flagged else "low",
+        )
+        analytics_collection = await get_analytics_collection()
+        await analytics_collection.update_one(
+            {
+                "session_id": state.session_id,
+                "user_id": state.user_id,
+                "analysis_type": AnalysisType.TYPING_PATTERN.value,
+                "results.patterns.source": JOB_SOURCE,
+            },
+            {"$set": {
+                "contest_id": state.contest_id,
+                "results": results.model_dump(),
+                "processed_at": datetime.utcnow(),
+                "version": f"{FEATURE_VERSION}.0.0",
+            }},
+            upsert=True,
+        )
+        if flagged:
+            impersonation_flags.inc()
+        await record_session_result(state.contest_id, state.session_id, state.user_id, JOB_SOURCE, results)
+
+    async def _apply(self, state_id: str, state: Optional[SessionKeystrokes], user_id: str,
+                     batch: SessionEventBatch, times: np.ndarray, classes: np.ndarray) -> Optional[tuple]:
+        """Fold a batch into ``state`` and write it back if nobody wrote since
+
+        Returns (state, scored, created), or None when another worker wrote first.
+        """
+        created = state is None
+        if created:
+            state = SessionKeystrokes(user_id, batch.session_id, await _session_contest(batch.session_id, user_id))
+        expected_keys = state.keys
+
+        if state.last_t is not None and times[0] < state.last_t:
+            # Out-of-order batch: keep the counts consistent by skipping the overlap
+            keep = times >= state.last_t
+            times, classes = times[keep], classes[keep]
+            if len(times) == 0:
+                return state, False, False
+        state.update(times, classes)
+
+        scored = False
+        if (state.keys >= settings.KEYSTROKE_MIN_KEYS
+                and state.keys - state.last_scored >= settings.KEYSTROKE_SCORE_EVERY):
+            profile = await self._load_profile(user_id)
+            if profile is not None and len(profile["sessions"]) >= settings.KEYSTROKE_MIN_PROFILE_SESSIONS:
+                state.last_scored = state.keys
+                state.score = impersonation_score(state.vector(), profile["sessions"], profile["spread"])
+                scored = True
+
+        collection = await get_keystroke_sessions_collection()
+        fields = state.to_fields()
+        if created:
+            try:
+                await collection.insert_one({"_id": state_id, **fields, "folded": False, "created_at": datetime.utcnow()})
+            except DuplicateKeyError:
+                return None
+        else:
+            result = await collection.update_one({"_id": state_id, "keys": expected_keys}, {"$set": fields})
+            if result.matched_count == 0:
+                return None
+        return state, scored, created
+
+    async def observe(self, batch: SessionEventBatch, user_id: str):
+        """Update the shared session state from a batch and rescore the session when due"""
+        keypresses = [event for event in batch.events if event.type == EventType.KEYPRESS]
+        if not keypresses:
+            return
+
+        keypresses.sort(key=lambda event: event.t)
+        times = np.fromiter((event.t for event in keypresses), dtype=np.int64, count=len(keypresses))
+        classes = np.fromiter(
+            (key_class(event.data.content if event.data else None) for event in keypresses),
+            dtype=np.int64, count=len(keypresses),
+        )
+
+        state_id = self._state_id(user_id, batch.session_id)
+        collection = await get_keystroke_sessions_collection()
+        cached = self._sessions.pop(state_id, None)
+        for attempt in range(CAS_RETRIES):
+            if cached is not None and attempt == 0:
+                state = cached
+            else:
+                doc = await collection.find_one({"_id": state_id})
+                state = SessionKeystrokes.from_document(doc) if doc is not None else None
+            applied = await self._apply(state_id, state, user_id, batch, times, classes)
+            if applied is not None:
+                break
+            state_conflicts.inc()
+        else:
+            logger.warning(f"Gave up updating keystroke state for session {batch.session_id} after "
+                           f"{CAS_RETRIES} conflicting writes")
+            return
+
+        state, scored, created = applied
+        self._cache_state(state_id, state)
+        if created:
+            # First keypresses of this session: the user's earlier sessions are over
+            await self._claim_and_fold({"user_id": user_id, "_id": {"$ne": state_id}})
+        if scored:
+            impersonation_checks.inc()
+            await self._store_score(state)
+
+    async def session_score(self, session_id: str) -> Optional[dict]:
+        collection = await get_keystroke_sessions_collection()
+        doc = await collection.find_one(
+            {"session_id": session_id}, projection={"keys": 1, "score": 1, "folded": 1}
+        )
+        if doc is None:
+            return None
+        return {"keys": doc.get("keys", 0), "impersonation": doc.get("score"), "folded": doc.get("folded", False)}
+
+    def close(self):
+        """Drop cached state; sessions stay in Mongo for other workers and the idle sweep"""
+        self._sessions.clear()
+        self._profiles.clear()
+        tracked_sessions.set(0)
+
+
+async def keystroke_fold_job():
+    """Fold idle sessions into profiles (run under the keystroke lease)"""
+    while True:
+        try:
+            folded = await keystroke_tracker.fold_idle_sessions()
+            if folded:
+                logger.info(f"Folded {folded} idle sessions into keystroke profiles")
+        except Exception as e:
+            logger.error(f"Keystroke idle fold failed: {e}")
+        await asyncio.sleep(settings.KEYSTROKE_IDLE_FOLD / 4)
+
+
+# Global keystroke tracker
+keystroke_tracker = KeystrokeTracker(
+    max_sessions=settings.KEYSTROKE_MAX_SESSIONS,
+    max_profiles=settings.KEYSTROKE_MAX_PROFILES,
+)
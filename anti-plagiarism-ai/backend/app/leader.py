@@ -0,0 +1,126 @@
+"""
+Leader election for cluster-wide background jobs.
+
+With several workers (and several containers) every process runs the app's
+lifespan, but jobs such as the archive scheduler must run once per cluster.
+Each such job is guarded by a lease document in the ``leases`` collection:
+the holder renews it every ``LEADER_RENEW_INTERVAL`` seconds and it expires
+``LEADER_LEASE_TTL`` seconds after the last renewal, so if the leader dies
+another worker takes over within one TTL.
+
+Acquire and renew are one conditional upsert each, and expiry is compared
+against the server's clock (``$$NOW``), so worker clock skew does not matter.
+Per-worker jobs (rollup flushing, in-memory caches) do not go through this.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Awaitable, Callable, Dict, List
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.db import get_leases_collection
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Identifies this worker process in lease documents
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+leader_gauge = metrics.gauge("leader_status", "1 while this worker holds a job's lease")
+leader_transitions = metrics.counter("leader_transitions_total", "Lease acquisitions and losses")
+
+
+class LeaderLease:
+    def __init__(self, name: str):
+        self.name = name
+        self.is_leader = False
+
+    async def acquire(self) -> bool:
+        """Take or renew the lease; False while another worker holds it"""
+        leases_collection = await get_leases_collection()
+        ttl_ms = int(settings.LEADER_LEASE_TTL * 1000)
+        try:
+            lease = await leases_collection.find_one_and_update(
+                {
+                    "_id": self.name,
+                    "$or": [
+                        {"holder": WORKER_ID},
+                        {"$expr": {"$lt": ["$expires_at", "$$NOW"]}},
+                    ],
+                },
+                [{"$set": {
+                    "holder": WORKER_ID,
+                    "acquired_at": {"$cond": [{"$eq": ["$holder", WORKER_ID]}, "$acquired_at", "$$NOW"]},
+                    "renewed_at": "$$NOW",
+                    "expires_at": {"$add": ["$$NOW", ttl_ms]},
+                }}],
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            held = lease is not None and lease.get("holder") == WORKER_ID
+        except DuplicateKeyError:
+            # The lease exists, is current and belongs to someone else
+            held = False
+        self._set_leader(held)
+        return held
+
+    async def release(self):
+        if not self.is_leader:
+            return
+        try:
+            leases_collection = await get_leases_collection()
+            await leases_collection.delete_one({"_id": self.name, "holder": WORKER_ID})
+        except Exception as e:
+            logger.warning(f"Failed to release lease {self.name}: {e}")
+        self._set_leader(False)
+
+    def _set_leader(self, held: bool):
+        if held != self.is_leader:
+            leader_transitions.inc(job=self.name, event="acquired" if held else "lost")
+            logger.info(f"Worker {WORKER_ID} {'acquired' if held else 'lost'} the {self.name} lease")
+        self.is_leader = held
+        leader_gauge.set(1 if held else 0, job=self.name)
+
+
+async def run_as_leader(name: str, job: Callable[[], Awaitable[None]]):
+    """Run ``job`` in this worker only while it holds the ``name`` lease"""
+    lease = LeaderLease(name)
+    task = None
+    try:
+        while True:
+            try:
+                held = await lease.acquire()
+            except Exception as e:
+                # Cannot confirm the lease: stop before another worker takes over
+                logger.warning(f"Lease check for {name} failed: {e}")
+                held = False
+                lease._set_leader(False)
+
+            if held and task is None:
+                task = asyncio.create_task(job())
+            elif not held and task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                task = None
+            if task is not None and task.done():
+                if not task.cancelled() and task.exception():
+                    logger.error(f"Leader job {name} failed: {task.exception()}")
+                task = None
+
+            await asyncio.sleep(settings.LEADER_RENEW_INTERVAL)
+    finally:
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await lease.release()
+
+
+async def get_leases() -> List[Dict]:
+    leases_collection = await get_leases_collection()
+    return [lease async for lease in leases_collection.find({})]
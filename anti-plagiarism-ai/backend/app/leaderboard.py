@@ -0,0 +1,173 @@
+"""
+Materialized per-contest risk leaderboard.
+
+One ``leaderboards`` document per (contest, session) holds the latest
+``AnalysisResults`` summary from each analysis source (similarity clusters,
+keystroke dynamics, ...) plus the session's overall ``risk_rank`` and
+``confidence_score`` (the maximum over its sources) and the student's
+username. Sources write their results here as they land, with pipeline updates
+that recompute the overall fields server-side in the same round trip, so the
+leaderboard never needs a join across ``sessions``, ``analytics`` and
+``users``.
+
+Reads go through the ``(contest_id, risk_rank, confidence_score)`` index.
+Every change is pushed to the contest's dashboard WebSockets as a delta of
+the changed rows only: by the change-stream watcher in every worker when
+change streams are available, otherwise directly by the writing worker.
+"""
+
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from app.schemas import AnalysisResults, WSMessage, WSMessageType
+from app.db import get_leaderboards_collection, get_users_collection
+from app.websocket_manager import manager
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+RISK_RANKS = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+ROW_PROJECTION = {
+    "_id": 0, "session_id": 1, "user_id": 1, "username": 1,
+    "risk_rank": 1, "risk_level": 1, "confidence_score": 1, "flags": 1, "sources": 1, "updated_at": 1,
+}
+
+leaderboard_updates = metrics.counter("leaderboard_updates_total", "Leaderboard rows updated")
+leaderboard_deltas = metrics.counter("leaderboard_deltas_sent_total", "Leaderboard delta messages pushed")
+
+_usernames: "OrderedDict[str, Optional[str]]" = OrderedDict()
+_USERNAME_CACHE_SIZE = 50000
+
+
+async def _resolve_usernames(user_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+    missing = [user_id for user_id in set(user_ids) if user_id not in _usernames]
+    if missing:
+        users_collection = await get_users_collection()
+        found = {user_id: None for user_id in missing}
+        async for user in users_collection.find({"_id": {"$in": missing}}, projection={"username": 1}):
+            found[user["_id"]] = user.get("username")
+        _usernames.update(found)
+        while len(_usernames) > _USERNAME_CACHE_SIZE:
+            _usernames.popitem(last=False)
+    return {user_id: _usernames.get(user_id) for user_id in user_ids}
+
+
+def _recompute_stages(now: datetime) -> List[dict]:
+    """Pipeline stages deriving the overall fields from ``sources``"""
+    entries = {"$objectToArray": {"$ifNull": ["$sources", {}]}}
+    return [
+        {"$set": {
+            "confidence_score": {"$ifNull": [{"$max": {"$map": {"input": entries, "in": "$$this.v.confidence_score"}}}, 0.0]},
+            "risk_rank": {"$ifNull": [{"$max": {"$map": {"input": entries, "in": "$$this.v.risk_rank"}}}, 0]},
+            "flags": {"$reduce": {
+                "input": {"$map": {"input": entries, "in": "$$this.v.flags"}},
+                "initialValue": [],
+                "in": {"$setUnion": ["$$value", "$$this"]},
+            }},
+            "updated_at": now,
+        }},
+        {"$set": {"risk_level": {"$arrayElemAt": [list(RISK_RANKS), "$risk_rank"]}}},
+    ]
+
+
+def _source_entry(results: AnalysisResults) -> dict:
+    return {
+        "confidence_score": results.confidence_score,
+        "risk_level": results.risk_level,
+        "risk_rank": RISK_RANKS.get(results.risk_level, 0),
+        "flags": results.flags,
+    }
+
+
+async def record_results(contest_id: str, rows: List[dict], source: str):
+    """Store one source's results for several sessions and push the delta
+
+    ``rows`` are dicts with ``session_id``, ``user_id`` and ``results``
+    (``AnalysisResults``).
+    """
+    if not contest_id or not rows:
+        return
+    usernames = await _resolve_usernames(row["user_id"] for row in rows)
+    now = datetime.utcnow()
+    operations = []
+    for row in rows:
+        operations.append(UpdateOne(
+            {"contest_id": contest_id, "session_id": row["session_id"]},
+            [
+                {"$set": {
+                    "user_id": row["user_id"],
+                    "username": {"$ifNull": ["$username", usernames.get(row["user_id"])]},
+                    f"sources.{source}": {"$literal": _source_entry(row["results"])},
+                }},
+                *_recompute_stages(now),
+            ],
+            upsert=True,
+        ))
+
+    leaderboards_collection = await get_leaderboards_collection()
+    await leaderboards_collection.bulk_write(operations, ordered=False)
+    leaderboard_updates.inc(len(operations))
+    await _push_delta(contest_id, [row["session_id"] for row in rows])
+
+
+async def clear_source(contest_id: str, source: str, keep_session_ids: Iterable[str]):
+    """Drop a source's entry from sessions it no longer reports on (e.g. a re-run job)"""
+    leaderboards_collection = await get_leaderboards_collection()
+    query = {
+        "contest_id": contest_id,
+        f"sources.{source}": {"$exists": True},
+        "session_id": {"$nin": list(keep_session_ids)},
+    }
+    stale = [doc["session_id"] async for doc in leaderboards_collection.find(query, projection={"session_id": 1})]
+    if not stale:
+        return
+    await leaderboards_collection.update_many(
+        {"contest_id": contest_id, "session_id": {"$in": stale}},
+        [{"$unset": f"sources.{source}"}, *_recompute_stages(datetime.utcnow())],
+    )
+    leaderboard_updates.inc(len(stale))
+    await _push_delta(contest_id, stale)
+
+
+async def record_session_result(contest_id: Optional[str], session_id: str, user_id: str,
+                                source: str, results: AnalysisResults):
+    """Single-session variant for analyses that run per session"""
+    if contest_id:
+        await record_results(contest_id, [{"session_id": session_id, "user_id": user_id, "results": results}], source)
+
+
+async def get_leaderboard(contest_id: str, limit: int = 100, skip: int = 0) -> List[dict]:
+    """Rows sorted by risk, served from the (contest_id, risk_rank, confidence_score) index"""
+    leaderboards_collection = await get_leaderboards_collection()
+    cursor = leaderboards_collection.find({"contest_id": contest_id}, projection=ROW_PROJECTION) \
+        .sort([("risk_rank", -1), ("confidence_score", -1)]).skip(skip).limit(limit)
+    return [row async for row in cursor]
+
+
+async def _push_delta(contest_id: str, session_ids: List[str]):
+    # With change streams every worker pushes the rows it sees change, including this one
+    if manager.change_stream_fanout or not manager.has_contest_subscribers(contest_id):
+        return
+    leaderboards_collection = await get_leaderboards_collection()
+    cursor = leaderboards_collection.find(
+        {"contest_id": contest_id, "session_id": {"$in": session_ids}}, projection=ROW_PROJECTION
+    )
+    rows = [row async for row in cursor]
+    await manager.broadcast_to_contest(contest_id, WSMessage(
+        type=WSMessageType.ANALYTICS,
+        data={"contest_id": contest_id, "leaderboard_delta": rows},
+    ))
+    leaderboard_deltas.inc()
+
+
+async def send_snapshot(websocket, contest_id: str, limit: int):
+    """Initial full view for a newly subscribed dashboard; deltas follow"""
+    rows = await get_leaderboard(contest_id, limit=limit)
+    await manager.send_message(websocket, WSMessage(
+        type=WSMessageType.ANALYTICS,
+        data={"contest_id": contest_id, "leaderboard": rows},
+    ))
@@ -1,26 +1,50 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 # Import configuration
 from app.core.config import settings, validate_settings
+from app.core.logs import setup_logging
 
 # Import database connection
 from app.db import connect_to_mongo, close_mongo_connection
 
+# Import admission control
+from app.admission import AdmissionControlMiddleware, loop_lag_monitor
+
+# Import diagnostics
+from app.profiling import ProfilingMiddleware, loop_watchdog
+
+# Import background jobs
+from app.archive import archive_scheduler, archive_store
+from app.compaction import compaction_scheduler
+from app.corpus import corpus_index, corpus_sync_job, corpus_reloader
+from app.keystroke import keystroke_tracker, keystroke_fold_job
+from app.rollups import rollup_flusher, rollup_buffer
+from app.redis_client import redis_client
+from app.health import health_prober
+from app.schemas import HealthCheck
+from app.metrics import metrics
+from app.auth import get_current_host
+from app.leader import run_as_leader, WORKER_ID
+from app.change_streams import change_stream_watcher
+from app.index_audit import enable_query_shape_capture
+
 # Import routes
-from app.routes import auth_routes
-# from app.routes import contest_routes, event_routes
+from app.routes import auth_routes, event_routes, ws_routes, admin_routes, analysis_routes, export_routes
+# from app.routes import contest_routes
 
-# Configure logging
-logging.basicConfig(level=getattr(logging, settings.LOG_LEVEL))
+# Configure logging (queued, written by a background thread)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    logger.info("Starting Anti-Plagiarism AI Backend...")
+    # Startup (runs in every worker)
+    logger.info(f"Starting Anti-Plagiarism AI Backend (worker {WORKER_ID})...")
     
     # Validate configuration
     try:
@@ -30,14 +54,58 @@ async def lifespan(app: FastAPI):
         logger.error(f"Configuration validation failed: {e}")
         raise
     
-    # Connect to database
+    # Connect to database (the query-shape listener must be registered first)
+    if settings.INDEX_AUDIT_ENABLED:
+        enable_query_shape_capture()
     await connect_to_mongo()
     logger.info("Database connection established")
     
+    # Shared Redis pool (callers fall back to in-process state while it is down)
+    await redis_client.connect()
+    
+    # Cached dependency checks behind the liveness/readiness probes
+    await health_prober.start()
+    
+    # Start event-loop lag sampling for admission control
+    loop_lag_monitor.start()
+    if settings.SLOW_CALLBACK_WATCHDOG_ENABLED:
+        loop_watchdog.start()
+    
+    # Push dashboard updates from change streams (replica sets only)
+    await change_stream_watcher.start()
+    
+    # Map the known-solutions corpus for paste matching (read-only; the corpus leader syncs it)
+    if settings.CORPUS_ENABLED:
+        await asyncio.to_thread(corpus_index.open)
+    
+    # Start background jobs: per-worker ones directly, cluster-wide ones behind a lease
+    background_tasks = [asyncio.create_task(rollup_flusher())]
+    if settings.ARCHIVE_ENABLED:
+        background_tasks.append(asyncio.create_task(run_as_leader("archive", archive_scheduler)))
+        logger.info("Archive scheduler waiting for leadership")
+    if settings.COMPACTION_ENABLED:
+        background_tasks.append(asyncio.create_task(run_as_leader("compaction", compaction_scheduler)))
+    if settings.KEYSTROKE_ENABLED:
+        background_tasks.append(asyncio.create_task(run_as_leader("keystroke", keystroke_fold_job)))
+    if settings.CORPUS_ENABLED:
+        background_tasks.append(asyncio.create_task(corpus_reloader()))
+        background_tasks.append(asyncio.create_task(run_as_leader("corpus", corpus_sync_job)))
+    
     yield
     
     # Shutdown
     logger.info("Shutting down Anti-Plagiarism AI Backend...")
+    await health_prober.stop()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await rollup_buffer.flush()
+    await change_stream_watcher.stop()
+    await loop_lag_monitor.stop()
+    loop_watchdog.stop()
+    archive_store.close()
+    keystroke_tracker.close()
+    await redis_client.close()
     await close_mongo_connection()
     logger.info("Database connection closed")
 
@@ -48,6 +116,12 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Request latency tracking and opt-in profiling (innermost, so shed requests are not timed)
+app.add_middleware(ProfilingMiddleware)
+
+# Load shedding (added before CORS so shed responses still carry CORS headers)
+app.add_middleware(AdmissionControlMiddleware)
+
 # CORS setup - use configured origins
 app.add_middleware(
     CORSMiddleware,
@@ -73,6 +147,25 @@ async def health_check():
         ]
     }
 
+@app.get("/api/v1/health/live", response_model=HealthCheck)
+async def liveness_probe():
+    """The worker is up and its event loop answers (no dependency checks)"""
+    return health_prober.liveness()
+
+@app.get("/api/v1/health/ready", response_model=HealthCheck)
+async def readiness_probe():
+    """Cached MongoDB/Redis status, event-loop lag and thread-pool queue depth; 503 while not ready"""
+    ready, report = health_prober.readiness()
+    if not ready:
+        return JSONResponse(status_code=503, content=report.model_dump(mode="json"))
+    return report
+
+# Metrics endpoint
+@app.get("/api/v1/metrics")
+async def get_metrics(current_user: dict = Depends(get_current_host)):
+    """Metrics of the worker that answered (hosts only); scrape every worker and sum by worker_id"""
+    return {"worker_id": WORKER_ID, **metrics.snapshot()}
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -80,5 +173,9 @@ async def root():
 
 # Include routers
 app.include_router(auth_routes.router, prefix="/api/v1")
-# app.include_router(contest_routes.router, prefix="/api/v1")
-# app.include_router(event_routes.router, prefix="/api/v1")
\ No newline at end of file
+app.include_router(event_routes.router, prefix="/api/v1")
+app.include_router(ws_routes.router, prefix="/api/v1")
+app.include_router(admin_routes.router, prefix="/api/v1")
+app.include_router(analysis_routes.router, prefix="/api/v1")
+app.include_router(export_routes.router, prefix="/api/v1")
+# app.include_router(contest_routes.router, prefix="/api/v1")
\ No newline at end of file
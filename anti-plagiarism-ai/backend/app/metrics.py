@@ -0,0 +1,131 @@
+"""
+Lightweight in-process metrics registry.
+
+Counters, gauges and summaries are kept in memory per worker and exposed as a
+JSON snapshot through ``/api/v1/metrics``.
+"""
+
+import threading
+from typing import Any, Dict, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metric:
+    type = "metric"
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._values: Dict[LabelKey, Any] = {}
+        self._lock = threading.Lock()
+
+    def _render(self, value: Any) -> Any:
+        return value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            values = [
+                {"labels": dict(key), "value": self._render(value)}
+                for key, value in self._values.items()
+            ]
+        return {"type": self.type, "description": self.description, "values": values}
+
+    def clear(self, **labels):
+        """Drop one label set (or all values when called without labels)"""
+        with self._lock:
+            if labels:
+                self._values.pop(_label_key(labels), None)
+            else:
+                self._values.clear()
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+
+class Summary(Metric):
+    """Count, sum and max of observed values (e.g. latencies in ms)"""
+
+    type = "summary"
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            current = self._values.get(key)
+            if current is None:
+                self._values[key] = [1, value, value]
+            else:
+                current[0] += 1
+                current[1] += value
+                if value > current[2]:
+                    current[2] = value
+
+    def _render(self, value: Any) -> Any:
+        count, total, maximum = value
+        return {"count": count, "sum": total, "avg": total / count, "max": maximum}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, description: str):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, description)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric '{name}' already registered as {metric.type}")
+            return metric
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        return self._register(Counter, name, description)
+
+    def gauge(self, name: str, description: str = "") -> Gauge:
+        return self._register(Gauge, name, description)
+
+    def summary(self, name: str, description: str = "") -> Summary:
+        return self._register(Summary, name, description)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+
+# Global metrics registry
+metrics = MetricsRegistry()
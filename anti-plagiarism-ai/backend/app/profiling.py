@@ -0,0 +1,263 @@
+"""
+Opt-in diagnostics for latency spikes.
+
+* Per-request profiles: a request carrying ``X-Profile: <PROFILING_TOKEN>`` is
+  profiled (pyinstrument when installed, cProfile otherwise) and the report is
+  kept in memory under the id returned in the ``X-Profile-Id`` header.
+* Slow-callback watchdog: a thread notices when the event loop has not run its
+  heartbeat for ``SLOW_CALLBACK_THRESHOLD_MS`` and logs the loop thread's stack.
+* Endpoint latency tracker: rolling per-route latency window for a top-N
+  slowest-endpoint report.
+"""
+
+import asyncio
+import cProfile
+import hmac
+import io
+import logging
+import pstats
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.metrics import metrics
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:  # pyinstrument is optional
+    SamplingProfiler = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+
+slow_callbacks_counter = metrics.counter("event_loop_slow_callbacks_total", "Loop stalls caught by the watchdog")
+request_latency = metrics.summary("http_request_latency_ms", "HTTP request latency per route")
+
+
+# Per-request profiles ------------------------------------------------------
+
+class ProfileStore:
+    """Bounded store of recent profile reports"""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._profiles: "OrderedDict[str, dict]" = OrderedDict()
+
+    def add(self, profile_id: str, method: str, path: str, duration_ms: float, engine: str, report: str):
+        self._profiles[profile_id] = {
+            "id": profile_id,
+            "method": method,
+            "path": path,
+            "duration_ms": round(duration_ms, 3),
+            "engine": engine,
+            "created_at": datetime.utcnow(),
+            "report": report,
+        }
+        while len(self._profiles) > self.max_items:
+            self._profiles.popitem(last=False)
+
+    def list(self) -> List[dict]:
+        return [
+            {key: value for key, value in profile.items() if key != "report"}
+            for profile in reversed(self._profiles.values())
+        ]
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        return self._profiles.get(profile_id)
+
+
+profile_store = ProfileStore(settings.PROFILING_MAX_STORED)
+
+
+class RequestProfiler:
+    """Wraps one request; only one cProfile session may be active at a time"""
+
+    _cprofile_lock = threading.Lock()
+
+    def __init__(self):
+        self.engine = "pyinstrument" if SamplingProfiler is not None else "cprofile"
+        self._profiler = None
+        self._locked = False
+
+    def start(self) -> bool:
+        if SamplingProfiler is not None:
+            # async_mode attributes time to the awaiting request, not other tasks
+            self._profiler = SamplingProfiler(async_mode="enabled")
+            self._profiler.start()
+            return True
+
+        if not self._cprofile_lock.acquire(blocking=False):
+            return False
+        self._locked = True
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+        return True
+
+    def stop(self) -> str:
+        if self.engine == "pyinstrument":
+            self._profiler.stop()
+            return self._profiler.output_text(unicode=False, color=False)
+
+        try:
+            self._profiler.disable()
+            output = io.StringIO()
+            stats = pstats.Stats(self._profiler, stream=output)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(40)
+            # cProfile sees every coroutine step on the loop, not only this request's
+            return "cProfile (includes concurrent tasks on the loop)\n" + output.getvalue()
+        finally:
+            if self._locked:
+                self._cprofile_lock.release()
+                self._locked = False
+
+
+# Endpoint latency ------------------------------------------------------------
+
+class EndpointLatencyTracker:
+    """Rolling window of request latencies per route"""
+
+    def __init__(self, window_seconds: int, max_samples: int = 1000):
+        self.window_seconds = window_seconds
+        self.max_samples = max_samples
+        self._samples: Dict[str, Deque[Tuple[float, float]]] = {}
+
+    def record(self, route: str, duration_ms: float):
+        samples = self._samples.get(route)
+        if samples is None:
+            samples = self._samples[route] = deque(maxlen=self.max_samples)
+        samples.append((time.monotonic(), duration_ms))
+        request_latency.observe(duration_ms, route=route)
+
+    def top(self, limit: int) -> List[dict]:
+        cutoff = time.monotonic() - self.window_seconds
+        report = []
+        for route, samples in list(self._samples.items()):
+            durations = sorted(duration for recorded, duration in samples if recorded >= cutoff)
+            if not durations:
+                continue
+            count = len(durations)
+            report.append({
+                "route": route,
+                "count": count,
+                "p50_ms": round(durations[count // 2], 3),
+                "p95_ms": round(durations[min(count - 1, int(count * 0.95))], 3),
+                "max_ms": round(durations[-1], 3),
+            })
+        report.sort(key=lambda item: item["p95_ms"], reverse=True)
+        return report[:limit]
+
+
+latency_tracker = EndpointLatencyTracker(settings.SLOW_ENDPOINT_WINDOW)
+
+
+def _route_name(scope) -> str:
+    # Route templates keep the label set bounded; unknown paths share one bucket
+    path = getattr(scope.get("route"), "path", None) or "<unmatched>"
+    return f"{scope.get('method')} {path}"
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: latency tracking plus opt-in per-request profiling"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _wants_profile(self, scope) -> bool:
+        if not settings.PROFILING_ENABLED or not settings.PROFILING_TOKEN:
+            return False
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER.encode():
+                return hmac.compare_digest(value.decode("latin-1"), settings.PROFILING_TOKEN)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profiler = None
+        profile_id = None
+        if self._wants_profile(scope):
+            profiler = RequestProfiler()
+            if profiler.start():
+                profile_id = uuid.uuid4().hex
+            else:
+                profiler = None
+
+        async def send_with_profile_id(message):
+            if profile_id and message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            latency_tracker.record(_route_name(scope), duration_ms)
+            if profiler is not None:
+                report = profiler.stop()
+                profile_store.add(profile_id, scope["method"], scope["path"], duration_ms, profiler.engine, report)
+                logger.info(f"Captured {profiler.engine} profile {profile_id} for {scope['method']} {scope['path']}")
+
+
+# Slow-callback watchdog ------------------------------------------------------
+
+class LoopWatchdog:
+    """Logs the loop thread's stack whenever a callback blocks past the threshold"""
+
+    def __init__(self, threshold_ms: float):
+        self.threshold = threshold_ms / 1000
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _beat(self):
+        self._last_beat = time.monotonic()
+        self._handle = self._loop.call_later(self.threshold / 4, self._beat)
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._last_beat
+            stalled = time.monotonic() - beat
+            if stalled < self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat  # One report per stall
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<unavailable>"
+            slow_callbacks_counter.inc()
+            logger.warning(f"Event loop blocked for at least {stalled * 1000:.0f} ms, loop thread stack:\n{stack}")
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._beat()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        if self._handle is not None:
+            self._handle.cancel()
+        self._thread.join(timeout=1)
+        self._thread = None
+
+
+loop_watchdog = LoopWatchdog(settings.SLOW_CALLBACK_THRESHOLD_MS)
@@ -0,0 +1,196 @@
+"""
+Bulk student provisioning from host-uploaded rosters.
+
+A roster is validated row by row (a bad row is reported, not fatal), checked
+against existing usernames with one ``$in`` query, hashed on a thread pool
+(bcrypt releases the GIL, so hashes run in parallel across cores) and written
+with one unordered ``insert_many``. Every row gets its own result.
+
+Roster passwords are hashed at the normal policy cost. Throughput comes from
+the pool alone: a roster never stores a weaker hash that only gets upgraded if
+the student happens to log in.
+
+A large roster still takes minutes of hashing, so the upload only starts a
+background job (``app.jobs``); the per-row report is stored on the job and
+read back from the status endpoint by any worker. Passwords stay in the
+running task's memory and are never written to the job.
+"""
+
+import asyncio
+import csv
+import io
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.schemas import RosterEntry, UserRole
+from app.auth import pwd_context, is_strong_password, sanitize_username
+from app.db import get_users_collection
+from app.metrics import metrics
+from app.jobs import start_job, finish_job, get_job
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+provisioned_users = metrics.counter("provisioned_users_total", "Roster rows by provisioning result")
+provisioning_ms = metrics.summary("provisioning_ms", "Time to provision one roster")
+
+_hash_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_hash_pool() -> ThreadPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        workers = settings.PROVISIONING_HASH_WORKERS or os.cpu_count() or 1
+        _hash_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+    return _hash_pool
+
+
+def hash_queue_depth() -> int:
+    """bcrypt jobs waiting for a hash thread"""
+    return _hash_pool._work_queue.qsize() if _hash_pool is not None else 0
+
+
+async def hash_passwords(passwords: List[str]) -> List[str]:
+    """bcrypt hashes computed in parallel on the hash pool"""
+    loop = asyncio.get_running_loop()
+    pool = _get_hash_pool()
+    return await asyncio.gather(*(loop.run_in_executor(pool, pwd_context.hash, password)
+                                  for password in passwords))
+
+
+def parse_csv_roster(text: str) -> List[RosterEntry]:
+    """Roster from CSV with ``username`` and ``password`` header columns"""
+    reader = csv.reader(io.StringIO(text))
+    header = [name.strip().lower() for name in next(reader, [])]
+    if "username" not in header or "password" not in header:
+        raise ValueError("CSV roster needs 'username' and 'password' columns")
+    username_column = header.index("username")
+    password_column = header.index("password")
+    return [
+        RosterEntry(username=row[username_column], password=row[password_column])
+        for row in reader
+        if len(row) > max(username_column, password_column)
+    ]
+
+
+def _validate(entry: RosterEntry) -> List[str]:
+    errors = []
+    username = sanitize_username(entry.username)
+    if not 3 <= len(username) <= 50:
+        errors.append("Username must be 3-50 characters long")
+    errors.extend(is_strong_password(entry.password)[1])
+    return errors
+
+
+async def provision_students(entries: List[RosterEntry], created_by: str) -> dict:
+    """Create student accounts for a roster and report a result per row"""
+    start = time.perf_counter()
+    results: List[dict] = []
+    pending: List[dict] = []  # rows that passed validation and are not duplicates in the roster
+    seen = set()
+
+    for row, entry in enumerate(entries, start=1):
+        username = sanitize_username(entry.username)
+        result = {"row": row, "username": username}
+        results.append(result)
+        errors = _validate(entry)
+        if errors:
+            result.update(status="invalid", error="; ".join(errors))
+        elif username in seen:
+            result.update(status="duplicate", error="Username appears earlier in the roster")
+        else:
+            seen.add(username)
+            pending.append({"result": result, "password": entry.password})
+
+    users_collection = await get_users_collection()
+    if pending:
+        existing = {
+            user["username"]
+            async for user in users_collection.find(
+                {"username": {"$in": [item["result"]["username"] for item in pending]}},
+                projection={"_id": 0, "username": 1},
+            )
+        }
+        for item in pending:
+            if item["result"]["username"] in existing:
+                item["result"].update(status="exists", error="Username already taken")
+        pending = [item for item in pending if "status" not in item["result"]]
+
+    if pending:
+        hashes = await hash_passwords([item["password"] for item in pending])
+        now = datetime.utcnow()
+        documents = []
+        for item, password_hash in zip(pending, hashes):
+            documents.append({
+                "_id": str(ObjectId()),
+                "username": item["result"]["username"],
+                "password_hashed": password_hash,
+                "role": UserRole.STUDENT.value,
+                "provisioned_by": created_by,
+                "created_at": now,
+                "updated_at": now,
+            })
+
+        failed = {}
+        try:
+            await users_collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed[error["index"]] = error
+        for index, (item, document) in enumerate(zip(pending, documents)):
+            error = failed.get(index)
+            if error is None:
+                item["result"].update(status="created", user_id=document["_id"])
+            elif error.get("code") == DUPLICATE_KEY:
+                # Registered between the $in check and the insert
+                item["result"].update(status="exists", error="Username already taken")
+            else:
+                item["result"].update(status="failed", error=error.get("errmsg", "Insert failed"))
+
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    for result_status, count in summary.items():
+        provisioned_users.inc(count, result=result_status)
+    provisioning_ms.observe((time.perf_counter() - start) * 1000)
+
+    logger.info(f"Provisioned roster of {len(entries)} rows for host {created_by}: {summary}")
+    return {"total": len(entries), "created": summary.get("created", 0), "summary": summary, "results": results}
+
+
+# Background jobs -----------------------------------------------------------
+
+async def create_provisioning_job(rows: int, created_by: str) -> dict:
+    job_id = str(uuid.uuid4())
+    return await start_job(job_id, "provisioning", {
+        "job_id": job_id,
+        "rows": rows,
+        "created_by": created_by,
+    })
+
+
+async def run_provisioning_job(job: dict, entries: List[RosterEntry]):
+    """Provision a roster and store its per-row report on the job"""
+    try:
+        report = await provision_students(entries, job["created_by"])
+        await finish_job(job["job_id"], {"report": report})
+    except asyncio.CancelledError:
+        await finish_job(job["job_id"], {"error": "Interrupted by worker shutdown"}, failed=True)
+        raise
+    except Exception as e:
+        logger.error(f"Provisioning job {job['job_id']} failed: {e}")
+        await finish_job(job["job_id"], {"error": str(e)}, failed=True)
+
+
+async def get_provisioning_job(job_id: str) -> Optional[dict]:
+    return await get_job(job_id)
@@ -0,0 +1,273 @@
+"""
+Document reconstruction from Monaco change events.
+
+``SessionEventData.changes`` holds Monaco ``IModelContentChange`` deltas::
+
+    {"rangeOffset": 120, "rangeLength": 3, "text": "foo", "range": {...}}
+
+Reapplying them to a Python string copies the whole document per edit. The
+``ChunkedRope`` keeps the text as a list of bounded chunks, so an edit only
+touches the chunks it overlaps. ``DocumentTimeline`` applies a session's
+changes in bulk, records periodic checkpoints, and answers "what did the code
+look like at time t" by replaying from the nearest checkpoint.
+
+A session's events come from three places: raw ``events`` documents,
+``event_chunks`` written when a completed session is compacted (BSON arrays
+of events, zstd-compressed), and the on-disk archive of both.
+"""
+
+import asyncio
+import bisect
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import bson
+import zstandard
+
+from app.core.config import settings
+from app.archive import load_archived_session
+from app.db import get_events_collection, get_event_chunks_collection
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024
+EVENT_CHUNK_CODEC = "bson+zstd"
+
+
+class ChunkedRope:
+    """Flat rope: a list of string chunks of at most 2 * CHUNK_SIZE characters"""
+
+    __slots__ = ("chunks", "lengths", "length", "_hint_index", "_hint_start")
+
+    def __init__(self, text: str = ""):
+        self.chunks: List[str] = [text[i:i + CHUNK_SIZE] for i in range(0, len(text), CHUNK_SIZE)] or [""]
+        self.lengths: List[int] = [len(chunk) for chunk in self.chunks]
+        self.length = len(text)
+        # Edits cluster around the cursor, so lookups start from the last chunk touched
+        self._hint_index = 0
+        self._hint_start = 0
+
+    def _locate(self, offset: int) -> Tuple[int, int]:
+        """Return (chunk index, offset inside the chunk) for a document offset"""
+        lengths = self.lengths
+        index = min(self._hint_index, len(lengths) - 1)
+        start = self._hint_start if index == self._hint_index else sum(lengths[:index])
+
+        while offset < start and index > 0:
+            index -= 1
+            start -= lengths[index]
+        last = len(lengths) - 1
+        while offset > start + lengths[index] and index < last:
+            start += lengths[index]
+            index += 1
+
+        self._hint_index = index
+        self._hint_start = start
+        return index, min(offset - start, lengths[index])
+
+    def replace(self, offset: int, length: int, text: str):
+        """Replace ``length`` characters at ``offset`` with ``text``"""
+        offset = min(max(offset, 0), self.length)
+        length = min(max(length, 0), self.length - offset)
+
+        index, inner = self._locate(offset)
+        chunks, lengths = self.chunks, self.lengths
+
+        # Merge the chunks covered by the deleted range into the first one
+        remaining = length - (lengths[index] - inner)
+        last = index
+        while remaining > 0 and last + 1 < len(chunks):
+            last += 1
+            remaining -= lengths[last]
+        if last != index:
+            chunks[index] = "".join(chunks[index:last + 1])
+            del chunks[index + 1:last + 1]
+            del lengths[index + 1:last + 1]
+
+        chunk = chunks[index]
+        chunk = chunk[:inner] + text + chunk[inner + length:]
+        self.length += len(text) - length
+
+        if len(chunk) > 2 * CHUNK_SIZE:
+            pieces = [chunk[i:i + CHUNK_SIZE] for i in range(0, len(chunk), CHUNK_SIZE)]
+            chunks[index:index + 1] = pieces
+            lengths[index:index + 1] = [len(piece) for piece in pieces]
+        elif not chunk and len(chunks) > 1:
+            del chunks[index]
+            del lengths[index]
+        elif (len(chunk) < CHUNK_SIZE // 4 and index + 1 < len(chunks)
+              and len(chunk) + lengths[index + 1] <= 2 * CHUNK_SIZE):
+            # Fold small chunks into their neighbour to keep the chunk count low
+            chunks[index:index + 2] = [chunk + chunks[index + 1]]
+            lengths[index:index + 2] = [len(chunks[index])]
+        else:
+            chunks[index] = chunk
+            lengths[index] = len(chunk)
+
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+    def __len__(self) -> int:
+        return self.length
+
+
+def iter_changes(changes: Optional[List[dict]]) -> Iterable[Tuple[int, int, str]]:
+    """Yield (offset, length, text) for one Monaco event, in applicable order
+
+    Changes within one event are all relative to the pre-event document and do
+    not overlap, so applying them from the highest offset down is safe.
+    """
+    if not changes:
+        return ()
+    parsed = []
+    for change in changes:
+        offset = change.get("rangeOffset")
+        if offset is None:
+            continue
+        parsed.append((offset, change.get("rangeLength") or 0, change.get("text") or ""))
+    if len(parsed) > 1:
+        parsed.sort(key=lambda item: item[0], reverse=True)
+    return parsed
+
+
+class DocumentTimeline:
+    """Applies a session's edits in timestamp order with periodic checkpoints"""
+
+    def __init__(self, initial_text: str = "", checkpoint_interval: Optional[int] = None):
+        self.checkpoint_interval = checkpoint_interval or settings.RECONSTRUCTION_CHECKPOINT_INTERVAL
+        self.rope = ChunkedRope(initial_text)
+        # Parallel arrays: (timestamp, text) checkpoints and the edit log
+        self.checkpoint_times: List[int] = [-1]
+        self.checkpoints: List[str] = [initial_text]
+        self.checkpoint_positions: List[int] = [0]
+        self.edit_times: List[int] = []
+        self.edits: List[Tuple[int, int, str]] = []
+
+    @property
+    def last_timestamp(self) -> int:
+        return self.edit_times[-1] if self.edit_times else -1
+
+    def apply_event(self, timestamp: int, changes: Optional[List[dict]]):
+        """Apply one event's changes; events must arrive in timestamp order"""
+        if timestamp < self.last_timestamp:
+            raise ValueError("Events must be applied in timestamp order")
+        for offset, length, text in iter_changes(changes):
+            self.rope.replace(offset, length, text)
+            self.edit_times.append(timestamp)
+            self.edits.append((offset, length, text))
+            if len(self.edits) - self.checkpoint_positions[-1] >= self.checkpoint_interval:
+                self.checkpoint_times.append(timestamp)
+                self.checkpoints.append(self.rope.text())
+                self.checkpoint_positions.append(len(self.edits))
+
+    def apply_events(self, events: Iterable[dict]):
+        """Bulk-apply events shaped like documents in the events collection"""
+        for event in events:
+            data = event.get("data") or {}
+            changes = data.get("changes")
+            if changes:
+                self.apply_event(event.get("timestamp", event.get("t", 0)), changes)
+
+    def text(self) -> str:
+        """Current (latest) document text"""
+        return self.rope.text()
+
+    def text_at(self, timestamp: int) -> str:
+        """Document text after every edit with a timestamp <= ``timestamp``"""
+        end = bisect.bisect_right(self.edit_times, timestamp)
+        # Latest checkpoint that does not include edits past ``end``
+        index = bisect.bisect_right(self.checkpoint_positions, end) - 1
+        start = self.checkpoint_positions[index]
+        if end == len(self.edits):
+            return self.rope.text()
+
+        rope = ChunkedRope(self.checkpoints[index])
+        for offset, length, text in self.edits[start:end]:
+            rope.replace(offset, length, text)
+        return rope.text()
+
+
+def rebuild_naive(events: Iterable[dict], initial_text: str = "") -> str:
+    """Reference implementation using plain string slicing"""
+    text = initial_text
+    for event in events:
+        data = event.get("data") or {}
+        for offset, length, inserted in iter_changes(data.get("changes")):
+            text = text[:offset] + inserted + text[offset + length:]
+    return text
+
+
+def encode_event_chunk(events: List[dict], level: Optional[int] = None) -> bytes:
+    """Compress a run of event documents for ``event_chunks``"""
+    compressor = zstandard.ZstdCompressor(level=level or settings.COMPACTION_COMPRESSION_LEVEL)
+    return compressor.compress(bson.encode({"events": events}))
+
+
+def decode_event_chunk(data: bytes) -> List[dict]:
+    return bson.decode(zstandard.ZstdDecompressor().decompress(data))["events"]
+
+
+def build_timeline(live: List[dict], chunks: Iterable[bytes], archived: List[dict]) -> DocumentTimeline:
+    """Merge a session's event sources and replay them (CPU-bound, runs in a thread)"""
+    events = list(live)
+    seen = {event["_id"] for event in events}
+    stored = [event for data in chunks for event in decode_event_chunk(data)] + archived
+    for event in stored:
+        if event.get("_id") not in seen and (event.get("data") or {}).get("changes"):
+            seen.add(event.get("_id"))
+            events.append(event)
+    # Same order as compaction: timestamp, then _id for events stored in the same millisecond
+    events.sort(key=lambda event: (event.get("timestamp", 0), str(event.get("_id", ""))))
+
+    timeline = DocumentTimeline()
+    timeline.apply_events(events)
+    return timeline
+
+
+async def load_session_timelines(owners: Dict[str, str]) -> Dict[str, DocumentTimeline]:
+    """Timelines for many sessions (session_id -> owner's user_id) with one query per collection"""
+    if not owners:
+        return {}
+    session_ids = list(owners)
+    user_ids = list(set(owners.values()))
+    live: Dict[str, List[dict]] = {session_id: [] for session_id in session_ids}
+    chunks: Dict[str, Dict[str, bytes]] = {session_id: {} for session_id in session_ids}
+
+    events_collection = await get_events_collection()
+    cursor = events_collection.find(
+        {"session_id": {"$in": session_ids}, "user_id": {"$in": user_ids}, "data.changes": {"$exists": True}},
+        projection={"session_id": 1, "user_id": 1, "timestamp": 1, "data.changes": 1},
+    ).sort([("timestamp", 1), ("_id", 1)])
+    async for event in cursor:
+        if event.get("user_id") == owners[event["session_id"]]:
+            live[event["session_id"]].append(event)
+
+    # Compacted events are gone from ``events``; chunks expire with the raw events' TTL, so
+    # older ones are only in the archive (which may also still hold live chunks and events)
+    chunks_collection = await get_event_chunks_collection()
+    cursor = chunks_collection.find(
+        {"session_id": {"$in": session_ids}, "user_id": {"$in": user_ids}},
+        projection={"session_id": 1, "user_id": 1, "data": 1},
+    )
+    async for chunk in cursor:
+        if chunk.get("user_id") == owners[chunk["session_id"]]:
+            chunks[chunk["session_id"]][chunk["_id"]] = chunk["data"]
+
+    archived: Dict[str, List[dict]] = {}
+    for session_id, user_id in owners.items():
+        for chunk in await load_archived_session(session_id, "event_chunks"):
+            if chunk.get("user_id") == user_id:
+                chunks[session_id].setdefault(chunk["_id"], chunk["data"])
+        archived[session_id] = [
+            event for event in await load_archived_session(session_id) if event.get("user_id") == user_id
+        ]
+
+    return await asyncio.to_thread(lambda: {
+        session_id: build_timeline(live[session_id], chunks[session_id].values(), archived[session_id])
+        for session_id in session_ids
+    })
+
+
+async def load_session_timeline(session_id: str, user_id: str) -> DocumentTimeline:
+    """Build the timeline for a user's session from live, compacted and archived events"""
+    return (await load_session_timelines({session_id: user_id}))[session_id]
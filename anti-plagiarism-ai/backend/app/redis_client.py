@@ -0,0 +1,225 @@
+"""
+Shared Redis client for every Redis user in a worker.
+
+One connection pool per worker, opened in the app's lifespan. Commands go
+through ``redis_client.execute(...)``, which auto-pipelines: commands issued
+concurrently (in the same event-loop tick) are queued and sent as one
+non-transactional pipeline, so N concurrent callers cost one round-trip
+instead of N. Up to ``REDIS_PIPELINE_MAX`` commands share a pipeline.
+
+A circuit breaker guards the pool. ``REDIS_BREAKER_THRESHOLD`` consecutive
+failed or slow (over ``REDIS_SLOW_MS``) round-trips open it. A round-trip's
+wall time includes any event-loop stall while the reply sat unread, so the
+current loop lag (``loop_lag_monitor``) is subtracted before comparing: a
+busy worker must not blame Redis and switch every caller to its fallback. While it is open,
+``execute`` raises ``RedisUnavailable`` at once instead of waiting on a
+socket timeout, and callers use their in-process fallback (the dedupe
+window, the local analysis-cache LRU). After ``REDIS_BREAKER_RESET`` seconds
+one probe round-trip is let through and closes the circuit again if it
+succeeds.
+
+Callers catch ``RedisError`` (``RedisUnavailable`` is one) and report the
+fallback with ``redis_client.fallback(caller, error)``.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from app.core.config import settings, get_redis_url
+from app.metrics import metrics
+from app.admission import loop_lag_monitor
+
+logger = logging.getLogger(__name__)
+
+redis_commands = metrics.counter("redis_commands_total", "Redis commands by command and outcome")
+redis_roundtrip_ms = metrics.summary("redis_roundtrip_ms", "Latency of one pipelined Redis round-trip")
+redis_pipeline_size = metrics.summary("redis_pipeline_commands", "Commands sent per Redis round-trip")
+redis_circuit_open = metrics.gauge("redis_circuit_open", "1 while the Redis circuit breaker is open")
+redis_fallbacks = metrics.counter("redis_fallbacks_total", "Calls served by an in-process fallback")
+
+
+class RedisUnavailable(RedisError):
+    """Redis is down, slow, or the circuit is open"""
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        # Commands queue into the probe round-trip until it is sent
+        return self.state == self.HALF_OPEN and not self._probing
+
+    def begin_round_trip(self):
+        if self.state == self.HALF_OPEN:
+            self._probing = True  # Only one probe in flight
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("Redis circuit closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+        redis_circuit_open.set(0)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            self.trip()
+
+    def trip(self):
+        if self.state != self.OPEN:
+            logger.warning(f"Redis circuit opened after {self.failures} failures; using in-process fallbacks")
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self._probing = False
+        redis_circuit_open.set(1)
+
+
+class RedisClient:
+    def __init__(self):
+        self.breaker = CircuitBreaker(settings.REDIS_BREAKER_THRESHOLD, settings.REDIS_BREAKER_RESET)
+        self._client: Optional[aioredis.Redis] = None
+        self._pending: List[Tuple[tuple, asyncio.Future]] = []
+        self._flush_scheduled = False
+        self._flushes = set()
+        self.last_error: Optional[str] = None
+
+    def _get_client(self) -> aioredis.Redis:
+        if self._client is None:
+            pool = aioredis.ConnectionPool.from_url(
+                get_redis_url(),
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                decode_responses=True,
+            )
+            self._client = aioredis.Redis(connection_pool=pool)
+        return self._client
+
+    async def connect(self, client: Optional[aioredis.Redis] = None):
+        """Open the pool (or adopt ``client``, e.g. a fake in benchmarks) and check Redis is reachable"""
+        if client is not None:
+            self._client = client
+        try:
+            await asyncio.wait_for(self._get_client().ping(), settings.REDIS_SOCKET_TIMEOUT)
+            self.breaker.record_success()
+            logger.info("Connected to Redis")
+        except Exception as e:
+            # Start degraded rather than fail startup; the breaker probes again later
+            self.last_error = str(e)
+            self.breaker.trip()
+            logger.warning(f"Redis unavailable at startup: {e}")
+
+    async def close(self):
+        for task in list(self._flushes):
+            await asyncio.gather(task, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose(close_connection_pool=True)
+            self._client = None
+
+    async def execute(self, *args) -> Any:
+        """Run one command, batched with any other commands issued in the same loop tick"""
+        if not self.breaker.allow():
+            redis_commands.inc(command=str(args[0]).upper(), outcome="rejected")
+            raise RedisUnavailable("Redis circuit is open")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((args, future))
+        if len(self._pending) >= settings.REDIS_PIPELINE_MAX:
+            self._start_flush()
+        elif not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._start_flush)
+        return await future
+
+    def _start_flush(self):
+        self._flush_scheduled = False
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self.breaker.begin_round_trip()
+        task = asyncio.create_task(self._flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[tuple, asyncio.Future]]):
+        started = time.perf_counter()
+        try:
+            async with self._get_client().pipeline(transaction=False) as pipe:
+                for args, _ in batch:
+                    pipe.execute_command(*args)
+                results = await asyncio.wait_for(
+                    pipe.execute(raise_on_error=False), settings.REDIS_SOCKET_TIMEOUT
+                )
+        except Exception as e:
+            self.last_error = str(e)
+            self.breaker.record_failure()
+            error = RedisUnavailable(f"Redis round-trip failed: {e}")
+            for args, future in batch:
+                redis_commands.inc(command=str(args[0]).upper(), outcome="error")
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        redis_roundtrip_ms.observe(elapsed_ms)
+        redis_pipeline_size.observe(len(batch))
+        redis_ms = elapsed_ms - loop_lag_monitor.current_lag_ms()
+        if redis_ms > settings.REDIS_SLOW_MS:
+            self.last_error = f"slow round-trip ({redis_ms:.0f} ms excluding loop lag)"
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+        for (args, future), result in zip(batch, results):
+            failed = isinstance(result, Exception)
+            redis_commands.inc(command=str(args[0]).upper(), outcome="error" if failed else "ok")
+            if future.done():
+                continue  # Caller was cancelled
+            if failed:
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def fallback(self, caller: str, error: Exception):
+        """Record that ``caller`` answered from its in-process fallback"""
+        redis_fallbacks.inc(caller=caller)
+        if not isinstance(error, RedisUnavailable) or self.breaker.state == CircuitBreaker.CLOSED:
+            logger.warning(f"{caller}: Redis call failed, using in-process fallback: {error}")
+
+    def stats(self) -> dict:
+        pool = self._client.connection_pool if self._client is not None else None
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "pending_commands": len(self._pending),
+            "last_error": self.last_error,
+            "pool": {
+                "max_connections": getattr(pool, "max_connections", None),
+                "in_use": len(getattr(pool, "_in_use_connections", ())),
+                "idle": len(getattr(pool, "_available_connections", ())),
+            } if pool is not None else None,
+        }
+
+
+# Global Redis client (one pool per worker)
+redis_client = RedisClient()
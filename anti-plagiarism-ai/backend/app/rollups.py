@@ -0,0 +1,164 @@
+"""
+Multi-resolution activity rollups for host dashboards.
+
+Every ingested batch is folded into in-memory counters per
+``(session, resolution, bucket)`` at 1s, 10s and 60s resolution: events by
+``EventType`` plus pasted characters. A background task flushes the counters
+every ``ROLLUP_FLUSH_INTERVAL`` seconds as one unordered ``bulk_write`` of
+``$inc`` upserts into the ``rollups`` collection, so a busy session costs a
+handful of updates per flush instead of one write per batch.
+
+Finer resolutions are kept for less time (``expire_at`` + TTL index), and
+``query_activity`` picks the finest resolution that keeps a chart under
+``ROLLUP_MAX_POINTS`` points, so dashboards never read raw events.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.schemas import EventType, SessionEventBatch
+from app.db import get_rollups_collection
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Resolution (seconds) -> retention (seconds)
+RESOLUTIONS: Dict[int, int] = {
+    1: 86400,  # 1 day
+    10: 604800,  # 7 days
+    60: 2592000,  # 30 days
+}
+
+rollup_updates = metrics.counter("rollup_updates_total", "Rollup bucket upserts written")
+rollup_flush_ms = metrics.summary("rollup_flush_ms", "Time to flush pending rollup buckets")
+rollup_pending = metrics.gauge("rollup_pending_buckets", "Rollup buckets waiting for the next flush")
+
+BucketKey = Tuple[str, int, int]  # (session_id, resolution, bucket start ms)
+
+
+class RollupBuffer:
+    def __init__(self):
+        self._pending: Dict[BucketKey, dict] = {}
+        self._lock = asyncio.Lock()
+
+    def add_batch(self, batch: SessionEventBatch, user_id: str):
+        """Fold a batch's events into the pending buckets (no I/O)"""
+        for resolution in RESOLUTIONS:
+            width = resolution * 1000
+            for event in batch.events:
+                bucket = event.t - event.t % width
+                key = (batch.session_id, resolution, bucket)
+                entry = self._pending.get(key)
+                if entry is None:
+                    entry = self._pending[key] = {
+                        "user_id": user_id,
+                        "contest_id": batch.contest_id,
+                        "counts": {},
+                    }
+                counts = entry["counts"]
+                event_type = event.type.value
+                counts[event_type] = counts.get(event_type, 0) + 1
+                if event.type == EventType.PASTE and event.data and event.data.content:
+                    counts["paste_chars"] = counts.get("paste_chars", 0) + len(event.data.content)
+        rollup_pending.set(len(self._pending))
+
+    async def flush(self):
+        """Write pending buckets with one bulk_write of $inc upserts"""
+        async with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            rollup_pending.set(0)
+
+            now = datetime.utcnow()
+            operations = []
+            for (session_id, resolution, bucket), entry in pending.items():
+                bucket_at = datetime.utcfromtimestamp(bucket / 1000)
+                operations.append(UpdateOne(
+                    {"session_id": session_id, "user_id": entry["user_id"], "resolution": resolution, "bucket": bucket},
+                    {
+                        "$inc": {f"counts.{name}": value for name, value in entry["counts"].items()},
+                        "$setOnInsert": {
+                            "contest_id": entry["contest_id"],
+                            "expire_at": bucket_at + timedelta(seconds=RESOLUTIONS[resolution]),
+                        },
+                        "$set": {"updated_at": now},
+                    },
+                    upsert=True,
+                ))
+
+            keys = list(pending)
+            start = time.perf_counter()
+            try:
+                rollups_collection = await get_rollups_collection()
+                await rollups_collection.bulk_write(operations, ordered=False)
+                rollup_updates.inc(len(operations))
+            except BulkWriteError as e:
+                failed = [keys[error["index"]] for error in e.details.get("writeErrors", [])]
+                logger.error(f"Rollup flush: {len(failed)} of {len(operations)} bucket updates failed")
+                self._requeue(pending, failed)
+            except Exception as e:
+                logger.error(f"Rollup flush failed ({len(operations)} buckets): {e}")
+                self._requeue(pending, keys)
+            finally:
+                rollup_flush_ms.observe((time.perf_counter() - start) * 1000)
+
+    def _requeue(self, pending: Dict[BucketKey, dict], keys: List[BucketKey]):
+        """Put unwritten counts back so the next flush retries them"""
+        for key in keys:
+            entry = pending[key]
+            current = self._pending.setdefault(key, {**entry, "counts": {}})
+            for name, value in entry["counts"].items():
+                current["counts"][name] = current["counts"].get(name, 0) + value
+        rollup_pending.set(len(self._pending))
+
+
+def pick_resolution(start_ms: int, end_ms: int) -> int:
+    """Finest resolution that keeps the range within ROLLUP_MAX_POINTS buckets"""
+    span = max(end_ms - start_ms, 1)
+    for resolution in sorted(RESOLUTIONS):
+        if span / (resolution * 1000) <= settings.ROLLUP_MAX_POINTS:
+            return resolution
+    return max(RESOLUTIONS)
+
+
+async def query_activity(session_id: str, user_id: str, start_ms: int, end_ms: int,
+                         resolution: Optional[int] = None) -> dict:
+    """Rollup buckets for a user's session between start_ms and end_ms"""
+    resolution = resolution or pick_resolution(start_ms, end_ms)
+    rollups_collection = await get_rollups_collection()
+    cursor = rollups_collection.find(
+        {
+            "session_id": session_id,
+            "user_id": user_id,
+            "resolution": resolution,
+            "bucket": {"$gte": start_ms - start_ms % (resolution * 1000), "$lt": end_ms},
+        },
+        projection={"_id": 0, "bucket": 1, "counts": 1},
+    ).sort("bucket", 1)
+    buckets: List[dict] = [{"t": doc["bucket"], **doc.get("counts", {})} async for doc in cursor]
+    return {
+        "session_id": session_id,
+        "resolution": resolution,
+        "start": start_ms,
+        "end": end_ms,
+        "buckets": buckets,
+    }
+
+
+async def rollup_flusher():
+    """Flush pending rollup buckets forever at ROLLUP_FLUSH_INTERVAL"""
+    while True:
+        await asyncio.sleep(settings.ROLLUP_FLUSH_INTERVAL)
+        await rollup_buffer.flush()
+
+
+# Global rollup buffer
+rollup_buffer = RollupBuffer()
@@ -0,0 +1,117 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.responses import PlainTextResponse
+import asyncio
+import logging
+
+from app.schemas import APIResponse
+from app.auth import get_current_host
+from app.profiling import profile_store, latency_tracker
+from app.core.config import settings
+from app.corpus import corpus_index, sync_corpus as sync_corpus_dir
+from app.websocket_manager import manager
+from app.redis_client import redis_client
+from app.leader import get_leases, WORKER_ID
+from app.db import INDEXES
+from app.index_audit import audit_indexes, query_shapes
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+@router.get("/profiles", response_model=APIResponse)
+async def list_profiles(current_user: dict = Depends(get_current_host)):
+    """List captured request profiles (newest first)"""
+    return APIResponse(data=profile_store.list())
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str, current_user: dict = Depends(get_current_host)):
+    """Get the text report of a captured request profile"""
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+    return profile["report"]
+
+@router.get("/slow-endpoints", response_model=APIResponse)
+async def get_slow_endpoints(
+    limit: int = Query(default=10, ge=1, le=100),
+    current_user: dict = Depends(get_current_host)
+):
+    """Slowest endpoints by p95 latency over the rolling window"""
+    return APIResponse(data=latency_tracker.top(limit))
+
+@router.get("/corpus", response_model=APIResponse)
+async def get_corpus_stats(current_user: dict = Depends(get_current_host)):
+    """Known-solutions corpus index statistics"""
+    return APIResponse(data=corpus_index.stats())
+
+@router.post("/corpus/sync", response_model=APIResponse)
+async def sync_corpus(current_user: dict = Depends(get_current_host)):
+    """Index new or changed corpus files now; every worker reloads the shared index within seconds"""
+    if not settings.CORPUS_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Corpus matching is disabled"
+        )
+    try:
+        summary = await asyncio.to_thread(sync_corpus_dir)
+        logger.info(f"Corpus synced by {current_user['username']}: {summary}")
+        return APIResponse(message="Corpus synced", data=summary)
+    except Exception as e:
+        logger.error(f"Corpus sync error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to sync corpus"
+        )
+
+@router.get("/ws/queues", response_model=APIResponse)
+async def get_ws_queues(
+    limit: int = Query(default=50, ge=1, le=1000),
+    current_user: dict = Depends(get_current_host)
+):
+    """Outbound WebSocket queue depth per connection, deepest first"""
+    return APIResponse(data=manager.queue_stats()[:limit])
+
+@router.get("/redis", response_model=APIResponse)
+async def get_redis_status(current_user: dict = Depends(get_current_host)):
+    """Shared Redis pool usage and circuit-breaker state in this worker"""
+    return APIResponse(data=redis_client.stats())
+
+@router.get("/leases", response_model=APIResponse)
+async def list_leases(current_user: dict = Depends(get_current_host)):
+    """Which worker holds each cluster-wide job's lease"""
+    try:
+        return APIResponse(data={"worker_id": WORKER_ID, "leases": await get_leases()})
+    except Exception as e:
+        logger.error(f"Lease listing error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to list leases"
+        )
+
+@router.get("/indexes", response_model=APIResponse)
+async def get_index_audit(
+    collection: str = Query(default=None),
+    current_user: dict = Depends(get_current_host)
+):
+    """Index usage, prefix-redundant and unused indexes, and each index's share of insert cost"""
+    if collection is not None and collection not in INDEXES:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Unknown collection"
+        )
+    try:
+        reports = await audit_indexes(collection)
+        return APIResponse(data={
+            "shape_capture": settings.INDEX_AUDIT_ENABLED,
+            "shape_overflow": query_shapes.overflow,
+            "collections": reports,
+        })
+    except Exception as e:
+        logger.error(f"Index audit error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to audit indexes"
+        )
@@ -0,0 +1,241 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from typing import Optional
+import asyncio
+import logging
+import time
+
+from app.schemas import APIResponse, AnalysisType
+from app.auth import get_current_host
+from app.db import get_contests_collection, get_analytics_collection, get_sessions_collection
+from app.similarity import run_contest_similarity, start_similarity_job, get_similarity_job, JOB_SOURCE
+from app.keystroke import keystroke_tracker, JOB_SOURCE as KEYSTROKE_SOURCE
+from app.rollups import RESOLUTIONS, pick_resolution, query_activity
+from app.leaderboard import get_leaderboard
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/analysis", tags=["Analysis"])
+
+# Keep references so running jobs are not garbage collected
+_running_jobs = set()
+
+async def _get_owned_contest(contest_id: str, current_user: dict) -> dict:
+    contests_collection = await get_contests_collection()
+    contest = await contests_collection.find_one({"_id": contest_id})
+    if contest is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Contest not found"
+        )
+    if contest.get("created_by") != str(current_user["_id"]):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the contest host can run analysis for this contest"
+        )
+    return contest
+
+async def _get_owned_session(session_id: str, current_user: dict) -> dict:
+    sessions_collection = await get_sessions_collection()
+    session = await sessions_collection.find_one({"session_id": session_id})
+    if session is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
+    if not session.get("contest_id"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only contest sessions can be analyzed by a host"
+        )
+    await _get_owned_contest(session["contest_id"], current_user)
+    return session
+
+@router.post("/contests/{contest_id}/similarity", response_model=APIResponse, status_code=status.HTTP_202_ACCEPTED)
+async def start_contest_similarity(contest_id: str, current_user: dict = Depends(get_current_host)):
+    """Start the all-pairs similarity and collusion-cluster job for a contest"""
+    await _get_owned_contest(contest_id, current_user)
+
+    job = await start_similarity_job(contest_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A similarity job is already running for this contest"
+        )
+
+    task = asyncio.create_task(run_contest_similarity(contest_id))
+    _running_jobs.add(task)
+    task.add_done_callback(_running_jobs.discard)
+
+    logger.info(f"Similarity job started for contest {contest_id} by {current_user['username']}")
+    return APIResponse(message="Similarity job started", data=job)
+
+@router.get("/contests/{contest_id}/similarity", response_model=APIResponse)
+async def get_contest_similarity_status(contest_id: str, current_user: dict = Depends(get_current_host)):
+    """Status of the latest similarity job for a contest"""
+    await _get_owned_contest(contest_id, current_user)
+
+    job = await get_similarity_job(contest_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No similarity job has run for this contest"
+        )
+    return APIResponse(data=job)
+
+@router.get("/contests/{contest_id}/clusters", response_model=APIResponse)
+async def get_contest_clusters(contest_id: str, current_user: dict = Depends(get_current_host)):
+    """Stored collusion clusters for a contest, largest first"""
+    try:
+        await _get_owned_contest(contest_id, current_user)
+
+        analytics_collection = await get_analytics_collection()
+        cursor = analytics_collection.find(
+            {
+                "contest_id": contest_id,
+                "analysis_type": AnalysisType.PLAGIARISM_DETECTION.value,
+                "results.patterns.source": JOB_SOURCE,
+            },
+            projection={"session_id": 1, "user_id": 1, "results": 1},
+        )
+
+        clusters = {}
+        async for doc in cursor:
+            patterns = doc["results"]["patterns"]
+            cluster = clusters.setdefault(patterns["cluster_id"], {
+                "cluster_id": patterns["cluster_id"],
+                "size": patterns["cluster_size"],
+                "risk_level": doc["results"]["risk_level"],
+                "members": [],
+            })
+            cluster["members"].append({
+                "session_id": doc["session_id"],
+                "user_id": doc["user_id"],
+                "confidence_score": doc["results"]["confidence_score"],
+            })
+
+        return APIResponse(data=sorted(clusters.values(), key=lambda c: c["size"], reverse=True))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Get clusters error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve clusters"
+        )
+
+@router.get("/contests/{contest_id}/leaderboard", response_model=APIResponse)
+async def get_contest_leaderboard(
+    contest_id: str,
+    limit: int = Query(100, ge=1, le=1000),
+    skip: int = Query(0, ge=0),
+    current_user: dict = Depends(get_current_host)
+):
+    """Sessions sorted by risk rank, then confidence score (live updates: /ws/contests/{id}/leaderboard)"""
+    try:
+        await _get_owned_contest(contest_id, current_user)
+        return APIResponse(data=await get_leaderboard(contest_id, limit=limit, skip=skip))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Get leaderboard error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve leaderboard"
+        )
+
+@router.get("/sessions/{session_id}/keystroke", response_model=APIResponse)
+async def get_session_keystroke(session_id: str, current_user: dict = Depends(get_current_host)):
+    """Live keystroke-dynamics state and the latest stored impersonation score"""
+    try:
+        await _get_owned_session(session_id, current_user)
+
+        analytics_collection = await get_analytics_collection()
+        stored = await analytics_collection.find_one(
+            {
+                "session_id": session_id,
+                "analysis_type": AnalysisType.TYPING_PATTERN.value,
+                "results.patterns.source": KEYSTROKE_SOURCE,
+            },
+            projection={"_id": 0, "results": 1, "processed_at": 1},
+        )
+        return APIResponse(data={
+            "session_id": session_id,
+            "live": await keystroke_tracker.session_score(session_id),
+            "stored": stored,
+        })
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Get keystroke analysis error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve keystroke analysis"
+        )
+
+@router.get("/sessions/{session_id}/activity", response_model=APIResponse)
+async def get_session_activity(
+    session_id: str,
+    start: Optional[int] = Query(None, description="Range start (ms since epoch); defaults to one hour before end"),
+    end: Optional[int] = Query(None, description="Range end (ms since epoch); defaults to now"),
+    resolution: Optional[int] = Query(None, description="Bucket width in seconds (1, 10 or 60); picked from the range if omitted"),
+    current_user: dict = Depends(get_current_host)
+):
+    """Activity counts per time bucket (typing, pastes, focus changes) from rollups"""
+    try:
+        session = await _get_owned_session(session_id, current_user)
+
+        end = end if end is not None else int(time.time() * 1000)
+        start = start if start is not None else end - 3600 * 1000
+        if start >= end:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="start must be before end"
+            )
+        if resolution is not None and resolution not in RESOLUTIONS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"resolution must be one of {sorted(RESOLUTIONS)}"
+            )
+        resolution = resolution or pick_resolution(start, end)
+        if (end - start) / (resolution * 1000) > settings.ROLLUP_MAX_POINTS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Range spans more than {settings.ROLLUP_MAX_POINTS} buckets at {resolution}s resolution; "
+                       f"narrow the range or use a coarser resolution"
+            )
+
+        return APIResponse(data=await query_activity(session_id, session["user_id"], start, end, resolution))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Get session activity error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve session activity"
+        )
+
+@router.get("/sessions/{session_id}/compaction", response_model=APIResponse)
+async def get_session_compaction(session_id: str, current_user: dict = Depends(get_current_host)):
+    """Storage and index size of a completed session's events before and after compaction"""
+    try:
+        session = await _get_owned_session(session_id, current_user)
+        if not session.get("compaction"):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Session has not been compacted"
+            )
+        return APIResponse(data={"session_id": session_id, **session["compaction"]})
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Get compaction report error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve compaction report"
+        )
@@ -1,22 +1,30 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Request
+from fastapi import APIRouter, HTTPException, status, Depends, Request, UploadFile, File
 from datetime import datetime
+import asyncio
 import logging
 from bson import ObjectId
 
 from app.schemas import (
-    UserCreate, UserLogin, UserResponse, Token, APIResponse, ErrorResponse
+    UserCreate, UserLogin, UserResponse, Token, APIResponse, ErrorResponse, BulkUserCreate, RosterEntry
 )
 from app.auth import (
     get_password_hash, authenticate_user, create_user_token, 
     is_strong_password, sanitize_username, rate_limiter,
-    get_current_active_user
+    get_current_active_user, get_current_host
 )
 from app.db import get_users_collection
+from app.core.config import settings
+from app.provisioning import (
+    parse_csv_roster, create_provisioning_job, run_provisioning_job, get_provisioning_job
+)
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+# Keep references so running jobs are not garbage collected
+_running_jobs = set()
+
 @router.post("/register", response_model=Token, status_code=status.HTTP_201_CREATED)
 async def register_user(user_data: UserCreate, request: Request):
     """Register a new user"""
@@ -78,18 +86,88 @@ async def register_user(user_data: UserCreate, request: Request):
         # Create and return token
         token_response = create_user_token(user_doc)
         
-        logger.info(f"User registered successfully: {username} ({user_data.role.value})")
+        logger.info("User registered successfully: %s (%s)", username, user_data.role.value)
         return token_response
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Registration error: {e}")
+        logger.error("Registration error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error during registration"
         )
 
+async def _provision_roster(entries: list[RosterEntry], current_user: dict) -> APIResponse:
+    if not entries:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Roster is empty"
+        )
+    if len(entries) > settings.PROVISIONING_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Roster has {len(entries)} rows; the limit is {settings.PROVISIONING_MAX_ROWS}"
+        )
+    job = await create_provisioning_job(len(entries), str(current_user["_id"]))
+    task = asyncio.create_task(run_provisioning_job(job, entries))
+    _running_jobs.add(task)
+    task.add_done_callback(_running_jobs.discard)
+
+    logger.info(f"Provisioning job {job['job_id']} started for {len(entries)} rows by {current_user['username']}")
+    return APIResponse(message="Provisioning job started", data=job)
+
+@router.post("/register/bulk", response_model=APIResponse, status_code=status.HTTP_202_ACCEPTED)
+async def register_users_bulk(roster: BulkUserCreate, current_user: dict = Depends(get_current_host)):
+    """Start registering a roster of students (JSON); the job status has a result per row"""
+    try:
+        return await _provision_roster(roster.users, current_user)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Bulk registration error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error during bulk registration"
+        )
+
+@router.post("/register/bulk/csv", response_model=APIResponse, status_code=status.HTTP_202_ACCEPTED)
+async def register_users_bulk_csv(file: UploadFile = File(...), current_user: dict = Depends(get_current_host)):
+    """Start registering a roster of students from a CSV file with username and password columns"""
+    try:
+        try:
+            entries = parse_csv_roster((await file.read()).decode("utf-8-sig"))
+        except (ValueError, UnicodeDecodeError) as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid CSV roster: {e}"
+            )
+        return await _provision_roster(entries, current_user)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Bulk registration error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error during bulk registration"
+        )
+
+@router.get("/register/bulk/jobs/{job_id}", response_model=APIResponse)
+async def get_bulk_registration_status(job_id: str, current_user: dict = Depends(get_current_host)):
+    """Status of a roster provisioning job, with the per-row report once it has finished"""
+    job = await get_provisioning_job(job_id)
+    if job is None or job.get("kind") != "provisioning" or job["created_by"] != str(current_user["_id"]):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Provisioning job not found"
+        )
+    report = job.get("report")
+    if report is not None:
+        return APIResponse(message=f"Created {report['created']} of {report['total']} users", data=job)
+    return APIResponse(message=f"Provisioning job is {job['status']}", data=job)
+
 @router.post("/login", response_model=Token)
 async def login_user(login_data: UserLogin, request: Request):
     """Authenticate user and return access token"""
@@ -115,7 +193,7 @@ async def login_user(login_data: UserLogin, request: Request):
         
         if not user:
             # Log failed attempt
-            logger.warning(f"Failed login attempt: {username} ({login_data.role.value}) from {client_ip}")
+            logger.warning("Failed login attempt: %s (%s) from %s", username, login_data.role.value, client_ip)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid username, password, or role"
@@ -124,13 +202,13 @@ async def login_user(login_data: UserLogin, request: Request):
         # Create and return token
         token_response = create_user_token(user)
         
-        logger.info(f"User logged in successfully: {username} ({login_data.role.value})")
+        logger.info("User logged in successfully: %s (%s)", username, login_data.role.value)
         return token_response
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Login error: {e}")
+        logger.error("Login error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error during login"
@@ -148,7 +226,7 @@ async def get_current_user_info(current_user: dict = Depends(get_current_active_
             updated_at=current_user["updated_at"]
         )
     except Exception as e:
-        logger.error(f"Get user info error: {e}")
+        logger.error("Get user info error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve user information"
@@ -161,11 +239,11 @@ async def refresh_token(current_user: dict = Depends(get_current_active_user)):
         # Create new token
         token_response = create_user_token(current_user)
         
-        logger.info(f"Token refreshed for user: {current_user['username']}")
+        logger.info("Token refreshed for user: %s", current_user['username'])
         return token_response
         
     except Exception as e:
-        logger.error(f"Token refresh error: {e}")
+        logger.error("Token refresh error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to refresh token"
@@ -177,7 +255,7 @@ async def logout_user(current_user: dict = Depends(get_current_active_user)):
     try:
         # In a more sophisticated setup, you might want to blacklist the token
         # For now, we just log the logout event
-        logger.info(f"User logged out: {current_user['username']}")
+        logger.info("User logged out: %s", current_user['username'])
         
         return APIResponse(
             success=True,
@@ -185,7 +263,7 @@ async def logout_user(current_user: dict = Depends(get_current_active_user)):
         )
         
     except Exception as e:
-        logger.error(f"Logout error: {e}")
+        logger.error("Logout error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to logout"
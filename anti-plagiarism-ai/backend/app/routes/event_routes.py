@@ -0,0 +1,99 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Request
+from pydantic import ValidationError
+import asyncio
+import logging
+
+from app.core.config import settings
+from app.schemas import APIResponse
+from app.auth import get_current_active_user
+from app.ingest import ingest_batch
+from app.compaction import complete_session, compact_session
+from app.keystroke import keystroke_tracker
+from app.wire import parse_event_batch, WireFormatError, PayloadTooLarge
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+# Keep references so running compactions are not garbage collected
+_running_jobs = set()
+
+@router.post("/batch", response_model=APIResponse)
+async def submit_event_batch(request: Request, current_user: dict = Depends(get_current_active_user)):
+    """Store a batch of editor events (idempotent when batch_id/sequence are set)
+
+    Accepts a SessionEventBatch as JSON, or the compact encoding with
+    Content-Type: application/x-compact-events+json. Either may be sent with
+    Content-Encoding: gzip or zstd.
+    """
+    try:
+        body = await request.body()
+        batch = parse_event_batch(
+            body,
+            content_type=request.headers.get("content-type"),
+            content_encoding=request.headers.get("content-encoding"),
+        )
+
+        result = await ingest_batch(batch, current_user)
+
+        return APIResponse(
+            success=True,
+            message="Duplicate batch ignored" if result.duplicate else "Events stored",
+            data=result.model_dump()
+        )
+
+    except HTTPException:
+        raise
+    except PayloadTooLarge as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except WireFormatError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=e.errors(include_url=False)
+        )
+    except Exception as e:
+        logger.error(f"Event ingestion error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to store events"
+        )
+
+@router.post("/sessions/{session_id}/complete", response_model=APIResponse)
+async def complete_event_session(session_id: str, current_user: dict = Depends(get_current_active_user)):
+    """Mark the caller's active session completed; compact its events and fold its keystroke profile in the background"""
+    try:
+        session = await complete_session(session_id, str(current_user["_id"]))
+        if session is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="No active session with this id for the current user"
+            )
+
+        jobs = []
+        if settings.COMPACTION_ENABLED:
+            jobs.append(compact_session(session_id))
+        if settings.KEYSTROKE_ENABLED:
+            jobs.append(keystroke_tracker.fold_session(str(current_user["_id"]), session_id))
+        for job in jobs:
+            task = asyncio.create_task(job)
+            _running_jobs.add(task)
+            task.add_done_callback(_running_jobs.discard)
+
+        return APIResponse(message="Session completed", data=session)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Session completion error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to complete session"
+        )
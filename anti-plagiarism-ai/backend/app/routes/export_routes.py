@@ -0,0 +1,120 @@
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.responses import StreamingResponse, FileResponse
+import asyncio
+import logging
+
+from app.schemas import APIResponse, ExportDataset, ExportFormat
+from app.auth import get_current_host
+from app.export import (
+    CONTENT_TYPES, export_contest, export_filename, parquet_available,
+    create_export_job, get_export_job, run_export_job,
+)
+from app.routes.analysis_routes import _get_owned_contest
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/export", tags=["Export"])
+
+# Keep references so running jobs are not garbage collected
+_running_jobs = set()
+
+def _check_format(export_format: ExportFormat):
+    if export_format == ExportFormat.PARQUET and not parquet_available():
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Parquet exports require pyarrow on the server"
+        )
+
+def _public_job(job: dict) -> dict:
+    return {key: value for key, value in job.items() if key != "path"}
+
+async def _get_owned_job(job_id: str, current_user: dict) -> dict:
+    job = await get_export_job(job_id)
+    if job is None or job.get("kind") != "export" or job["created_by"] != str(current_user["_id"]):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Export job not found"
+        )
+    return job
+
+@router.get("/contests/{contest_id}/{dataset}")
+async def stream_contest_export(
+    contest_id: str,
+    dataset: ExportDataset,
+    export_format: ExportFormat = Query(ExportFormat.CSV, alias="format"),
+    current_user: dict = Depends(get_current_host)
+):
+    """Stream a contest's sessions or analytics as CSV, NDJSON or Parquet"""
+    try:
+        await _get_owned_contest(contest_id, current_user)
+        _check_format(export_format)
+
+        logger.info(f"Export of {dataset.value} for contest {contest_id} ({export_format.value}) "
+                    f"by {current_user['username']}")
+        filename = export_filename(contest_id, dataset, export_format)
+        return StreamingResponse(
+            export_contest(contest_id, dataset, export_format),
+            media_type=CONTENT_TYPES[export_format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Export error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to start export"
+        )
+
+@router.post("/contests/{contest_id}/{dataset}/jobs", response_model=APIResponse, status_code=status.HTTP_202_ACCEPTED)
+async def start_export_job(
+    contest_id: str,
+    dataset: ExportDataset,
+    export_format: ExportFormat = Query(ExportFormat.CSV, alias="format"),
+    current_user: dict = Depends(get_current_host)
+):
+    """Write a contest export to a file in the background"""
+    try:
+        await _get_owned_contest(contest_id, current_user)
+        _check_format(export_format)
+
+        job = await create_export_job(contest_id, dataset, export_format, str(current_user["_id"]))
+        task = asyncio.create_task(run_export_job(job))
+        _running_jobs.add(task)
+        task.add_done_callback(_running_jobs.discard)
+
+        logger.info(f"Export job {job['job_id']} started for contest {contest_id} by {current_user['username']}")
+        return APIResponse(message="Export job started", data=_public_job(job))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Export job error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to start export job"
+        )
+
+@router.get("/jobs/{job_id}", response_model=APIResponse)
+async def get_export_job_status(job_id: str, current_user: dict = Depends(get_current_host)):
+    """Status of an export job"""
+    job = await _get_owned_job(job_id, current_user)
+    return APIResponse(message="Export job status", data=_public_job(job))
+
+@router.get("/jobs/{job_id}/download")
+async def download_export(job_id: str, current_user: dict = Depends(get_current_host)):
+    """Download the file written by a finished export job"""
+    job = await _get_owned_job(job_id, current_user)
+    if job["status"] != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Export job is {job['status']}"
+        )
+
+    export_format = ExportFormat(job["format"])
+    return FileResponse(
+        job["path"],
+        media_type=CONTENT_TYPES[export_format],
+        filename=export_filename(job["contest_id"], ExportDataset(job["dataset"]), export_format),
+    )
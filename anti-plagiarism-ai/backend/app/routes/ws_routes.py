@@ -0,0 +1,155 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, HTTPException
+from typing import Optional
+from pydantic import ValidationError
+import logging
+
+from app.core.config import settings
+from app.schemas import WSMessage, WSMessageType, SessionEventBatch, UserRole
+from app.auth import authenticate_websocket_token
+from app.db import get_contests_collection
+from app.leaderboard import send_snapshot
+from app.ingest import ingest_batch, claim_session
+from app.websocket_manager import manager
+from app.wire import (
+    parse_event_batch, decode_compact, sniff_encoding, WireFormatError,
+    COMPACT_CONTENT_TYPE, COMPACT_FORMAT, JSON_FORMAT,
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["WebSocket"])
+
+async def _ingest(websocket: WebSocket, session_id: str, batch: SessionEventBatch,
+                  user: dict, event_id=None):
+    if batch.session_id != session_id:
+        raise WireFormatError("Batch session_id does not match the connection")
+
+    result = await ingest_batch(batch, user)
+    await manager.send_message(websocket, WSMessage(
+        type=WSMessageType.ACKNOWLEDGMENT,
+        data=result.model_dump(),
+        session_id=session_id,
+        event_id=batch.batch_id or event_id,
+    ))
+
+@router.websocket("/ws/{session_id}")
+async def session_websocket(websocket: WebSocket, session_id: str, token: str = Query(...),
+                            batch_format: str = Query(JSON_FORMAT, alias="format"),
+                            contest_id: Optional[str] = Query(None),
+                            language: str = Query("javascript")):
+    """Live event stream for a session
+
+    Text frames carry WSMessage JSON (EVENT messages hold a SessionEventBatch
+    in ``data``). Binary frames carry a batch body, optionally
+    gzip/zstd-compressed, detected from the magic bytes. Connect with
+    ``?format=compact`` to send every batch in the compact encoding instead.
+    The session must be the caller's; a new session id is claimed for the
+    caller (with ``contest_id`` and ``language`` from the query).
+    """
+    user = await authenticate_websocket_token(token)
+    if user is None or batch_format not in (JSON_FORMAT, COMPACT_FORMAT):
+        await websocket.close(code=1008)  # Policy violation
+        return
+    compact = batch_format == COMPACT_FORMAT
+    try:
+        await claim_session(session_id, str(user["_id"]), contest_id, language)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+
+    connection_id = await manager.connect(websocket, session_id, user)
+    if connection_id is None:
+        return
+
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                break
+
+            event_id = None
+            try:
+                if frame.get("bytes") is not None:
+                    body = frame["bytes"]
+                    batch = parse_event_batch(
+                        body,
+                        content_type=COMPACT_CONTENT_TYPE if compact else None,
+                        content_encoding=sniff_encoding(body),
+                    )
+                    await _ingest(websocket, session_id, batch, user)
+                    continue
+
+                message = WSMessage.model_validate_json(frame.get("text") or "")
+                event_id = message.event_id
+
+                if message.type == WSMessageType.PING:
+                    await manager.touch(websocket)
+                    await manager.send_message(websocket, WSMessage(
+                        type=WSMessageType.PONG, session_id=session_id, event_id=event_id
+                    ))
+                elif message.type == WSMessageType.EVENT:
+                    data = message.data or {}
+                    batch = decode_compact(data) if compact else SessionEventBatch.model_validate(data)
+                    await _ingest(websocket, session_id, batch, user, event_id)
+                else:
+                    raise WireFormatError(f"Unsupported message type: {message.type.value}")
+
+            except (WireFormatError, ValidationError) as e:
+                await manager.send_message(websocket, WSMessage(
+                    type=WSMessageType.ERROR,
+                    data={"detail": str(e)},
+                    session_id=session_id,
+                    event_id=event_id,
+                ))
+            except HTTPException as e:
+                await manager.send_message(websocket, WSMessage(
+                    type=WSMessageType.ERROR,
+                    data={"detail": e.detail, "status_code": e.status_code},
+                    session_id=session_id,
+                    event_id=event_id,
+                ))
+
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"WebSocket error for session {session_id}: {e}")
+    finally:
+        await manager.disconnect(websocket, session_id)
+
+@router.websocket("/ws/contests/{contest_id}/leaderboard")
+async def contest_leaderboard_websocket(websocket: WebSocket, contest_id: str, token: str = Query(...)):
+    """Live contest view for a host dashboard
+
+    Sends one ``leaderboard`` snapshot on connect, then ``leaderboard_delta``
+    messages holding only the rows that changed, plus session STATUS changes
+    and new ANALYTICS results when change streams are available.
+    """
+    user = await authenticate_websocket_token(token)
+    if user is None or user.get("role") != UserRole.HOST.value:
+        await websocket.close(code=1008)  # Policy violation
+        return
+
+    contests_collection = await get_contests_collection()
+    contest = await contests_collection.find_one({"_id": contest_id}, projection={"created_by": 1})
+    if contest is None or contest.get("created_by") != str(user["_id"]):
+        await websocket.close(code=1008)
+        return
+
+    if not await manager.subscribe_contest(websocket, contest_id):
+        return
+
+    try:
+        await send_snapshot(websocket, contest_id, settings.LEADERBOARD_SNAPSHOT_SIZE)
+        while True:
+            message = WSMessage.model_validate_json(await websocket.receive_text())
+            if message.type == WSMessageType.PING:
+                await manager.send_message(websocket, WSMessage(
+                    type=WSMessageType.PONG, event_id=message.event_id
+                ))
+
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Leaderboard WebSocket error for contest {contest_id}: {e}")
+    finally:
+        manager.unsubscribe_contest(websocket, contest_id)
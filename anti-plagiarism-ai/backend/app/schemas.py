@@ -26,6 +26,14 @@ class UserCreate(UserBase):
             raise ValueError('Password must be at least 6 characters long')
         return v
 
+class RosterEntry(BaseModel):
+    # Validated per row by the provisioning code, so one bad row does not reject the roster
+    username: str
+    password: str
+
+class BulkUserCreate(BaseModel):
+    users: List[RosterEntry]
+
 class UserLogin(BaseModel):
     username: str
     password: str
@@ -121,6 +129,16 @@ class SessionEventBatch(BaseModel):
     language: str = "javascript"
     events: List[SessionEvent]
     client_analytics: Optional[Dict[str, Any]] = None
+    # Idempotency: retries of the same batch reuse batch_id and sequence
+    batch_id: Optional[str] = Field(default=None, max_length=64)
+    sequence: Optional[int] = Field(default=None, ge=0, description="Per-session batch sequence number")
+
+class SessionEventBatchResult(BaseModel):
+    session_id: str
+    batch_id: Optional[str] = None
+    sequence: Optional[int] = None
+    accepted: int = 0
+    duplicate: bool = False
 
 # Enhanced Session Schemas
 class SessionStatus(str, Enum):
@@ -196,6 +214,16 @@ class AnalyticsResponse(BaseModel):
     class Config:
         populate_by_name = True
 
+# Export Schemas
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+    PARQUET = "parquet"
+
+class ExportDataset(str, Enum):
+    SESSIONS = "sessions"
+    ANALYTICS = "analytics"
+
 # WebSocket Schemas
 class WSMessageType(str, Enum):
     EVENT = "event"
@@ -0,0 +1,35 @@
+"""
+Production entrypoint: ``python -m app.server``.
+
+Starts uvicorn with ``WORKERS`` processes (0 = one per CPU core). Each worker
+runs the app's lifespan on its own (database pool, caches, per-worker
+flushers); jobs that must run once per cluster are leader-elected, see
+``app.leader``.
+"""
+
+import os
+
+import uvicorn
+
+from app.core.config import settings
+from app.core.logs import setup_logging
+
+
+def worker_count() -> int:
+    return settings.WORKERS or os.cpu_count() or 1
+
+
+def main():
+    setup_logging()  # The supervisor process logs through the same pipeline
+    uvicorn.run(
+        "app.main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=worker_count(),
+        proxy_headers=True,
+        log_config=None,  # app.core.logs owns logging in every worker
+    )
+
+
+if __name__ == "__main__":
+    main()
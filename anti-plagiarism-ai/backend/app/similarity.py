@@ -0,0 +1,477 @@
+"""
+Contest-wide similarity matrix and collusion-cluster detection.
+
+Pipeline for one contest:
+
+1. Each submission is tokenized (``app.tokenizer``, so renames, literals and
+   formatting do not matter), hashed into token k-grams and winnowed into a
+   fingerprint set, then summarised by a MinHash signature. Signatures are
+   computed in a process pool and written straight into a shared-memory
+   ``(submissions x SIMILARITY_NUM_PERM)`` array. A signature depends only on
+   the code, language and signing settings, so it is kept in the analysis
+   cache (``app.analysis_cache`` signature entries, hex of the uint64 array):
+   re-runs and identical submissions in other sessions only sign what is new.
+2. LSH banding over the signatures yields candidate pairs, so the matrix stays
+   sparse instead of comparing all n^2 pairs. Identical signatures are
+   grouped before banding, so copies of one submission always pair.
+3. Workers score candidate pairs (estimated Jaccard similarity) against the
+   same shared-memory array.
+4. Pairs above ``SIMILARITY_CLUSTER_THRESHOLD`` are joined with union-find;
+   each connected component with two or more members is a cluster, stored per
+   session as a ``PLAGIARISM_DETECTION`` analytics document.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from app.core.config import settings
+from app.schemas import AnalysisResults, AnalysisType
+from app.db import get_analytics_collection, get_sessions_collection
+from app.reconstruction import load_session_timelines
+from app.analysis_cache import analysis_cache
+from app.tokenizer import tokenize
+from app.leaderboard import record_results, clear_source
+from app.jobs import start_job, finish_job, get_job
+
+logger = logging.getLogger(__name__)
+
+JOB_SOURCE = "contest_similarity"
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 31, size=settings.SIMILARITY_NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=settings.SIMILARITY_NUM_PERM).astype(np.uint64)
+
+
+# Fingerprinting ------------------------------------------------------------
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, so hashes of small token ids use all 64 bits"""
+    with np.errstate(over="ignore"):
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return values ^ (values >> np.uint64(31))
+
+
+def kgram_hashes(tokens: np.ndarray, k: int) -> np.ndarray:
+    """Hashes (mod 2^64) of every run of k consecutive token ids"""
+    if len(tokens) < k:
+        return np.empty(0, dtype=np.uint64)
+    ids = tokens.astype(np.uint64) + np.uint64(1)
+    hashes = np.zeros(len(tokens) - k + 1, dtype=np.uint64)
+    base = np.uint64(1000003)
+    with np.errstate(over="ignore"):
+        for offset in range(k):
+            hashes = hashes * base + ids[offset:offset + len(hashes)]
+    return _mix64(hashes)
+
+
+def winnow(hashes: np.ndarray, window: int) -> np.ndarray:
+    """Unique window minima: any shared run of window + k - 1 tokens shares one"""
+    if len(hashes) > window:
+        hashes = np.lib.stride_tricks.sliding_window_view(hashes, window).min(axis=1)
+    return np.unique(hashes)
+
+
+def fingerprints(code: str, language: Optional[str] = None,
+                 k: Optional[int] = None, window: Optional[int] = None) -> np.ndarray:
+    """Winnowed normalized-token k-gram hashes (unique, uint64)"""
+    k = k or settings.SIMILARITY_KGRAM
+    window = window or settings.SIMILARITY_WINDOW
+    return winnow(kgram_hashes(tokenize(code, language), k), window)
+
+
+def minhash(prints: np.ndarray) -> np.ndarray:
+    """MinHash signature of a fingerprint set; empty sets get an all-max signature"""
+    if prints.size == 0:
+        return np.full(len(_PERM_A), MERSENNE_PRIME, dtype=np.uint64)
+    values = prints & np.uint64(0xFFFFFFFF)
+    # a < 2^31 and values < 2^32, so a * v + b stays below 2^64
+    hashed = (_PERM_A[:, None] * values[None, :] + _PERM_B[:, None]) % MERSENNE_PRIME
+    return hashed.min(axis=1)
+
+
+# Worker side ---------------------------------------------------------------
+
+_worker_shm: Optional[shared_memory.SharedMemory] = None
+_worker_signatures: Optional[np.ndarray] = None
+
+
+def _attach_worker(shm_name: str, shape: Tuple[int, int]):
+    global _worker_shm, _worker_signatures
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_signatures = np.ndarray(shape, dtype=np.uint64, buffer=_worker_shm.buf)
+
+
+def _sign_block(rows: Sequence[int], codes: Sequence[str], languages: Sequence[Optional[str]]) -> int:
+    """Write signatures for ``rows`` into shared memory"""
+    for row, code, language in zip(rows, codes, languages):
+        _worker_signatures[row] = minhash(fingerprints(code, language))
+    return len(rows)
+
+
+def _score_pairs(left: np.ndarray, right: np.ndarray, threshold: float):
+    scores = (_worker_signatures[left] == _worker_signatures[right]).mean(axis=1)
+    keep = scores >= threshold
+    return left[keep], right[keep], scores[keep]
+
+
+# Driver --------------------------------------------------------------------
+
+def _row_keys(block: np.ndarray) -> np.ndarray:
+    """One opaque key per row, so rows can be grouped with np.unique"""
+    block = np.ascontiguousarray(block)
+    return block.view(np.dtype((np.void, block.dtype.itemsize * block.shape[1]))).ravel()
+
+
+def candidate_pairs(signatures: np.ndarray, valid: np.ndarray, bands: int,
+                    stats: Optional[dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """LSH banding: rows sharing any band bucket become candidate pairs
+
+    Rows with identical signatures are paired with the first of them directly,
+    and only that first row goes through the bands, so a large group of
+    identical submissions costs one pair per member and is never cut short.
+    Buckets of distinct signatures are still capped at SIMILARITY_MAX_BUCKET
+    members; capped buckets are logged and counted in ``stats``.
+    """
+    count, num_perm = signatures.shape
+    rows = num_perm // bands
+    cap = settings.SIMILARITY_MAX_BUCKET
+    keys = set()
+    valid_rows = np.flatnonzero(valid)
+
+    if valid_rows.size:
+        _, first, inverse = np.unique(_row_keys(signatures[valid_rows]), return_index=True, return_inverse=True)
+        representatives = valid_rows[first][inverse.ravel()]
+        for row, representative in zip(valid_rows.tolist(), representatives.tolist()):
+            if row != representative:
+                keys.add(representative * count + row)
+        valid_rows = np.sort(valid_rows[first])
+
+    capped = 0
+    for band in range(bands):
+        block = signatures[valid_rows, band * rows:(band + 1) * rows]
+        _, inverse, counts = np.unique(_row_keys(block), return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        shared = np.flatnonzero(counts[inverse] > 1)
+        if shared.size == 0:
+            continue
+        order = shared[np.argsort(inverse[shared], kind="stable")]
+        groups = np.split(order, np.flatnonzero(np.diff(inverse[order])) + 1)
+        for group in groups:
+            if len(group) > cap:
+                capped += 1
+            members = valid_rows[group][:cap]
+            for a in range(len(members)):
+                for b in range(a + 1, len(members)):
+                    keys.add(int(members[a]) * count + int(members[b]))
+
+    if capped:
+        logger.warning(f"{capped} LSH buckets had more than SIMILARITY_MAX_BUCKET ({cap}) distinct "
+                       f"submissions; pairs beyond the first {cap} members were not scored")
+    if stats is not None:
+        stats["capped_buckets"] = capped
+
+    if not keys:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    encoded = np.fromiter(keys, dtype=np.int64, count=len(keys))
+    encoded.sort()
+    return encoded // count, encoded % count
+
+
+def compute_similarity(codes: Sequence[str], languages: Optional[Sequence[Optional[str]]] = None,
+                       workers: Optional[int] = None,
+                       known: Optional[List[Optional[np.ndarray]]] = None,
+                       stats: Optional[dict] = None) -> List[Tuple[int, int, float]]:
+    """Sparse similarity matrix as (i, j, score) with i < j and score >= report threshold
+
+    ``known`` holds already computed signatures per row (None where missing);
+    only the missing rows are signed, and their signatures are written back
+    into it. ``stats`` receives the candidate-pair counters (see
+    ``candidate_pairs``).
+    """
+    count = len(codes)
+    if count < 2:
+        return []
+    languages = languages or [None] * count
+    missing = [row for row in range(count) if known is None or known[row] is None]
+
+    workers = workers or settings.SIMILARITY_WORKERS or os.cpu_count() or 1
+    shape = (count, settings.SIMILARITY_NUM_PERM)
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+    try:
+        signatures = np.ndarray(shape, dtype=np.uint64, buffer=shm.buf)
+        if known is not None:
+            for row, signature in enumerate(known):
+                if signature is not None:
+                    signatures[row] = signature
+        # spawn: the API process is multi-threaded (Motor, to_thread), so avoid fork
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_attach_worker, initargs=(shm.name, shape)) as pool:
+            block = max(1, -(-len(missing) // (workers * 4)))
+            blocks = [missing[i:i + block] for i in range(0, len(missing), block)]
+            list(pool.map(_sign_block, blocks,
+                          [[codes[row] for row in rows] for rows in blocks],
+                          [[languages[row] for row in rows] for rows in blocks]))
+            if known is not None:
+                for row in missing:
+                    known[row] = signatures[row].copy()
+
+            valid = (signatures != MERSENNE_PRIME).any(axis=1)
+            left, right = candidate_pairs(signatures, valid, settings.SIMILARITY_BANDS, stats)
+
+            matrix = []
+            chunk = max(1, -(-len(left) // (workers * 4)))
+            threshold = settings.SIMILARITY_REPORT_THRESHOLD
+            futures = [
+                pool.submit(_score_pairs, left[i:i + chunk], right[i:i + chunk], threshold)
+                for i in range(0, len(left), chunk)
+            ]
+            for future in futures:
+                kept_left, kept_right, scores = future.result()
+                matrix.extend(zip(kept_left.tolist(), kept_right.tolist(), scores.tolist()))
+        del signatures
+        return matrix
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+class UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+        self.rank = [0] * size
+
+    def find(self, item: int) -> int:
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a: int, b: int):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.rank[a] < self.rank[b]:
+            a, b = b, a
+        self.parent[b] = a
+        if self.rank[a] == self.rank[b]:
+            self.rank[a] += 1
+
+
+def find_clusters(count: int, matrix: Sequence[Tuple[int, int, float]], threshold: float) -> List[List[int]]:
+    """Connected components (size >= 2) of the graph of pairs scoring >= threshold"""
+    components = UnionFind(count)
+    for i, j, score in matrix:
+        if score >= threshold:
+            components.union(i, j)
+    groups: Dict[int, List[int]] = {}
+    for item in range(count):
+        groups.setdefault(components.find(item), []).append(item)
+    return sorted((members for members in groups.values() if len(members) > 1), key=len, reverse=True)
+
+
+def risk_level(score: float) -> str:
+    if score >= 0.95:
+        return "critical"
+    if score >= 0.85:
+        return "high"
+    if score >= 0.7:
+        return "medium"
+    return "low"
+
+
+# Contest job ---------------------------------------------------------------
+
+def _job_id(contest_id: str) -> str:
+    return f"similarity:{contest_id}"
+
+
+async def start_similarity_job(contest_id: str) -> Optional[dict]:
+    """Record a run for the contest; None while one is running in any worker"""
+    return await start_job(_job_id(contest_id), "similarity", {"contest_id": contest_id})
+
+
+async def get_similarity_job(contest_id: str) -> Optional[dict]:
+    """Status of the contest's latest run"""
+    return await get_job(_job_id(contest_id))
+
+
+def _signature_params() -> dict:
+    return {
+        "num_perm": settings.SIMILARITY_NUM_PERM,
+        "kgram": settings.SIMILARITY_KGRAM,
+        "window": settings.SIMILARITY_WINDOW,
+    }
+
+
+def _decode_signature(payload: Optional[str], num_perm: int) -> Optional[np.ndarray]:
+    """Signature from its cache entry; None if missing or unreadable (it is re-signed and overwritten)"""
+    if payload is None:
+        return None
+    try:
+        signature = np.frombuffer(bytes.fromhex(payload), dtype="<u8")
+    except ValueError:
+        return None
+    return signature.astype(np.uint64) if len(signature) == num_perm else None
+
+
+async def cached_signatures(submissions: List[dict]) -> List[Optional[np.ndarray]]:
+    """Signatures of previously signed code from the analysis cache (None where missing)"""
+    params = _signature_params()
+    cached = await asyncio.gather(*(
+        analysis_cache.get_signature(submission["code"], submission["language"] or "", params)
+        for submission in submissions
+    ))
+    return [_decode_signature(payload, params["num_perm"]) for payload in cached]
+
+
+async def store_signatures(submissions: List[dict], signatures: List[np.ndarray], rows: List[int]):
+    params = _signature_params()
+    await asyncio.gather(*(
+        analysis_cache.set_signature(
+            submissions[row]["code"], submissions[row]["language"] or "", params,
+            signatures[row].astype("<u8").tobytes().hex(),
+        )
+        for row in rows
+    ))
+
+
+async def load_contest_submissions(contest_id: str) -> List[dict]:
+    """Final code for every session in a contest"""
+    sessions_collection = await get_sessions_collection()
+    cursor = sessions_collection.find(
+        {"contest_id": contest_id},
+        projection={"session_id": 1, "user_id": 1, "language": 1, "final_code": 1},
+    )
+    submissions = []
+    owners: Dict[str, str] = {}
+    async for session in cursor:
+        submissions.append({
+            "session_id": session["session_id"],
+            "user_id": session.get("user_id"),
+            "language": session.get("language"),
+            "code": session.get("final_code"),
+        })
+        if session.get("final_code") is None:
+            owners[session["session_id"]] = session.get("user_id")
+
+    # Sessions that were never compacted are rebuilt from their events, a batch of sessions per query
+    session_ids = list(owners)
+    rebuilt: Dict[str, str] = {}
+    for i in range(0, len(session_ids), settings.SIMILARITY_LOAD_BATCH):
+        batch = session_ids[i:i + settings.SIMILARITY_LOAD_BATCH]
+        timelines = await load_session_timelines({session_id: owners[session_id] for session_id in batch})
+        rebuilt.update((session_id, timeline.text()) for session_id, timeline in timelines.items())
+    for submission in submissions:
+        if submission["code"] is None:
+            submission["code"] = rebuilt[submission["session_id"]]
+    return submissions
+
+
+def build_cluster_documents(contest_id: str, submissions: List[dict],
+                            matrix: List[Tuple[int, int, float]], clusters: List[List[int]]) -> List[dict]:
+    threshold = settings.SIMILARITY_CLUSTER_THRESHOLD
+    neighbours: Dict[int, List[Tuple[int, float]]] = {}
+    for i, j, score in matrix:
+        if score >= threshold:
+            neighbours.setdefault(i, []).append((j, score))
+            neighbours.setdefault(j, []).append((i, score))
+
+    now = datetime.utcnow()
+    documents = []
+    for cluster_number, members in enumerate(clusters, start=1):
+        member_ids = [submissions[m]["session_id"] for m in members]
+        for member in members:
+            matches = sorted(neighbours.get(member, []), key=lambda item: item[1], reverse=True)
+            best = matches[0][1] if matches else threshold
+            results = AnalysisResults(
+                confidence_score=round(min(1.0, best), 4),
+                flags=["collusion_cluster"],
+                patterns={
+                    "source": JOB_SOURCE,
+                    "cluster_id": f"{contest_id}:{cluster_number}",
+                    "cluster_size": len(members),
+                    "members": member_ids,
+                    "matches": [
+                        {"session_id": submissions[other]["session_id"], "score": round(score, 4)}
+                        for other, score in matches[:20]
+                    ],
+                },
+                recommendations=["Review the submissions in this cluster side by side"],
+                risk_level=risk_level(best),
+            )
+            documents.append({
+                "_id": str(ObjectId()),
+                "session_id": submissions[member]["session_id"],
+                "user_id": submissions[member]["user_id"],
+                "contest_id": contest_id,
+                "analysis_type": AnalysisType.PLAGIARISM_DETECTION.value,
+                "results": results.model_dump(),
+                "processed_at": now,
+                "version": "1.0.0",
+            })
+    return documents
+
+
+async def run_contest_similarity(contest_id: str):
+    """Compute the contest similarity matrix and store collusion clusters (after start_similarity_job)"""
+    try:
+        submissions = await load_contest_submissions(contest_id)
+        codes = [submission["code"] for submission in submissions]
+        languages = [submission["language"] for submission in submissions]
+
+        signatures = await cached_signatures(submissions)
+        unsigned = [row for row, signature in enumerate(signatures) if signature is None]
+        stats = {"capped_buckets": 0}
+        matrix = await asyncio.to_thread(compute_similarity, codes, languages, None, signatures, stats)
+        if len(codes) >= 2:
+            await store_signatures(submissions, signatures, unsigned)
+        clusters = find_clusters(len(codes), matrix, settings.SIMILARITY_CLUSTER_THRESHOLD)
+        documents = build_cluster_documents(contest_id, submissions, matrix, clusters)
+
+        # Replace the previous run's results for this contest
+        analytics_collection = await get_analytics_collection()
+        await analytics_collection.delete_many({
+            "contest_id": contest_id,
+            "analysis_type": AnalysisType.PLAGIARISM_DETECTION.value,
+            "results.patterns.source": JOB_SOURCE,
+        })
+        if documents:
+            await analytics_collection.insert_many(documents, ordered=False)
+
+        rows = [
+            {"session_id": doc["session_id"], "user_id": doc["user_id"],
+             "results": AnalysisResults.model_validate(doc["results"])}
+            for doc in documents
+        ]
+        await clear_source(contest_id, JOB_SOURCE, [row["session_id"] for row in rows])
+        await record_results(contest_id, rows, JOB_SOURCE)
+
+        await finish_job(_job_id(contest_id), {
+            "submissions": len(codes),
+            "signatures_cached": len(codes) - len(unsigned),
+            "pairs": len(matrix),
+            "capped_buckets": stats["capped_buckets"],
+            "clusters": [[submissions[m]["session_id"] for m in members] for members in clusters],
+        })
+        logger.info(f"Similarity job for contest {contest_id}: {len(codes)} submissions, "
+                    f"{len(matrix)} similar pairs, {len(clusters)} clusters")
+    except asyncio.CancelledError:
+        await finish_job(_job_id(contest_id), {"error": "Interrupted by worker shutdown"}, failed=True)
+        raise
+    except Exception as e:
+        logger.error(f"Similarity job for contest {contest_id} failed: {e}")
+        await finish_job(_job_id(contest_id), {"error": str(e)}, failed=True)
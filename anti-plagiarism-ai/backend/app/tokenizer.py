@@ -0,0 +1,210 @@
+"""
+Language-aware tokenization and normalization for similarity checks.
+
+``tokenize(code, language)`` lexes JavaScript, Python, C++ or Java source into
+a compact ``uint32`` token array:
+
+- comments and whitespace are dropped, so formatting never matters
+- every identifier becomes ``IDENT``, numbers ``NUMBER`` and string/char
+  literals ``STRING``, so renames and changed constants do not either
+- keywords and operators keep their own ids from one shared vocabulary, so
+  token ids mean the same thing in every process and every language
+
+Results are memoized by a hash of (language, code), so repeated snapshots of
+the same code are lexed once.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SKIP = 0
+IDENT = 1
+NUMBER = 2
+STRING = 3
+PREPROCESSOR = 4
+UNKNOWN_BASE = 1 << 16  # Unlisted single characters map to UNKNOWN_BASE + ord(char)
+
+DEFAULT_LANGUAGE = "javascript"
+LANGUAGE_ALIASES = {
+    "javascript": "javascript", "js": "javascript", "typescript": "javascript", "ts": "javascript",
+    "python": "python", "py": "python", "python3": "python",
+    "cpp": "cpp", "c++": "cpp", "c": "cpp", "cc": "cpp",
+    "java": "java",
+}
+EXTENSION_LANGUAGES = {
+    ".js": "javascript", ".mjs": "javascript", ".cjs": "javascript", ".jsx": "javascript", ".ts": "javascript",
+    ".py": "python",
+    ".cpp": "cpp", ".cc": "cpp", ".cxx": "cpp", ".c": "cpp", ".h": "cpp", ".hpp": "cpp",
+    ".java": "java",
+}
+
+KEYWORDS = {
+    "javascript": """
+        await break case catch class const continue debugger default delete do else export extends
+        false finally for function if import in instanceof let new null of return static super switch
+        this throw true try typeof undefined var void while with yield async
+    """,
+    "python": """
+        False None True and as assert async await break class continue def del elif else except
+        finally for from global if import in is lambda nonlocal not or pass raise return try while
+        with yield self print range len
+    """,
+    "cpp": """
+        auto bool break case catch char class const constexpr continue default delete do double else
+        enum explicit false float for friend goto if inline int long namespace new nullptr operator
+        private protected public return short signed sizeof static struct switch template this throw
+        true try typedef typename union unsigned using virtual void volatile while std vector string
+        cout cin endl
+    """,
+    "java": """
+        abstract boolean break byte case catch char class const continue default do double else enum
+        extends final finally float for if implements import instanceof int interface long new null
+        package private protected public return short static super switch synchronized this throw
+        throws true false try void volatile while var String System
+    """,
+}
+
+OPERATORS = sorted("""
+    >>>= <<= >>= ** **= ... === !== >>> => -> :: ++ -- && || ?? ?. == != <= >= << >> += -= *= /= %=
+    &= |= ^= //= //
+""".split(), key=len, reverse=True)
+PUNCTUATION = "{}()[];,.:?~!%^&*-+=|/<>@#"
+
+# Shared vocabulary: ids are assigned from sorted lists so every process agrees
+_VOCABULARY: Dict[str, int] = {}
+for _lexeme in sorted({word for words in KEYWORDS.values() for word in words.split()}
+                      | set(OPERATORS) | set(PUNCTUATION)):
+    _VOCABULARY[_lexeme] = len(_VOCABULARY) + 16
+
+_NUMBER = r"\.?\d(?:[eE][+-]\d|[\w.])*"
+_IDENT = r"[A-Za-z_$][\w$]*"
+_OPERATOR = "|".join(re.escape(op) for op in OPERATORS)
+_C_COMMENTS = r"//[^\n]*|/\*[\s\S]*?(?:\*/|$)"
+_QUOTED = r'"(?:[^"\\\n]|\\.)*"?|\'(?:[^\'\\\n]|\\.)*\'?'
+
+# Identifiers come first (most tokens are identifiers); they cannot start like a
+# comment, number or string, except Python/C++ prefixed strings listed before them
+_PATTERNS = {
+    "javascript": [_IDENT, _NUMBER, _C_COMMENTS, r"`(?:[^`\\]|\\.)*`?", _QUOTED, _OPERATOR, r"\S"],
+    "python": [
+        r"[rRbBuUfF]{0,2}(?:'''[\s\S]*?(?:'''|$)|\"\"\"[\s\S]*?(?:\"\"\"|$))",
+        r"[rRbBuUfF]{1,2}(?:" + _QUOTED + ")",
+        _IDENT, _NUMBER, r"#[^\n]*", _QUOTED, _OPERATOR, r"\S",
+    ],
+    "cpp": [
+        r'R"[^(\s]*\([\s\S]*?\)[^"\s]*"', _IDENT, _NUMBER, _C_COMMENTS, r"#[ \t]*\w+(?:\\\n|[^\n])*",
+        _QUOTED, _OPERATOR, r"\S",
+    ],
+    "java": [_IDENT, _NUMBER, _C_COMMENTS, r'"""[\s\S]*?(?:"""|$)', _QUOTED, _OPERATOR, r"\S"],
+}
+# Leading whitespace is consumed inside each match instead of one failed attempt per character
+_COMPILED = {language: re.compile(r"\s*(" + "|".join(parts) + ")") for language, parts in _PATTERNS.items()}
+
+tokenizer_cache_lookups = metrics.counter("tokenizer_cache_lookups_total", "Tokenizer memo lookups by result")
+
+
+def normalize_language(language: Optional[str]) -> str:
+    if not language:
+        return DEFAULT_LANGUAGE
+    return LANGUAGE_ALIASES.get(language.strip().lower(), DEFAULT_LANGUAGE)
+
+
+def language_for_path(path: str) -> str:
+    return EXTENSION_LANGUAGES.get(os.path.splitext(path)[1].lower(), DEFAULT_LANGUAGE)
+
+
+class _Classifier(dict):
+    """Lexeme -> token id, filled on first sight of each lexeme"""
+
+    def __init__(self, language: str):
+        super().__init__()
+        self.language = language
+        self.keywords = frozenset(KEYWORDS[language].split())
+
+    def __missing__(self, lexeme: str) -> int:
+        first = lexeme[0]
+        if lexeme in self.keywords:
+            token = _VOCABULARY[lexeme]
+        elif first.isalpha() or first in "_$":
+            # Python/C++ string prefixes (r"", b'', R"(") reach here only as literals
+            token = STRING if len(lexeme) > 1 and lexeme[-1] in "\"'" else IDENT
+        elif first.isdigit() or (first == "." and len(lexeme) > 1):
+            token = NUMBER
+        elif first in "\"'`":
+            token = STRING
+        elif lexeme.startswith(("//", "/*")) and len(lexeme) > 1 and self.language != "python":
+            token = SKIP
+        elif first == "#":
+            token = SKIP if self.language == "python" else PREPROCESSOR
+        else:
+            token = _VOCABULARY.get(lexeme, UNKNOWN_BASE + ord(first))
+
+        # Literals and comments are mostly unique; remembering them would only grow the map
+        if token not in (STRING, SKIP) and len(self) < 65536:
+            self[lexeme] = token
+        return token
+
+
+_CLASSIFIERS = {language: _Classifier(language) for language in _COMPILED}
+
+
+def lex(code: str, language: Optional[str] = None) -> np.ndarray:
+    """Tokenize without the memo"""
+    language = normalize_language(language)
+    classify = _CLASSIFIERS[language]
+    ids = np.fromiter(
+        (classify[lexeme] for lexeme in _COMPILED[language].findall(code)), dtype=np.uint32
+    )
+    return ids[ids != SKIP]
+
+
+class TokenCache:
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def tokenize(self, code: str, language: Optional[str] = None) -> np.ndarray:
+        language = normalize_language(language)
+        key = hashlib.blake2b(code.encode("utf-8"), digest_size=16, person=language.encode("ascii")).digest()
+        with self._lock:
+            tokens = self._items.get(key)
+            if tokens is not None:
+                self._items.move_to_end(key)
+        if tokens is not None:
+            tokenizer_cache_lookups.inc(result="hit")
+            return tokens
+
+        tokens = lex(code, language)
+        tokens.setflags(write=False)
+        tokenizer_cache_lookups.inc(result="miss")
+        with self._lock:
+            self._items[key] = tokens
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return tokens
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# Global token memo (one per process; similarity workers get their own)
+token_cache = TokenCache(max_items=settings.TOKENIZER_CACHE_SIZE)
+
+
+def tokenize(code: str, language: Optional[str] = None) -> np.ndarray:
+    """Normalized token ids for ``code``, memoized by content hash"""
+    return token_cache.tokenize(code, language)
@@ -0,0 +1,342 @@
+"""
+WebSocket connection tracking for live coding sessions.
+
+Every socket gets a bounded outbound queue drained by its own writer task, so
+a slow client never makes senders wait or grows the worker's memory. What
+happens to a message when the client falls behind depends on its type
+(``WS_QUEUE_POLICIES``):
+
+- ``coalesce`` (STATUS, ANALYTICS): a queued message with the same shape (and,
+  for analytics, the same ``analysis_type``) is replaced by the newer one, so
+  the client gets the latest value of each; leaderboard
+  deltas are merged row by row instead so no change is lost
+- ``reliable`` (ACKNOWLEDGMENT, ERROR): never dropped; past twice the queue
+  size the client is disconnected instead (it resends unacknowledged batches
+  on reconnect, and ingest deduplicates them)
+- ``drop`` (everything else): dropped while the queue is full
+
+A socket that cannot take a single message within ``WS_SEND_TIMEOUT`` is
+disconnected.
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from fastapi import WebSocket
+
+from app.core.config import settings
+from app.schemas import WSMessage
+from app.db import get_ws_connections_collection
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+active_connections_gauge = metrics.gauge("ws_active_connections", "Open WebSocket connections")
+send_queue_depth = metrics.gauge("ws_send_queue_depth", "Outbound messages waiting per connection")
+messages_coalesced = metrics.counter("ws_messages_coalesced_total", "Queued messages replaced by a newer one")
+messages_dropped = metrics.counter("ws_messages_dropped_total", "Outbound messages dropped for slow clients")
+slow_consumer_disconnects = metrics.counter("ws_slow_consumer_disconnects_total", "Sockets closed for falling behind")
+
+COALESCE = "coalesce"
+RELIABLE = "reliable"
+DROP = "drop"
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def message_policy(message: WSMessage) -> str:
+    return settings.WS_QUEUE_POLICIES.get(message.type.value, DROP)
+
+
+def _coalesce_key(message: WSMessage) -> tuple:
+    """Messages of the same type, session, analysis type and data fields supersede each other"""
+    data = message.data or {}
+    return (message.type, message.session_id, data.get("analysis_type"), tuple(sorted(data)))
+
+
+def _merge(queued: WSMessage, newer: WSMessage) -> WSMessage:
+    """Latest value wins, except leaderboard deltas, which merge per row"""
+    queued_rows = (queued.data or {}).get("leaderboard_delta")
+    newer_rows = (newer.data or {}).get("leaderboard_delta")
+    if queued_rows is None or newer_rows is None:
+        return newer
+    rows = {row["session_id"]: row for row in queued_rows}
+    rows.update((row["session_id"], row) for row in newer_rows)
+    return newer.model_copy(update={"data": {**newer.data, "leaderboard_delta": list(rows.values())}})
+
+
+class OutboundQueue:
+    """Bounded send queue for one socket, drained by its writer task"""
+
+    def __init__(self, websocket: WebSocket, connection_id: str, kind: str):
+        self.websocket = websocket
+        self.connection_id = connection_id
+        self.kind = kind
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self._items: "OrderedDict[Any, WSMessage]" = OrderedDict()
+        self._sequence = itertools.count()
+        self._ready = asyncio.Event()
+        self._waiting_since: Optional[float] = None
+        self._writer = asyncio.create_task(self._run())
+        self._closer: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def enqueue(self, message: WSMessage) -> bool:
+        """Queue a message without waiting; False when it was dropped"""
+        if self.closed:
+            return False
+        if message.timestamp is None:
+            message.timestamp = now_ms()
+
+        policy = message_policy(message)
+        if policy == COALESCE:
+            key = _coalesce_key(message)
+            queued = self._items.get(key)
+            if queued is not None:
+                self._items[key] = _merge(queued, message)
+                self.coalesced += 1
+                messages_coalesced.inc(type=message.type.value)
+                return True
+        else:
+            key = next(self._sequence)
+
+        if len(self._items) >= settings.WS_SEND_QUEUE_SIZE:
+            if policy != RELIABLE:
+                self.dropped += 1
+                messages_dropped.inc(type=message.type.value)
+                return False
+            if len(self._items) >= 2 * settings.WS_SEND_QUEUE_SIZE:
+                self._disconnect("overflow")
+                return False
+
+        if not self._items:
+            self._waiting_since = time.monotonic()
+        self._items[key] = message
+        send_queue_depth.set(len(self._items), connection=self.connection_id, kind=self.kind)
+        self._ready.set()
+        return True
+
+    async def _run(self):
+        try:
+            while True:
+                if not self._items:
+                    self._waiting_since = None
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+
+                _, message = self._items.popitem(last=False)
+                payload = message.model_dump_json(exclude_none=True)
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(payload), settings.WS_SEND_TIMEOUT)
+                except asyncio.TimeoutError:
+                    self._disconnect("stalled")
+                    return
+                self.sent += 1
+                self._waiting_since = time.monotonic() if self._items else None
+                send_queue_depth.set(len(self._items), connection=self.connection_id, kind=self.kind)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The socket is gone; the reader side notices and unregisters it
+            logger.debug(f"WebSocket writer for {self.connection_id} stopped: {e}")
+            self.closed = True
+
+    def _disconnect(self, reason: str):
+        if self.closed:
+            return
+        self.closed = True
+        slow_consumer_disconnects.inc(reason=reason)
+        logger.warning(f"Disconnecting slow WebSocket {self.connection_id} ({self.kind}, {reason}): "
+                       f"{len(self._items)} messages queued")
+        self._closer = asyncio.create_task(self._close())
+
+    async def _close(self):
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        try:
+            await asyncio.wait_for(self.websocket.close(code=1013), 1.0)  # Try again later
+        except Exception:
+            pass
+
+    def stop(self):
+        self.closed = True
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        self._items.clear()
+        send_queue_depth.clear(connection=self.connection_id, kind=self.kind)
+
+    def stats(self) -> dict:
+        waiting = self._waiting_since
+        return {
+            "connection_id": self.connection_id,
+            "kind": self.kind,
+            "depth": len(self._items),
+            "waiting_ms": round((time.monotonic() - waiting) * 1000, 1) if waiting else 0.0,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "closed": self.closed,
+        }
+
+
+class ConnectionManager:
+    def __init__(self):
+        # session_id -> open sockets for that session
+        self.active_connections: Dict[str, Set[WebSocket]] = {}
+        self.connection_ids: Dict[WebSocket, str] = {}
+        # contest_id -> host dashboards subscribed to that contest
+        self.contest_subscribers: Dict[str, Set[WebSocket]] = {}
+        self.queues: Dict[WebSocket, OutboundQueue] = {}
+        # Called when the set of subscribed contests changes (the change-stream watcher)
+        self.contest_listeners: List[Callable[[], None]] = []
+        # True while change streams feed contest pushes, so writers need not push themselves
+        self.change_stream_fanout = False
+
+    @property
+    def connection_count(self) -> int:
+        return len(self.connection_ids) + sum(len(sockets) for sockets in self.contest_subscribers.values())
+
+    async def connect(self, websocket: WebSocket, session_id: str, user: dict,
+                      contest_id: Optional[str] = None) -> Optional[str]:
+        """Accept a socket and register it; returns None when over capacity"""
+        if self.connection_count >= settings.WS_MAX_CONNECTIONS:
+            await websocket.close(code=1013)  # Try again later
+            logger.warning(f"Rejected WebSocket for session {session_id}: connection limit reached")
+            return None
+
+        await websocket.accept()
+        connection_id = str(uuid.uuid4())
+        self.active_connections.setdefault(session_id, set()).add(websocket)
+        self.connection_ids[websocket] = connection_id
+        self.queues[websocket] = OutboundQueue(websocket, connection_id, "session")
+        active_connections_gauge.set(self.connection_count)
+
+        try:
+            connections_collection = await get_ws_connections_collection()
+            now = datetime.utcnow()
+            await connections_collection.insert_one({
+                "_id": connection_id,
+                "session_id": session_id,
+                "user_id": str(user["_id"]),
+                "contest_id": contest_id,
+                "connected_at": now,
+                "last_ping": now,
+                "status": "active",
+            })
+        except Exception as e:
+            logger.warning(f"Failed to record WebSocket connection: {e}")
+
+        return connection_id
+
+    async def disconnect(self, websocket: WebSocket, session_id: str):
+        sockets = self.active_connections.get(session_id)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                del self.active_connections[session_id]
+        connection_id = self.connection_ids.pop(websocket, None)
+        self._stop_queue(websocket)
+        active_connections_gauge.set(self.connection_count)
+
+        if connection_id:
+            try:
+                connections_collection = await get_ws_connections_collection()
+                await connections_collection.delete_one({"_id": connection_id})
+            except Exception as e:
+                logger.warning(f"Failed to remove WebSocket connection record: {e}")
+
+    async def subscribe_contest(self, websocket: WebSocket, contest_id: str) -> bool:
+        """Accept a host dashboard socket for contest-wide pushes"""
+        if self.connection_count >= settings.WS_MAX_CONNECTIONS:
+            await websocket.close(code=1013)  # Try again later
+            logger.warning(f"Rejected dashboard WebSocket for contest {contest_id}: connection limit reached")
+            return False
+
+        await websocket.accept()
+        if contest_id not in self.contest_subscribers:
+            self._contests_changed()
+        self.contest_subscribers.setdefault(contest_id, set()).add(websocket)
+        self.queues[websocket] = OutboundQueue(websocket, str(uuid.uuid4()), "dashboard")
+        active_connections_gauge.set(self.connection_count)
+        return True
+
+    def unsubscribe_contest(self, websocket: WebSocket, contest_id: str):
+        sockets = self.contest_subscribers.get(contest_id)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                del self.contest_subscribers[contest_id]
+                self._contests_changed()
+        self._stop_queue(websocket)
+        active_connections_gauge.set(self.connection_count)
+
+    def _contests_changed(self):
+        for listener in self.contest_listeners:
+            listener()
+
+    def _stop_queue(self, websocket: WebSocket):
+        queue = self.queues.pop(websocket, None)
+        if queue is not None:
+            queue.stop()
+
+    def has_contest_subscribers(self, contest_id: str) -> bool:
+        return contest_id in self.contest_subscribers
+
+    async def touch(self, websocket: WebSocket):
+        """Refresh last_ping so the TTL index keeps the connection record"""
+        connection_id = self.connection_ids.get(websocket)
+        if not connection_id:
+            return
+        try:
+            connections_collection = await get_ws_connections_collection()
+            await connections_collection.update_one(
+                {"_id": connection_id}, {"$set": {"last_ping": datetime.utcnow()}}
+            )
+        except Exception as e:
+            logger.warning(f"Failed to refresh WebSocket heartbeat: {e}")
+
+    async def send_message(self, websocket: WebSocket, message: WSMessage):
+        """Queue a message for the socket's writer (sent directly if it has no queue)"""
+        queue = self.queues.get(websocket)
+        if queue is not None:
+            queue.enqueue(message)
+            return
+        if message.timestamp is None:
+            message.timestamp = now_ms()
+        await websocket.send_text(message.model_dump_json(exclude_none=True))
+
+    def queue_stats(self) -> List[dict]:
+        """Outbound queue state per connection, deepest first"""
+        return sorted((queue.stats() for queue in self.queues.values()), key=lambda row: -row["depth"])
+
+    async def broadcast_to_session(self, session_id: str, message: WSMessage):
+        for websocket in list(self.active_connections.get(session_id, ())):
+            try:
+                await self.send_message(websocket, message)
+            except Exception as e:
+                logger.warning(f"Broadcast to session {session_id} failed: {e}")
+
+    async def broadcast_to_contest(self, contest_id: str, message: WSMessage):
+        for websocket in list(self.contest_subscribers.get(contest_id, ())):
+            try:
+                await self.send_message(websocket, message)
+            except Exception as e:
+                logger.warning(f"Broadcast to contest {contest_id} failed: {e}")
+
+
+# Global connection manager
+manager = ConnectionManager()
@@ -0,0 +1,197 @@
+"""
+Wire formats for event batches.
+
+Batches may arrive gzip- or zstd-compressed, and either as the regular
+``SessionEventBatch`` JSON or in a compact encoding::
+
+    {
+        "v": 1,
+        "s": session_id, "u": user_id, "c": contest_id, "l": language,
+        "b": batch_id, "q": sequence, "a": client_analytics,
+        "t0": first_timestamp_ms,
+        "e": [[delta_ms, type_code, data?, analysis?], ...]
+    }
+
+``delta_ms`` is relative to the previous event (the first one to ``t0``),
+``type_code`` indexes ``EVENT_TYPES`` and ``data`` is a positional array in
+``DATA_FIELDS`` order with trailing nulls trimmed.
+
+The format is chosen by the sender, never guessed from the body: REST
+clients send the compact encoding with ``Content-Type:
+application/x-compact-events+json`` and WebSocket clients connect with
+``?format=compact``. Everything else is parsed as regular JSON.
+
+The compact encoding is a bandwidth trade, not a CPU one. For 1k typing
+events (``benchmarks/bench_wire_format.py``) it is 43% smaller than JSON
+uncompressed and 22% smaller under zstd, which matters for editors on slow
+or metered links. Decoding costs about 2-3 ms (15-25%) more per 1k events
+than JSON, because the rows are expanded in Python before the same pydantic
+validation runs. Clients that can compress but care about server CPU should send zstd
+JSON.
+"""
+
+import io
+import json
+import zlib
+from typing import List, Optional
+
+import zstandard
+
+from app.core.config import settings
+from app.schemas import EventType, SessionEventBatch
+
+COMPACT_CONTENT_TYPE = "application/x-compact-events+json"
+COMPACT_VERSION = 1
+COMPACT_FORMAT = "compact"
+JSON_FORMAT = "json"
+
+# Codes are part of the wire protocol: only ever append to these lists
+EVENT_TYPES: List[EventType] = list(EventType)
+EVENT_TYPE_CODES = {event_type: code for code, event_type in enumerate(EVENT_TYPES)}
+EVENT_TYPE_COUNT = len(EVENT_TYPES)
+DATA_FIELDS = [
+    "content", "position", "selection", "changes",
+    "length", "cursor_position", "scroll_top", "scroll_left",
+]
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+class WireFormatError(ValueError):
+    """Raised when a payload cannot be decoded"""
+
+
+class PayloadTooLarge(WireFormatError):
+    """Raised when a payload decompresses past WIRE_MAX_DECOMPRESSED_BYTES"""
+
+
+def sniff_encoding(body: bytes) -> Optional[str]:
+    """Detect compression from magic bytes (used for WebSocket binary frames)"""
+    if body.startswith(GZIP_MAGIC):
+        return "gzip"
+    if body.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return None
+
+
+def decompress_body(body: bytes, encoding: Optional[str], limit: Optional[int] = None) -> bytes:
+    """Undo Content-Encoding, refusing output larger than the configured limit"""
+    limit = limit or settings.WIRE_MAX_DECOMPRESSED_BYTES
+    encoding = (encoding or "identity").strip().lower()
+
+    if encoding == "identity":
+        data = body
+    elif encoding in ("gzip", "x-gzip"):
+        try:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            data = decompressor.decompress(body, limit + 1)
+        except zlib.error as e:
+            raise WireFormatError(f"Invalid gzip body: {e}")
+    elif encoding == "zstd":
+        try:
+            reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body))
+            data = reader.read(limit + 1)
+        except zstandard.ZstdError as e:
+            raise WireFormatError(f"Invalid zstd body: {e}")
+    else:
+        raise WireFormatError(f"Unsupported content encoding: {encoding}")
+
+    if len(data) > limit:
+        raise PayloadTooLarge(f"Decompressed body exceeds {limit} bytes")
+    return data
+
+
+def _decode_data(values):
+    if values is None or isinstance(values, dict):
+        return values
+    if len(values) > len(DATA_FIELDS):
+        raise WireFormatError("Too many event data fields")
+    return dict(zip(DATA_FIELDS, values))
+
+
+def decode_compact(payload: dict) -> SessionEventBatch:
+    """Decode the compact encoding straight into a SessionEventBatch
+
+    Rows are expanded into plain dicts and validated in a single
+    ``model_validate`` call, so the per-event work stays in pydantic-core.
+    Invalid fields raise the same ``ValidationError`` as a regular JSON batch.
+    """
+    if payload.get("v") != COMPACT_VERSION:
+        raise WireFormatError(f"Unsupported compact encoding version: {payload.get('v')}")
+
+    try:
+        timestamp = int(payload.get("t0", 0))
+        events = []
+        for row in payload["e"]:
+            timestamp += row[0]
+            code = row[1]
+            if not 0 <= code < EVENT_TYPE_COUNT:
+                raise WireFormatError(f"Unknown event type code: {code}")
+            event = {"t": timestamp, "type": EVENT_TYPES[code]}
+            if len(row) > 2:
+                event["data"] = _decode_data(row[2])
+                if len(row) > 3:
+                    event["analysis"] = row[3]
+            events.append(event)
+    except (KeyError, IndexError, TypeError) as e:
+        raise WireFormatError(f"Malformed compact batch: {e}")
+
+    return SessionEventBatch.model_validate({
+        "session_id": payload.get("s"),
+        "user_id": payload.get("u"),
+        "contest_id": payload.get("c"),
+        "language": payload.get("l") or "javascript",
+        "events": events,
+        "client_analytics": payload.get("a"),
+        "batch_id": payload.get("b"),
+        "sequence": payload.get("q"),
+    })
+
+
+def encode_compact(batch: SessionEventBatch) -> dict:
+    """Encode a batch in the compact representation (inverse of decode_compact)"""
+    rows = []
+    t0 = batch.events[0].t if batch.events else 0
+    previous = t0
+    for event in batch.events:
+        row = [event.t - previous, EVENT_TYPE_CODES[event.type]]
+        previous = event.t
+        if event.data is not None or event.analysis is not None:
+            data = None
+            if event.data is not None:
+                data = [getattr(event.data, field) for field in DATA_FIELDS]
+                while data and data[-1] is None:
+                    data.pop()
+            row.append(data)
+        if event.analysis is not None:
+            row.append(event.analysis)
+        rows.append(row)
+
+    payload = {"v": COMPACT_VERSION, "s": batch.session_id, "u": batch.user_id, "t0": t0, "e": rows}
+    optional = {
+        "c": batch.contest_id, "l": batch.language, "b": batch.batch_id,
+        "q": batch.sequence, "a": batch.client_analytics,
+    }
+    payload.update({key: value for key, value in optional.items() if value is not None})
+    return payload
+
+
+def is_compact_content_type(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.split(";")[0].strip().lower() == COMPACT_CONTENT_TYPE
+
+
+def parse_event_batch(body: bytes, content_type: Optional[str] = None,
+                      content_encoding: Optional[str] = None) -> SessionEventBatch:
+    """Decode a (possibly compressed) batch body; compact only when ``content_type`` says so"""
+    raw = decompress_body(body, content_encoding)
+    try:
+        payload = json.loads(raw)
+    except ValueError as e:
+        raise WireFormatError(f"Invalid JSON body: {e}")
+    if not isinstance(payload, dict):
+        raise WireFormatError("Event batch must be a JSON object")
+
+    if is_compact_content_type(content_type):
+        return decode_compact(payload)
+    return SessionEventBatch.model_validate(payload)
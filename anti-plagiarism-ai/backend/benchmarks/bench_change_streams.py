@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+End-to-end check of change-stream dashboard pushes.
+
+Subscribes a fake dashboard socket to a scratch contest, starts the
+change-stream watcher, then writes analytics documents and leaderboard rows
+for that contest and measures the time from each write until the matching
+push reaches the socket. Needs MONGO_URL to point at a replica set (see
+"Local Single-Node Replica Set" in the README); the scratch documents are
+removed afterwards.
+
+Run from the backend directory:
+    python benchmarks/bench_change_streams.py [writes]
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-benchmark-secret-0000")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017/?replicaSet=rs0&directConnection=true")
+os.environ.setdefault("MONGO_DB", "benchmark")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+from app.change_streams import change_stream_watcher
+from app.db import connect_to_mongo, close_mongo_connection, get_analytics_collection, get_leaderboards_collection
+from app.leaderboard import record_results
+from app.schemas import AnalysisResults
+from app.websocket_manager import manager
+
+
+class DashboardSocket:
+    def __init__(self):
+        self.arrivals = {}
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def send_text(self, payload: str):
+        now = time.perf_counter()
+        message = json.loads(payload)
+        data = message.get("data") or {}
+        keys = [row["session_id"] for row in data.get("leaderboard_delta", [])]
+        if message.get("session_id"):
+            keys.append(f"{message['session_id']}:{data.get('analysis_type')}")
+        for key in keys:
+            self.arrivals.setdefault(key, now)
+
+
+async def wait_for(socket: DashboardSocket, keys, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and not all(key in socket.arrivals for key in keys):
+        await asyncio.sleep(0.001)
+
+
+def report(label: str, written: dict, socket: DashboardSocket):
+    latencies = [(socket.arrivals[key] - at) * 1000 for key, at in written.items() if key in socket.arrivals]
+    if not latencies:
+        print(f"  {label:<12} no pushes received")
+        return
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+    print(f"  {label:<12} {len(latencies)}/{len(written)} pushed  p50 {statistics.median(latencies):6.1f} ms  "
+          f"p95 {p95:6.1f} ms")
+
+
+async def main():
+    writes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    contest_id = f"bench-{uuid.uuid4().hex[:8]}"
+    await connect_to_mongo()
+    socket = DashboardSocket()
+    await manager.subscribe_contest(socket, contest_id)
+    await change_stream_watcher.start()
+    if not manager.change_stream_fanout:
+        print("Change streams are unavailable (is MONGO_URL a replica set?)")
+        return
+
+    print(f"📡 Change-stream push benchmark ({writes} writes per collection, contest {contest_id})")
+    await asyncio.sleep(0.5)  # Let the stream open with the new contest filter
+    analytics_collection = await get_analytics_collection()
+    leaderboards_collection = await get_leaderboards_collection()
+    try:
+        written = {}
+        for i in range(writes):
+            session_id = f"{contest_id}-s{i}"
+            written[f"{session_id}:typing_pattern"] = time.perf_counter()
+            await analytics_collection.insert_one({
+                "_id": str(uuid.uuid4()),
+                "session_id": session_id,
+                "user_id": f"user-{i}",
+                "contest_id": contest_id,
+                "analysis_type": "typing_pattern",
+                "results": {"confidence_score": 0.5, "risk_level": "medium", "flags": []},
+                "processed_at": datetime.utcnow(),
+            })
+        await wait_for(socket, written)
+        report("analytics", written, socket)
+
+        written = {}
+        for i in range(writes):
+            session_id = f"{contest_id}-lb{i}"
+            written[session_id] = time.perf_counter()
+            await record_results(contest_id, [{
+                "session_id": session_id,
+                "user_id": f"user-{i}",
+                "results": AnalysisResults(confidence_score=0.9, risk_level="high", flags=["bench"]),
+            }], "benchmark")
+        await wait_for(socket, written)
+        report("leaderboard", written, socket)
+    finally:
+        await analytics_collection.delete_many({"contest_id": contest_id})
+        await leaderboards_collection.delete_many({"contest_id": contest_id})
+        manager.unsubscribe_contest(socket, contest_id)
+        await change_stream_watcher.stop()
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark session compaction on a synthetic completed session.
+
+Builds events shaped like the documents ingest writes, folds them into
+chunks exactly as ``app.compaction`` does, and reports raw versus compacted
+BSON bytes, encode/decode throughput, and whether the final code rebuilt
+from the decoded chunks matches a naive rebuild. The Mongo-side index bytes
+per session are only measured by a real compaction (see
+``GET /analysis/sessions/{id}/compaction``).
+
+Run from the backend directory:
+    python benchmarks/bench_compaction.py [events]
+"""
+
+import os
+import sys
+import time
+from datetime import datetime
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-benchmark-secret-0000")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB", "benchmark")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+from bench_reconstruction import make_events
+
+from app.compaction import SummaryBuilder, _build_chunk
+from app.core.config import settings
+from app.reconstruction import DocumentTimeline, decode_event_chunk, rebuild_naive
+
+
+def ingest_documents(edits: int):
+    now = datetime.utcnow()
+    documents = []
+    for i, event in enumerate(make_events(edits)):
+        documents.append({
+            "_id": ObjectId(),
+            "session_id": "bench-session",
+            "user_id": "bench-user",
+            "contest_id": "bench-contest",
+            "language": "python",
+            "event_type": "paste" if len(event["data"]["changes"][0]["text"]) > 20 else "keypress",
+            "timestamp": event["timestamp"],
+            "data": event["data"],
+            "analysis": None,
+            "batch_id": f"batch-{i // 50}",
+            "sequence": i // 50,
+            "processed": False,
+            "created_at": now,
+        })
+    return documents
+
+
+def main():
+    edits = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    size = settings.COMPACTION_CHUNK_EVENTS
+    documents = ingest_documents(edits)
+    session = {"session_id": "bench-session", "user_id": "bench-user", "contest_id": "bench-contest"}
+    print(f"🗜️  Compaction benchmark ({edits} events, {size} per chunk, zstd level {settings.COMPACTION_COMPRESSION_LEVEL})")
+
+    started = time.perf_counter()
+    chunks, raw_bytes = [], 0
+    for seq, start in enumerate(range(0, len(documents), size)):
+        chunk, raw = _build_chunk(session, seq, documents[start:start + size])
+        chunks.append(chunk)
+        raw_bytes += raw
+    encode_s = time.perf_counter() - started
+    compacted_bytes = sum(len(chunk["data"]) for chunk in chunks)
+
+    started = time.perf_counter()
+    decoded = [event for chunk in chunks for event in decode_event_chunk(chunk["data"])]
+    decode_s = time.perf_counter() - started
+
+    summary = SummaryBuilder()
+    summary.add(decoded)
+    timeline = DocumentTimeline()
+    timeline.apply_events(decoded)
+    matches = timeline.text() == rebuild_naive(documents)
+
+    print(f"  raw events     {raw_bytes / 1e6:8.2f} MB in {len(documents)} documents")
+    print(f"  chunks         {compacted_bytes / 1e6:8.2f} MB in {len(chunks)} documents "
+          f"({raw_bytes / compacted_bytes:.1f}x smaller)")
+    print(f"  encode         {raw_bytes / 1e6 / encode_s:8.1f} MB/s   decode {raw_bytes / 1e6 / decode_s:8.1f} MB/s")
+    print(f"  summary        {summary.build([]).model_dump(exclude={'pause_patterns'})}")
+    print(f"  final code     {'matches' if matches else 'DIFFERS from'} naive rebuild")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark paste matching against the known-solutions corpus index.
+
+Builds a synthetic corpus in a temporary directory, indexes it, compacts it
+into the memory-mapped base, adds a few documents incrementally, and then
+times lookups for pastes copied from corpus documents and for unrelated code.
+
+Run from the backend directory:
+    python benchmarks/bench_corpus.py [documents] [pastes]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-benchmark-secret-0000")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB", "benchmark")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+from app.core.config import settings
+from app.corpus import CorpusIndex
+from bench_similarity import make_program
+
+
+def main():
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    pastes = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    rng = random.Random(11)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir = os.path.join(tmp, "corpus")
+        os.makedirs(corpus_dir)
+        programs = [make_program(rng) for _ in range(documents)]
+        for i, code in enumerate(programs):
+            with open(os.path.join(corpus_dir, f"solution_{i:06d}.js"), "w") as f:
+                f.write(code)
+
+        print(f"📚 Corpus benchmark: {documents:,} documents, {pastes:,} pastes")
+        index = CorpusIndex(os.path.join(tmp, "index"), settings.CORPUS_KGRAM, settings.CORPUS_WINDOW)
+        start = time.perf_counter()
+        index.open()
+        index.sync_directory(corpus_dir)
+        index.compact()
+        print(f"  build + compact        {time.perf_counter() - start:8.2f} s  "
+              f"({index.stats()['base_fingerprints']:,} fingerprints after dropping boilerplate)")
+
+        extra = [make_program(rng) for _ in range(100)]
+        start = time.perf_counter()
+        index.add_documents([(f"extra_{i}.js", code, None) for i, code in enumerate(extra)])
+        print(f"  incremental add        {(time.perf_counter() - start) * 1000:8.1f} ms for {len(extra)} documents")
+
+        reopened = CorpusIndex(index.index_dir, settings.CORPUS_KGRAM, settings.CORPUS_WINDOW)
+        reopened.open()
+
+        sources = programs + extra
+        copied = []
+        for _ in range(pastes):
+            lines = rng.choice(sources).split("\n")
+            start_line = rng.randrange(len(lines) - 15)
+            copied.append("\n".join(lines[start_line:start_line + 15]))
+        unrelated = [make_program(rng, 15) for _ in range(pastes)]
+
+        for label, batch in (("copied pastes", copied), ("unrelated pastes", unrelated)):
+            matched = 0
+            start = time.perf_counter()
+            for paste in batch:
+                if reopened.match(paste) is not None:
+                    matched += 1
+            per_paste_us = (time.perf_counter() - start) * 1_000_000 / len(batch)
+            print(f"  {label:<22} {per_paste_us:8.1f} us per paste, {matched / len(batch):6.1%} matched")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark streaming exports.
+
+Feeds synthetic analytics documents through the export encoders the way a
+Motor cursor would and reports MB/s and peak RSS per format. Peak RSS should
+stay flat as the row count grows: only one batch is ever held in memory.
+
+Run from the backend directory:
+    python benchmarks/bench_export.py [rows]
+"""
+
+import asyncio
+import os
+import random
+import resource
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-benchmark-secret-0000")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB", "benchmark")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+from app.export import parquet_available, stream_export
+from app.schemas import ExportDataset, ExportFormat
+
+FLAGS = ["high_copy_paste_frequency", "low_typing_speed", "frequent_focus_changes", "typing_profile_mismatch"]
+
+
+async def fake_cursor(rows: int):
+    rng = random.Random(9)
+    start = datetime(2026, 1, 1)
+    for i in range(rows):
+        yield {
+            "_id": f"{i:024x}",
+            "session_id": f"session-{i}",
+            "user_id": f"user-{i % 5000}",
+            "contest_id": "contest-1",
+            "analysis_type": "similarity",
+            "results": {
+                "confidence_score": rng.random(),
+                "risk_level": rng.choice(["low", "medium", "high", "critical"]),
+                "flags": rng.sample(FLAGS, rng.randrange(3)),
+                "patterns": {"source": "similarity_clusters"},
+            },
+            "processed_at": start + timedelta(seconds=i),
+            "version": "1.0",
+        }
+        if i % 1000 == 0:
+            await asyncio.sleep(0)  # Cursor batches are awaited in the real thing
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run(export_format: ExportFormat, rows: int):
+    size = 0
+    start = time.perf_counter()
+    async for chunk in stream_export(fake_cursor(rows), ExportDataset.ANALYTICS, export_format):
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    mb = size / (1024 * 1024)
+    print(f"  {export_format.value:<8} {mb:8.1f} MB in {elapsed:5.2f}s  {mb / elapsed:6.1f} MB/s  "
+          f"{rows / elapsed:9.0f} rows/s  peak RSS {peak_rss_mb():6.1f} MB")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    print(f"📤 Export benchmark ({rows:,} analytics rows)")
+    print(f"  baseline peak RSS {peak_rss_mb():.1f} MB")
+    for export_format in ExportFormat:
+        if export_format == ExportFormat.PARQUET and not parquet_available():
+            print("  parquet  skipped (pyarrow not installed)")
+            continue
+        asyncio.run(run(export_format, rows))
+
+
+if __name__ == "__main__":
+    main()
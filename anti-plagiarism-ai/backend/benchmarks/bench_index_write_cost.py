@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark ingest throughput with the current and the recommended index sets.
+
+Builds two scratch copies of ``events`` and ``sessions``, one with every
+index from ``app.db.INDEXES`` and one with the indexes the audit keeps, then
+inserts the same synthetic event batches into each (``insert_many`` with
+``ordered=False``, like the ingest path) and reports documents per second and
+index bytes per document. The recommendation comes from a live audit of
+MONGO_DB when that database has index usage to go on (ideally with
+INDEX_AUDIT_ENABLED on a server that has served real traffic), otherwise from
+the offline prefix-redundancy check. Needs MongoDB; scratch collections are
+dropped afterwards.
+
+Run from the backend directory:
+    python benchmarks/bench_index_write_cost.py [events] [batch_size]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-benchmark-secret-0000")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB", "benchmark")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+from app.db import INDEXES, connect_to_mongo, close_mongo_connection, get_database
+from app.index_audit import analyze, audit_indexes, defined_indexes, recommended_indexes
+
+EVENT_TYPES = ["keypress", "keypress", "keypress", "paste", "focus", "blur", "run"]
+
+
+def event_batches(total: int, batch_size: int):
+    rng = random.Random(45)
+    now = datetime.utcnow()
+    for start in range(0, total, batch_size):
+        session = rng.randrange(2000)
+        yield [{
+            "session_id": f"session-{session}",
+            "user_id": f"user-{session % 500}",
+            "contest_id": f"contest-{session % 20}",
+            "language": "python",
+            "event_type": rng.choice(EVENT_TYPES),
+            "timestamp": start + i,
+            "data": {"key": "a", "position": {"line": i % 80, "column": i % 40}},
+            "analysis": None,
+            "batch_id": f"batch-{start}",
+            "sequence": start // batch_size,
+            "processed": False,
+            "created_at": now,
+        } for i in range(min(batch_size, total - start))]
+
+
+def session_batches(total: int, batch_size: int):
+    now = datetime.utcnow()
+    for start in range(0, total, batch_size):
+        yield [{
+            "session_id": f"session-{start + i}",
+            "user_id": f"user-{(start + i) % 500}",
+            "contest_id": f"contest-{(start + i) % 20}",
+            "language": "python",
+            "status": "active",
+            "created_at": now,
+        } for i in range(min(batch_size, total - start))]
+
+
+async def recommendation(collection: str):
+    reports = await audit_indexes(collection)
+    live = reports[0] if reports else None
+    if live and any(entry["ops"] for entry in live["indexes"]):
+        return recommended_indexes(collection, live), "live audit"
+    report = analyze(collection, defined_indexes(collection), [], live=False)
+    return recommended_indexes(collection, report), "offline prefix check"
+
+
+async def run(collection: str, label: str, indexes, batches) -> dict:
+    database = await get_database()
+    scratch = database[f"bench_{collection}_{label}"]
+    await scratch.drop()
+    if indexes:
+        await scratch.create_indexes(indexes)
+    inserted = 0
+    started = time.perf_counter()
+    for batch in batches:
+        await scratch.insert_many(batch, ordered=False)
+        inserted += len(batch)
+    elapsed = time.perf_counter() - started
+    stats = await database.command("collStats", scratch.name)
+    await scratch.drop()
+    return {
+        "rate": inserted / elapsed,
+        "indexes": stats.get("nindexes", 0),
+        "index_bytes_per_doc": stats.get("totalIndexSize", 0) / max(inserted, 1),
+    }
+
+
+async def main():
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    await connect_to_mongo()
+    print(f"🗂️  Index write-cost benchmark ({events} events in batches of {batch_size})")
+    try:
+        for collection, batches in (("events", event_batches), ("sessions", session_batches)):
+            total = events if collection == "events" else events // 10
+            recommended, source = await recommendation(collection)
+            dropped = sorted({model.document["name"] for model in INDEXES[collection]}
+                             - {model.document["name"] for model in recommended})
+            print(f"  {collection} ({total} docs), recommendation from {source}; "
+                  f"drops: {', '.join(dropped) or 'none'}")
+            current = await run(collection, "current", INDEXES[collection], batches(total, batch_size))
+            proposed = await run(collection, "recommended", recommended, batches(total, batch_size))
+            for label, result in (("current", current), ("recommended", proposed)):
+                print(f"    {label:<12} {result['indexes']:>2} indexes  {result['rate']:9.0f} docs/s  "
+                      f"{result['index_bytes_per_doc']:6.1f} index B/doc")
+            print(f"    speedup      {proposed['rate'] / current['rate']:.2f}x")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
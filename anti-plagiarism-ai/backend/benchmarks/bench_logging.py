@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark logging overhead on the calling thread.
+
+Simulates the log calls of a login burst (a success line plus a failed-login
+warning per request) and reports the time each request spends in logging on
+the caller's thread (the event loop, in the app). It compares:
+
+- ``basicConfig``: a synchronous StreamHandler and f-string messages
+- ``pipeline``: the queued pipeline from ``app.core.logs`` with lazy
+  formatting and rate limiting
+
+Each is measured against a fast sink (a file) and a slow one (a sink that
+takes 200 µs per write, like stderr piped into a busy log driver).
+
+Run from the backend directory:
+    python benchmarks/bench_logging.py [requests]
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-benchmark-secret-0000")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB", "benchmark")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+from app.core import logs
+from app.core.config import settings
+
+
+class SlowFile:
+    def __init__(self, f, delay: float):
+        self.f = f
+        self.delay = delay
+
+    def write(self, text: str):
+        deadline = time.perf_counter() + self.delay
+        while time.perf_counter() < deadline:
+            pass
+        return self.f.write(text)
+
+    def flush(self):
+        self.f.flush()
+
+
+def run_requests(logger: logging.Logger, requests: int, lazy: bool) -> float:
+    start = time.perf_counter()
+    for i in range(requests):
+        username, ip = f"student{i % 2000}", f"10.0.{i % 250}.{i % 200}"
+        if lazy:
+            logger.warning("Failed login attempt: %s (%s) from %s", username, "student", ip)
+            logger.info("User logged in successfully: %s (%s)", username, "student")
+        else:
+            logger.warning(f"Failed login attempt: {username} (student) from {ip}")
+            logger.info(f"User logged in successfully: {username} (student)")
+    return time.perf_counter() - start
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in root.handlers:
+        handler.close()
+    root.handlers = []
+
+
+def bench_basic(stream, requests: int) -> float:
+    reset_root()
+    logging.basicConfig(level=logging.INFO, stream=stream, force=True)
+    elapsed = run_requests(logging.getLogger("app.routes.auth_routes"), requests, lazy=False)
+    reset_root()
+    return elapsed
+
+
+def bench_pipeline(stream, requests: int) -> float:
+    reset_root()
+    original = sys.stderr
+    sys.stderr = stream
+    try:
+        logs.setup_logging()
+    finally:
+        sys.stderr = original
+    elapsed = run_requests(logging.getLogger("app.routes.auth_routes"), requests, lazy=True)
+    logs.stop_logging()
+    reset_root()
+    return elapsed
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"🪵 Logging benchmark ({requests:,} login requests, 2 log calls each, "
+          f"rate limit {settings.LOG_RATE_LIMIT_BURST}/{settings.LOG_RATE_LIMIT_WINDOW:g}s)")
+    with tempfile.TemporaryFile("w") as f:
+        for sink_name, stream, count in (("file", f, requests), ("slow sink", SlowFile(f, 0.0002), requests // 10)):
+            basic = bench_basic(stream, count)
+            pipeline = bench_pipeline(stream, count)
+            print(f"  {sink_name:<10} basicConfig {basic / count * 1e6:7.1f} µs/request   "
+                  f"pipeline {pipeline / count * 1e6:6.1f} µs/request   ({basic / pipeline:.1f}x less)")
+
+
+if __name__ == "__main__":
+    main()
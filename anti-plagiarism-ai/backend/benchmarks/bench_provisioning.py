@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Benchmark roster password hashing.
+
+Compares hashing a roster one password at a time at the normal bcrypt cost
+(what registering users one by one does) with the provisioning hash pool at
+the same cost, and extrapolates to a 2,000 student roster. The pool scales
+with cores, so run it on a machine shaped like production.
+
+Run from the backend directory:
+    python benchmarks/bench_provisioning.py [rows]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-benchmark-secret-0000")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB", "benchmark")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+from app.auth import get_password_hash
+from app.provisioning import _get_hash_pool, hash_passwords
+
+ROSTER = 2000
+
+
+def report(label: str, rows: int, elapsed: float):
+    per_user = elapsed / rows
+    print(f"  {label:<34} {rows / elapsed:7.1f} users/s  ~{per_user * ROSTER:6.1f}s for {ROSTER:,}")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    passwords = [f"student-password-{i}" for i in range(rows)]
+    print(f"🔐 Provisioning benchmark ({rows} passwords, {os.cpu_count()} CPUs, "
+          f"{_get_hash_pool()._max_workers} hash threads)")
+
+    start = time.perf_counter()
+    for password in passwords:
+        get_password_hash(password)
+    report("serial, policy rounds", rows, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    asyncio.run(hash_passwords(passwords))
+    report("pool, policy rounds", rows, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
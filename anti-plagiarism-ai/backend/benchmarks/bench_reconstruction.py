@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark final-code reconstruction on a synthetic 200k-edit session.
+
+Compares DocumentTimeline (chunked rope + checkpoints) against naive string
+rebuilding, then times random point-in-time lookups.
+
+Run from the backend directory:
+    python benchmarks/bench_reconstruction.py [edits]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-benchmark-secret-0000")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB", "benchmark")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+from app.reconstruction import DocumentTimeline, rebuild_naive
+
+TOKENS = ["a", "b", "x", " ", "\n", "(", ")", "{", "}", ";", "return ", "const ", "i++"]
+
+
+def make_events(edits: int):
+    """Mostly typing near a moving cursor, with deletions and occasional pastes"""
+    random.seed(7)
+    events = []
+    length = 0
+    cursor = 0
+    t = 1_700_000_000_000
+    for _ in range(edits):
+        t += random.randint(30, 300)
+        roll = random.random()
+        if roll < 0.05:
+            cursor = random.randint(0, length)
+        if roll < 0.80 or length == 0:
+            text = random.choice(TOKENS)
+            change = {"rangeOffset": cursor, "rangeLength": 0, "text": text}
+            cursor += len(text)
+            length += len(text)
+        elif roll < 0.98:
+            start = max(0, cursor - random.randint(1, 3))
+            change = {"rangeOffset": start, "rangeLength": cursor - start, "text": ""}
+            length -= cursor - start
+            cursor = start
+        else:
+            text = "function f() {\n  return 42;\n}\n" * random.randint(1, 4)
+            change = {"rangeOffset": cursor, "rangeLength": 0, "text": text}
+            cursor += len(text)
+            length += len(text)
+        events.append({"timestamp": t, "data": {"changes": [change]}})
+    return events
+
+
+def main():
+    edits = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    events = make_events(edits)
+
+    print(f"🧩 Reconstruction benchmark ({edits:,} edits)")
+
+    start = time.perf_counter()
+    expected = rebuild_naive(events)
+    naive_s = time.perf_counter() - start
+    print(f"  naive string rebuild   {naive_s:8.3f} s  ({len(expected):,} chars)")
+
+    start = time.perf_counter()
+    timeline = DocumentTimeline()
+    timeline.apply_events(events)
+    rope_s = time.perf_counter() - start
+    assert timeline.text() == expected, "rope output differs from naive rebuild"
+    print(f"  rope + checkpoints     {rope_s:8.3f} s  ({naive_s / rope_s:.1f}x, "
+          f"{len(timeline.checkpoints)} checkpoints)")
+
+    lookups = 200
+    times = [random.choice(events)["timestamp"] for _ in range(lookups)]
+    start = time.perf_counter()
+    for t in times:
+        timeline.text_at(t)
+    lookup_ms = (time.perf_counter() - start) * 1000 / lookups
+    print(f"  text_at(t) lookup      {lookup_ms:8.3f} ms average")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Exercise the shared Redis client against an in-process fake Redis.
+
+The fake (tests/fake_redis.py) answers SADD/SREM/EXPIRE/GET/SET/PING with a
+fixed simulated round-trip time and can be switched into an outage (every
+round-trip hangs for a while, then fails). The script reports:
+
+- auto-pipelining: round-trips and wall time for concurrent dedupe checks,
+  versus one round-trip per command
+- circuit breaker: per-call latency while Redis is down, before and after the
+  circuit opens, and recovery once Redis is back
+
+No Redis server is needed. Pass a real REDIS_URL and ``--real`` to run the
+pipelining part against a live server instead. The behaviour itself is
+asserted by tests/test_redis_client.py; this script only reports numbers.
+
+Run from the backend directory:
+    python benchmarks/bench_redis_client.py [concurrent_calls] [--real]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-benchmark-secret-0000")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB", "benchmark")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("REDIS_BREAKER_RESET", "0.5")
+
+from app.dedupe import BatchDeduplicator
+from app.redis_client import redis_client as client, CircuitBreaker
+from tests.fake_redis import FakeRedis
+
+
+async def pipelining(calls: int, real: bool):
+    fake = None if real else FakeRedis()
+    await client.connect(fake)
+    deduplicator = BatchDeduplicator(window=256, max_sessions=0)  # Every check goes to Redis
+
+    started = time.perf_counter()
+    before = fake.roundtrips if fake else 0
+    await asyncio.gather(*(deduplicator.is_duplicate("u", f"s{i}", f"b{i}", i) for i in range(calls)))
+    elapsed = time.perf_counter() - started
+    print(f"  auto-pipelined  {calls * 2} commands  "
+          f"{(fake.roundtrips - before) if fake else '?'} round-trips  {elapsed * 1000:8.1f} ms")
+
+    if fake is not None:
+        started = time.perf_counter()
+        before = fake.roundtrips
+        for i in range(calls):
+            await fake.roundtrip([("SADD", f"dedupe:t{i}", "m")])
+            await fake.roundtrip([("EXPIRE", f"dedupe:t{i}", 60)])
+        elapsed = time.perf_counter() - started
+        print(f"  per command     {calls * 2} commands  {fake.roundtrips - before} round-trips  "
+              f"{elapsed * 1000:8.1f} ms")
+    await client.close()
+
+
+async def outage():
+    fake = FakeRedis()
+    await client.connect(fake)
+    deduplicator = BatchDeduplicator(window=256, max_sessions=50000)
+
+    fake.down = True
+    latencies = []
+    for i in range(20):
+        started = time.perf_counter()
+        await deduplicator.is_duplicate("u", "outage", f"b{i}", None)  # No sequence: Redis decides
+        latencies.append((time.perf_counter() - started) * 1000)
+    threshold = client.breaker.threshold
+    print(f"  Redis down      first {threshold} calls median {statistics.median(latencies[:threshold]):6.2f} ms, "
+          f"then {statistics.median(latencies[threshold:]):6.3f} ms (circuit {client.breaker.state})")
+
+    fake.down = False
+    await asyncio.sleep(client.breaker.reset_timeout)
+    await deduplicator.is_duplicate("u", "outage", "after", None)
+    recovered = client.breaker.state == CircuitBreaker.CLOSED
+    print(f"  Redis back      circuit {client.breaker.state} after one probe "
+          f"({'recovered' if recovered else 'NOT recovered'})")
+    await client.close()
+
+
+async def main():
+    real = "--real" in sys.argv
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    calls = int(args[0]) if args else 1000
+    print(f"🧰 Redis client benchmark ({'live Redis' if real else 'fake Redis'}, {calls} concurrent dedupe checks)")
+    await pipelining(calls, real)
+    if not real:
+        await outage()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
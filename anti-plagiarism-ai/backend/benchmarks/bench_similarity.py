@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark the contest-wide similarity job on synthetic submissions.
+
+Generates N independent programs plus planted collusion groups (copies with
+renamed identifiers and small edits), then runs compute_similarity and
+find_clusters and reports timing and cluster recall.
+
+Run from the backend directory:
+    python benchmarks/bench_similarity.py [submissions] [workers]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-benchmark-secret-0000")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB", "benchmark")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+from app.core.config import settings
+from app.similarity import compute_similarity, find_clusters
+
+NAMES = [f"{stem}{suffix}" for stem in ("arr", "res", "total", "count", "memo", "dp", "left", "right",
+                                         "acc", "tmp", "idx", "val", "node", "seen", "best", "cur")
+         for suffix in ("", "1", "2", "List", "Map", "Sum", "Max", "Min")]
+OPERATORS = ["+", "-", "*", "%", "<", ">", "===", "&&", "||", "<<"]
+CALLS = ["Math.max", "Math.min", "parseInt", "helper", "console.log"]
+
+
+def make_expr(rng: random.Random, depth: int = 0) -> str:
+    roll = rng.random()
+    if depth > 2 or roll < 0.3:
+        return rng.choice(NAMES) if rng.random() < 0.7 else str(rng.randint(0, 999))
+    if roll < 0.45:
+        return f"{rng.choice(NAMES)}[{make_expr(rng, depth + 1)}]"
+    if roll < 0.6:
+        args = ", ".join(make_expr(rng, depth + 1) for _ in range(rng.randint(1, 3)))
+        return f"{rng.choice(CALLS)}({args})"
+    if roll < 0.7:
+        return f"({make_expr(rng, depth + 1)})"
+    return f"{make_expr(rng, depth + 1)} {rng.choice(OPERATORS)} {make_expr(rng, depth + 1)}"
+
+
+def make_statement(rng: random.Random, depth: int = 0) -> str:
+    roll = rng.random()
+    if depth > 1 or roll < 0.4:
+        return f"{rng.choice(['let ', 'const ', ''])}{rng.choice(NAMES)} = {make_expr(rng)};"
+    if roll < 0.55:
+        return f"if ({make_expr(rng)}) {{ {make_statement(rng, depth + 1)} }}"
+    if roll < 0.65:
+        return (f"if ({make_expr(rng)}) {{ {make_statement(rng, depth + 1)} }} "
+                f"else {{ {make_statement(rng, depth + 1)} }}")
+    if roll < 0.8:
+        a, b = rng.sample(NAMES, 2)
+        return f"for (let {a} = 0; {a} < {b}.length; {a}++) {{ {make_statement(rng, depth + 1)} }}"
+    if roll < 0.88:
+        return f"while ({make_expr(rng)}) {{ {make_statement(rng, depth + 1)} }}"
+    if roll < 0.95:
+        return f"{rng.choice(NAMES)}.push({make_expr(rng)});"
+    return f"return {make_expr(rng)};"
+
+
+def make_program(rng: random.Random, lines: int = 60) -> str:
+    return "\n".join(make_statement(rng) for _ in range(lines))
+
+
+def mutate(rng: random.Random, code: str) -> str:
+    """Rename a couple of identifiers and touch a few lines, like a sloppy copy"""
+    for old in rng.sample(NAMES, 2):
+        code = code.replace(f" {old} ", f" {old}_v2 ")
+    lines = code.split("\n")
+    for _ in range(3):
+        lines[rng.randrange(len(lines))] = make_program(rng, 1)
+    return "\n".join(lines)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    rng = random.Random(3)
+
+    codes = []
+    planted = []
+    while len(codes) < total:
+        base = make_program(rng)
+        if rng.random() < 0.05:
+            group = [len(codes) + offset for offset in range(rng.randint(2, 5))]
+            codes.append(base)
+            codes.extend(mutate(rng, base) for _ in group[1:])
+            planted.append(set(group))
+        else:
+            codes.append(base)
+    codes = codes[:total]
+    planted = [group for group in planted if max(group) < total]
+
+    print(f"🔎 Similarity benchmark: {total:,} submissions, {workers} workers, "
+          f"{len(planted)} planted groups")
+    start = time.perf_counter()
+    matrix = compute_similarity(codes, workers=workers)
+    elapsed = time.perf_counter() - start
+    clusters = find_clusters(len(codes), matrix, settings.SIMILARITY_CLUSTER_THRESHOLD)
+
+    found = [set(cluster) for cluster in clusters]
+    recovered = sum(1 for group in planted if any(group <= cluster for cluster in found))
+    print(f"  matrix: {len(matrix):,} pairs >= {settings.SIMILARITY_REPORT_THRESHOLD} in {elapsed:.2f} s")
+    print(f"  clusters: {len(clusters)} found, {recovered}/{len(planted)} planted groups fully recovered")
+
+
+if __name__ == "__main__":
+    main()
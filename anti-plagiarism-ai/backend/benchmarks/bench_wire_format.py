@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark event batch wire formats: bytes on the wire and decode CPU per 1k events.
+
+Run from the backend directory:
+    python benchmarks/bench_wire_format.py
+"""
+
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-benchmark-secret-0000")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB", "benchmark")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+import zstandard
+
+from app.schemas import SessionEventBatch
+from app.wire import encode_compact, parse_event_batch, COMPACT_CONTENT_TYPE
+
+EVENTS = 1000
+ROUNDS = 50
+
+
+def make_batch(events: int = EVENTS) -> SessionEventBatch:
+    """Typing-heavy batch shaped like the editor's 4-second flushes"""
+    random.seed(42)
+    t = 1_700_000_000_000
+    offset = 0
+    rows = []
+    for _ in range(events):
+        t += random.randint(40, 400)
+        kind = random.random()
+        if kind < 0.85:
+            char = random.choice("abcdefghijklmnopqrstuvwxyz (){};=\n")
+            rows.append({
+                "t": t, "type": "keypress",
+                "data": {
+                    "content": char,
+                    "changes": [{"rangeOffset": offset, "rangeLength": 0, "text": char}],
+                    "cursor_position": offset + 1,
+                },
+            })
+            offset += 1
+        elif kind < 0.95:
+            rows.append({"t": t, "type": "selection", "data": {"selection": {"start": offset, "end": offset}}})
+        else:
+            rows.append({"t": t, "type": random.choice(["focus", "blur"])})
+    return SessionEventBatch.model_validate({
+        "session_id": "bench-session",
+        "user_id": "bench-user",
+        "contest_id": "bench-contest",
+        "events": rows,
+        "batch_id": "b-1",
+        "sequence": 1,
+    })
+
+
+def measure(name: str, body: bytes, content_type=None, content_encoding=None):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        batch = parse_event_batch(body, content_type=content_type, content_encoding=content_encoding)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / ROUNDS
+    per_1k = elapsed_ms * 1000 / len(batch.events)
+    print(f"  {name:<22} {len(body):>9,} bytes  {per_1k:8.2f} ms decode / 1k events")
+
+
+def main():
+    batch = make_batch()
+    plain = batch.model_dump_json(exclude_none=True).encode()
+    compact = json.dumps(encode_compact(batch), separators=(",", ":")).encode()
+    zstd = zstandard.ZstdCompressor(level=3)
+
+    print(f"📦 Wire format benchmark ({EVENTS} events, {ROUNDS} rounds)")
+    measure("json", plain)
+    measure("json + gzip", gzip.compress(plain), content_encoding="gzip")
+    measure("json + zstd", zstd.compress(plain), content_encoding="zstd")
+    measure("compact", compact, content_type=COMPACT_CONTENT_TYPE)
+    measure("compact + gzip", gzip.compress(compact), COMPACT_CONTENT_TYPE, "gzip")
+    measure("compact + zstd", zstd.compress(compact), COMPACT_CONTENT_TYPE, "zstd")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark request throughput against the number of server workers.
+
+Starts ``python -m app.server`` with WORKERS = 1, 2, 4, ... up to the CPU
+count, drives it with one load-generating process per worker (keep-alive
+clients hitting a route), and reports requests per second for each worker
+count. The server needs its usual MongoDB and Redis (from the environment or
+.env); stop other servers on the benchmark port first.
+
+Run from the backend directory:
+    python benchmarks/bench_workers.py [seconds] [path]
+"""
+
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+PORT = int(os.environ.get("BENCH_PORT", "9100"))
+CLIENTS_PER_PROCESS = 32
+
+
+async def _load(path: str, seconds: float) -> int:
+    """Keep-alive HTTP/1.1 clients on raw streams (no client library needed)"""
+    done = 0
+    deadline = time.monotonic() + seconds
+    request = f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode()
+
+    async def client():
+        nonlocal done
+        reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+        while time.monotonic() < deadline:
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            if head.startswith(b"HTTP/1.1 200"):
+                done += 1
+        writer.close()
+
+    await asyncio.gather(*(client() for _ in range(CLIENTS_PER_PROCESS)))
+    return done
+
+
+def load_process(path: str, seconds: float, results):
+    results.put(asyncio.run(_load(path, seconds)))
+
+
+def wait_ready(path: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{PORT}{path}", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("Server did not become ready")
+
+
+def run(workers: int, seconds: float, path: str) -> float:
+    env = {**os.environ, "WORKERS": str(workers), "PORT": str(PORT), "LOG_LEVEL": "WARNING"}
+    server = subprocess.Popen([sys.executable, "-m", "app.server"], env=env)
+    try:
+        wait_ready(path)
+        time.sleep(1)  # Let every worker finish its lifespan startup
+        results = multiprocessing.Queue()
+        loaders = [multiprocessing.Process(target=load_process, args=(path, seconds, results))
+                   for _ in range(workers)]
+        for loader in loaders:
+            loader.start()
+        total = sum(results.get() for _ in loaders)
+        for loader in loaders:
+            loader.join()
+        return total / seconds
+    finally:
+        server.send_signal(signal.SIGINT)
+        server.wait(timeout=30)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    path = sys.argv[2] if len(sys.argv) > 2 else "/api/v1/health"
+    cores = os.cpu_count() or 1
+    counts = sorted({1, *[n for n in (2, 4, 8, 16, 32) if n <= cores], cores})
+    print(f"🏭 Worker scaling benchmark (GET {path}, {seconds:g}s each, {cores} CPUs)")
+    print("   Load generators share the machine; leave cores free or run them elsewhere for exact numbers")
+    baseline = None
+    for workers in counts:
+        rps = run(workers, seconds, path)
+        baseline = baseline or rps
+        print(f"  {workers:>3} workers  {rps:9.0f} req/s  {rps / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Slow-client soak test for WebSocket outbound queues.
+
+Registers fast, slow and stalled dashboard sockets with the connection
+manager and pushes STATUS, ANALYTICS (leaderboard deltas) and ACKNOWLEDGMENT
+messages at them for a while. Reports delivered/coalesced/dropped messages,
+the deepest queue seen, RSS growth, and whether the stalled sockets were
+disconnected. Queue depth and RSS should stay flat however long it runs, and
+no acknowledgment may be lost on a socket that is still connected.
+
+Run from the backend directory:
+    python benchmarks/bench_ws_backpressure.py [seconds]
+"""
+
+import asyncio
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("JWT_SECRET", "benchmark-secret-benchmark-secret-0000")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB", "benchmark")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("WS_SEND_TIMEOUT", "2")
+
+from app.core.config import settings
+from app.schemas import WSMessage, WSMessageType
+from app.websocket_manager import manager
+
+CONTEST = "soak-contest"
+
+
+class FakeSocket:
+    """Accepts messages after ``delay`` seconds each (forever when None)"""
+
+    def __init__(self, name: str, delay):
+        self.name = name
+        self.delay = delay
+        self.received = 0
+        self.acks = 0
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, payload: str):
+        if self.delay is None:
+            await asyncio.Event().wait()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received += 1
+        if '"acknowledgment"' in payload:
+            self.acks += 1
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / (1024 * 1024)
+
+
+async def soak(seconds: float):
+    sockets = (
+        [FakeSocket(f"fast-{i}", 0) for i in range(20)]
+        + [FakeSocket(f"slow-{i}", 0.01) for i in range(5)]
+        + [FakeSocket(f"stalled-{i}", None) for i in range(2)]
+    )
+    for socket in sockets:
+        await manager.subscribe_contest(socket, CONTEST)
+
+    start_rss = rss_mb()
+    max_depth = 0
+    acks_sent = 0
+    pushed = 0
+    deadline = time.monotonic() + seconds
+    tick = 0
+    while time.monotonic() < deadline:
+        tick += 1
+        await manager.broadcast_to_contest(CONTEST, WSMessage(
+            type=WSMessageType.STATUS, data={"contest_id": CONTEST, "active_sessions": tick},
+        ))
+        await manager.broadcast_to_contest(CONTEST, WSMessage(
+            type=WSMessageType.ANALYTICS,
+            data={"contest_id": CONTEST, "leaderboard_delta": [
+                {"session_id": f"s{(tick * 7 + i) % 500}", "confidence_score": (tick % 100) / 100} for i in range(5)
+            ]},
+        ))
+        pushed += 2
+        if tick % 10 == 0:
+            await manager.broadcast_to_contest(CONTEST, WSMessage(
+                type=WSMessageType.ACKNOWLEDGMENT, data={"batch": tick},
+            ))
+            acks_sent += 1
+            pushed += 1
+        max_depth = max(max_depth, max((len(queue) for queue in manager.queues.values()), default=0))
+        await asyncio.sleep(0.001)
+
+    # Let the slow sockets drain what is still queued
+    await asyncio.sleep(settings.WS_SEND_QUEUE_SIZE * 0.01 + 0.5)
+    stats = {row["connection_id"]: row for row in manager.queue_stats()}
+
+    print(f"  pushed {pushed:,} messages per socket ({acks_sent} acknowledgments), "
+          f"deepest queue {max_depth}/{settings.WS_SEND_QUEUE_SIZE}")
+    for group in ("fast", "slow", "stalled"):
+        members = [s for s in sockets if s.name.startswith(group)]
+        queues = [manager.queues[s] for s in members]
+        received = sum(s.received for s in members) / len(members)
+        acks = min(s.acks for s in members)
+        coalesced = sum(stats[q.connection_id]["coalesced"] for q in queues) / len(members)
+        dropped = sum(stats[q.connection_id]["dropped"] for q in queues) / len(members)
+        closed = sum(1 for s in members if s.closed_with is not None)
+        print(f"  {group:<8} delivered {received:9,.0f}  coalesced {coalesced:9,.0f}  dropped {dropped:6,.0f}  "
+              f"acks {acks}/{acks_sent}  disconnected {closed}/{len(members)}")
+    print(f"  RSS {start_rss:.1f} MB -> {rss_mb():.1f} MB")
+
+    for socket in sockets:
+        manager.unsubscribe_contest(socket, CONTEST)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print(f"🐢 WebSocket slow-client soak ({seconds:g}s, queue {settings.WS_SEND_QUEUE_SIZE}, "
+          f"send timeout {settings.WS_SEND_TIMEOUT:g}s)")
+    asyncio.run(soak(seconds))
+
+
+if __name__ == "__main__":
+    main()
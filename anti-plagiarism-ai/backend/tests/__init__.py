@@ -0,0 +1,14 @@
+"""
+Backend tests (stdlib unittest, no external services).
+
+Run from the backend directory:
+    python -m unittest discover -s tests -t .
+"""
+
+import os
+
+# Settings are read at import time; tests never reach these servers
+os.environ.setdefault("JWT_SECRET", "test-secret-test-secret-test-secret-0000")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB", "test")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
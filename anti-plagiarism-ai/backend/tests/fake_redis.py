@@ -0,0 +1,94 @@
+"""
+In-process fake Redis for the shared Redis client.
+
+Implements just enough of ``redis.asyncio.Redis`` for ``RedisClient``: ping,
+non-transactional pipelines, and SADD/SREM/EXPIRE/GET/SET. Every pipeline is
+one counted round-trip that takes ``roundtrip_s``. Setting ``down`` makes each
+round-trip hang for ``outage_s`` and then fail, like a dead server behind a
+socket timeout.
+
+Used by the tests and by benchmarks/bench_redis_client.py.
+"""
+
+import asyncio
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+
+class FakePool:
+    max_connections = 1
+    _in_use_connections = ()
+    _available_connections = ()
+
+
+class FakePipeline:
+    def __init__(self, server: "FakeRedis"):
+        self.server = server
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.commands = []
+
+    def execute_command(self, *args):
+        self.commands.append(args)
+
+    async def execute(self, raise_on_error: bool = True):
+        return await self.server.roundtrip(self.commands)
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio.Redis for RedisClient"""
+
+    def __init__(self, roundtrip_s: float = 0.0005, outage_s: float = 0.05):
+        self.roundtrip_s = roundtrip_s
+        self.outage_s = outage_s
+        self.sets = {}
+        self.values = {}
+        self.roundtrips = 0
+        self.commands = 0
+        self.down = False
+        self.connection_pool = FakePool()
+
+    async def roundtrip(self, commands):
+        self.roundtrips += 1
+        self.commands += len(commands)
+        if self.down:
+            await asyncio.sleep(self.outage_s)
+            raise RedisConnectionError("Connection refused (fake outage)")
+        await asyncio.sleep(self.roundtrip_s)
+        return [self._apply(*command) for command in commands]
+
+    def _apply(self, name, *args):
+        name = name.upper()
+        if name == "PING":
+            return True
+        if name == "SADD":
+            members = self.sets.setdefault(args[0], set())
+            added = args[1] not in members
+            members.add(args[1])
+            return int(added)
+        if name == "SREM":
+            members = self.sets.get(args[0], set())
+            removed = args[1] in members
+            members.discard(args[1])
+            return int(removed)
+        if name == "EXPIRE":
+            return 1
+        if name == "GET":
+            return self.values.get(args[0])
+        if name == "SET":
+            self.values[args[0]] = args[1]
+            return True
+        raise ValueError(f"Fake Redis does not implement {name}")
+
+    async def ping(self):
+        return (await self.roundtrip([("PING",)]))[0]
+
+    def pipeline(self, transaction: bool = True):
+        return FakePipeline(self)
+
+    async def aclose(self, close_connection_pool=None):
+        pass
@@ -0,0 +1,175 @@
+import asyncio
+import time
+import unittest
+
+from app.admission import LoopLagMonitor
+from app.core.config import settings
+from app.dedupe import BatchDeduplicator
+from app.redis_client import CircuitBreaker, RedisClient, RedisUnavailable, redis_client, redis_fallbacks
+import app.redis_client as redis_client_module
+
+from tests.fake_redis import FakeRedis
+
+
+class RedisClientTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.fake = FakeRedis()
+        self.client = RedisClient()
+        self.client.breaker = CircuitBreaker(threshold=3, reset_timeout=0.05)
+        await self.client.connect(self.fake)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+
+class PipeliningTest(RedisClientTestCase):
+    async def test_concurrent_commands_share_one_round_trip(self):
+        before = self.fake.roundtrips
+        results = await asyncio.gather(*(self.client.execute("SADD", f"k{i}", "m") for i in range(100)))
+        self.assertEqual(results, [1] * 100)
+        self.assertEqual(self.fake.roundtrips - before, 1)
+
+    async def test_pipelines_are_capped_at_pipeline_max(self):
+        calls = settings.REDIS_PIPELINE_MAX + 1
+        before = self.fake.roundtrips
+        await asyncio.gather(*(self.client.execute("SADD", "k", f"m{i}") for i in range(calls)))
+        self.assertEqual(self.fake.roundtrips - before, 2)
+
+    async def test_sequential_commands_each_cost_a_round_trip(self):
+        before = self.fake.roundtrips
+        self.assertEqual(await self.client.execute("SADD", "k", "m"), 1)
+        self.assertEqual(await self.client.execute("SADD", "k", "m"), 0)
+        self.assertEqual(self.fake.roundtrips - before, 2)
+
+
+class CircuitBreakerTest(RedisClientTestCase):
+    async def _fail(self, times: int):
+        for _ in range(times):
+            with self.assertRaises(RedisUnavailable):
+                await self.client.execute("GET", "k")
+
+    async def test_opens_after_threshold_failures_and_rejects_without_round_trip(self):
+        self.fake.down = True
+        await self._fail(2)
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+        await self._fail(1)
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.OPEN)
+
+        before = self.fake.roundtrips
+        started = time.perf_counter()
+        await self._fail(10)
+        self.assertEqual(self.fake.roundtrips, before)
+        self.assertLess(time.perf_counter() - started, self.fake.outage_s)
+
+    async def test_half_open_probe_closes_on_success(self):
+        self.fake.down = True
+        await self._fail(3)
+        self.fake.down = False
+        await asyncio.sleep(self.client.breaker.reset_timeout)
+
+        self.assertTrue(self.client.breaker.allow())
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertEqual(await self.client.execute("SET", "k", "v"), True)
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(await self.client.execute("GET", "k"), "v")
+
+    async def test_half_open_sends_a_single_probe(self):
+        self.fake.down = True
+        await self._fail(3)
+        self.fake.down = False
+        await asyncio.sleep(self.client.breaker.reset_timeout)
+
+        before = self.fake.roundtrips
+        results = await asyncio.gather(*(self.client.execute("SADD", "k", f"m{i}") for i in range(5)))
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(self.fake.roundtrips - before, 1)
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+
+    async def test_failed_probe_reopens(self):
+        self.fake.down = True
+        await self._fail(3)
+        await asyncio.sleep(self.client.breaker.reset_timeout)
+
+        await self._fail(1)
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.OPEN)
+        before = self.fake.roundtrips
+        await self._fail(1)
+        self.assertEqual(self.fake.roundtrips, before)
+
+    async def test_slow_round_trips_count_as_failures(self):
+        self.fake.roundtrip_s = settings.REDIS_SLOW_MS / 1000 * 1.5
+        for _ in range(3):
+            await self.client.execute("GET", "k")
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.OPEN)
+
+
+class LoopLagTest(RedisClientTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.monitor = LoopLagMonitor(0.01)
+        self.monitor.start()
+        self._global_monitor = redis_client_module.loop_lag_monitor
+        redis_client_module.loop_lag_monitor = self.monitor
+        await asyncio.sleep(0.05)
+
+    async def asyncTearDown(self):
+        redis_client_module.loop_lag_monitor = self._global_monitor
+        await self.monitor.stop()
+        await super().asyncTearDown()
+
+    async def test_event_loop_stall_is_not_blamed_on_redis(self):
+        stall_s = settings.REDIS_SLOW_MS / 1000 * 2
+        self.fake.roundtrip_s = 0.01
+
+        async def stall():
+            await asyncio.sleep(0.002)  # The round-trip is in flight by now
+            time.sleep(stall_s)  # Blocks the loop while the reply waits to be read
+
+        for _ in range(3):
+            await asyncio.gather(self.client.execute("GET", "k"), stall())
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.client.breaker.failures, 0)
+
+
+class DedupeFallbackTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.fake = FakeRedis()
+        self._breaker = redis_client.breaker
+        redis_client.breaker = CircuitBreaker(threshold=1, reset_timeout=60)
+        await redis_client.connect(self.fake)
+        self.deduplicator = BatchDeduplicator(window=256, max_sessions=100)
+
+    async def asyncTearDown(self):
+        await redis_client.close()
+        redis_client.breaker = self._breaker
+
+    async def test_redis_catches_retries_the_local_window_cannot_see(self):
+        other_worker = BatchDeduplicator(window=256, max_sessions=100)
+        self.assertFalse(await self.deduplicator.is_duplicate("u", "s", "b1", None))
+        self.assertTrue(await other_worker.is_duplicate("u", "s", "b1", None))
+        # Sessions are scoped per user
+        self.assertFalse(await other_worker.is_duplicate("other", "s", "b1", None))
+
+    async def test_sequences_fall_back_to_the_local_window_while_redis_is_down(self):
+        self.fake.down = True
+        fallbacks = redis_fallbacks.get(caller="dedupe")
+
+        self.assertFalse(await self.deduplicator.is_duplicate("u", "s", "b1", 1))
+        self.assertEqual(redis_client.breaker.state, CircuitBreaker.OPEN)
+        self.assertTrue(await self.deduplicator.is_duplicate("u", "s", "b1", 1))
+        self.assertFalse(await self.deduplicator.is_duplicate("u", "s", "b2", 2))
+        self.assertEqual(redis_fallbacks.get(caller="dedupe") - fallbacks, 2)
+
+    async def test_batches_without_sequence_are_accepted_while_redis_is_down(self):
+        self.fake.down = True
+        self.assertFalse(await self.deduplicator.is_duplicate("u", "s", "b1", None))
+        self.assertFalse(await self.deduplicator.is_duplicate("u", "s", "b1", None))
+
+    async def test_forget_lets_a_failed_batch_be_retried(self):
+        self.assertFalse(await self.deduplicator.is_duplicate("u", "s", "b1", 1))
+        await self.deduplicator.forget("u", "s", "b1", 1)
+        self.assertFalse(await self.deduplicator.is_duplicate("u", "s", "b1", 1))
+
+
+if __name__ == "__main__":
+    unittest.main()